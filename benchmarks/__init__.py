@@ -0,0 +1,4 @@
+"""
+Package with benchmarks for the DAT handling code. Benchmarks are not part of the test suite; run them from the root of
+the project with "python -m benchmarks.<name>".
+"""
@@ -0,0 +1,59 @@
+"""
+Benchmark to compare a cold parse of a .dat file against a warm load of its compiled snapshot from the cache dir.
+
+Usage:
+
+    python -m benchmarks.bench_dat_cache [dat_file]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from libs import cons
+from libs import dat_files
+
+
+# Functions
+#=======================================================================================================================
+def run(ps_dat=os.path.join(cons.s_TEST_DATA_DIR, 'dats', 'mdr-crt.dat'), pi_repeats=5):
+    """
+    Function to run the benchmark and print the results.
+
+    :param ps_dat: Path of the .dat file to be used.
+    :type ps_dat: Str
+
+    :param pi_repeats: Number of times each measurement is repeated. The best time is reported.
+    :type pi_repeats: Int
+
+    :return: Nothing
+    """
+    with tempfile.TemporaryDirectory() as s_cache_dir:
+        lf_cold = []
+        lf_warm = []
+        for _ in range(pi_repeats):
+            f_start = time.perf_counter()
+            dat_files.Dat(ps_dat)
+            lf_cold.append(time.perf_counter() - f_start)
+
+        # First load with cache dir creates the snapshot
+        dat_files.Dat(ps_dat, ps_cache_dir=s_cache_dir)
+
+        for _ in range(pi_repeats):
+            f_start = time.perf_counter()
+            dat_files.Dat(ps_dat, ps_cache_dir=s_cache_dir)
+            lf_warm.append(time.perf_counter() - f_start)
+
+    print(f'{os.path.basename(ps_dat)}')
+    print(f'  cold parse: {min(lf_cold) * 1000.0:.1f} ms')
+    print(f'  warm load:  {min(lf_warm) * 1000.0:.1f} ms')
+
+
+# Main code
+#=======================================================================================================================
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+    else:
+        run()
@@ -0,0 +1,92 @@
+"""
+Benchmark for the columnar representation of Dat (DatColumns) compared to the RomSet/Rom objects over a synthetic
+MAME-sized Dat. The queries compared are duplicates by clean CRC32, clean sizes, all the compound hashes and the
+counters of bad-dumps, no-dumps and devices.
+
+Usage:
+
+    python -m benchmarks.bench_dat_columns [romsets]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from libs import dat_files
+
+from . import generators
+
+
+# Constants
+#=======================================================================================================================
+_ts_HASH_PROPERTIES = ('s_ccrc32', 's_dcrc32', 's_cmd5', 's_dmd5', 's_csha1', 's_dsha1')
+
+
+# Functions
+#=======================================================================================================================
+def _object_queries(po_dat):
+    po_dat.get_duplicated_crc32()
+    for o_romset in po_dat.iter_unordered():
+        o_romset.i_csize
+        for s_property in _ts_HASH_PROPERTIES:
+            getattr(o_romset, s_property)
+    po_dat.i_baddumps
+    po_dat.i_nodumps
+    po_dat.i_devices
+
+
+def _column_queries(po_columns):
+    po_columns.get_duplicated_crc32()
+    po_columns.get_sizes(pb_clean=True)
+    for s_type in ('crc32', 'md5', 'sha1'):
+        for b_clean in (True, False):
+            po_columns.get_hashes(ps_type=s_type, pb_clean=b_clean)
+    po_columns.i_baddumps
+    po_columns.i_nodumps
+    po_columns.i_devices
+
+
+def run(pi_romsets=40000):
+    """
+    Function to run the benchmark and print the results.
+
+    :param pi_romsets: Number of ROMsets in the synthetic Dat.
+    :type pi_romsets: Int
+
+    :return: Nothing
+    """
+    with tempfile.TemporaryDirectory() as s_tmp_dir:
+        s_file = os.path.join(s_tmp_dir, 'mame.xml')
+        generators.write_mame_xml(s_file, pi_romsets)
+        tx_snapshot = dat_files.Dat(s_file)._to_snapshot()
+
+    # Compound hashes are cached inside the RomSets, so a fresh Dat is used for the object queries
+    o_dat = dat_files.Dat()
+    o_dat._from_snapshot(tx_snapshot)
+    print(f'Synthetic Dat: {len(o_dat)} romsets')
+
+    f_start = time.perf_counter()
+    _object_queries(o_dat)
+    f_objects = time.perf_counter() - f_start
+    print(f'  objects, 1st access:  {f_objects:.3f}s')
+
+    o_dat = dat_files.Dat()
+    o_dat._from_snapshot(tx_snapshot)
+    f_start = time.perf_counter()
+    o_columns = o_dat.to_columns()
+    print(f'  to_columns():         {time.perf_counter() - f_start:.3f}s ({o_columns.i_roms} roms)')
+
+    f_start = time.perf_counter()
+    _column_queries(o_columns)
+    f_columns = time.perf_counter() - f_start
+    print(f'  columns:              {f_columns:.3f}s (x{f_objects / f_columns:.1f})')
+
+
+# Main code
+#=======================================================================================================================
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run()
@@ -0,0 +1,60 @@
+"""
+Benchmark for read_dats(), reading many synthetic dats one by one and in parallel with a pool of processes.
+
+Usage:
+
+    python -m benchmarks.bench_read_dats [dats] [romsets per dat] [workers]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from libs import dat_files
+
+from . import generators
+
+
+# Functions
+#=======================================================================================================================
+def run(pi_dats=8, pi_romsets=5000, pi_workers=0):
+    """
+    Function to run the benchmark and print the results.
+
+    :param pi_dats: Number of synthetic dats.
+    :type pi_dats: Int
+
+    :param pi_romsets: Number of ROMsets of each synthetic dat.
+    :type pi_romsets: Int
+
+    :param pi_workers: Number of worker processes for the parallel read. 0 to use one per CPU.
+    :type pi_workers: Int
+
+    :return: Nothing
+    """
+    with tempfile.TemporaryDirectory() as s_tmp_dir:
+        ls_files = []
+        for i_dat in range(pi_dats):
+            s_file = os.path.join(s_tmp_dir, 'mame-%02i.xml' % i_dat)
+            generators.write_mame_xml(s_file, pi_romsets, pi_seed=i_dat)
+            ls_files.append(s_file)
+
+        print(f'Synthetic dats: {pi_dats} x {pi_romsets} romsets, {os.cpu_count()} CPUs')
+
+        f_start = time.perf_counter()
+        dat_files.read_dats(ls_files, pi_workers=1)
+        print(f'  serial:   {time.perf_counter() - f_start:.2f}s')
+
+        f_start = time.perf_counter()
+        ltx_results = dat_files.read_dats(ls_files, pi_workers=pi_workers)
+        print(f'  parallel: {time.perf_counter() - f_start:.2f}s')
+
+        for s_file, o_dat, f_seconds in ltx_results:
+            print(f'    {os.path.basename(s_file)}: {f_seconds:.2f}s ({len(o_dat)} romsets)')
+
+
+# Main code
+#=======================================================================================================================
+if __name__ == '__main__':
+    run(*[int(s_arg) for s_arg in sys.argv[1:4]])
@@ -0,0 +1,117 @@
+"""
+Benchmark for the compound hashes of RomSet (s_ccrc32, s_dcrc32, s_cmd5, s_dmd5, s_csha1, s_dsha1) over a synthetic
+50k ROMsets Dat. The old digit-by-digit hex addition is reproduced here to compare it with the current integer one.
+
+Usage:
+
+    python -m benchmarks.bench_romset_hashes [romsets]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from libs import dat_files
+
+from . import generators
+
+
+# Constants
+#=======================================================================================================================
+_ts_HASH_PROPERTIES = ('s_ccrc32', 's_dcrc32', 's_cmd5', 's_dmd5', 's_csha1', 's_dsha1')
+
+
+# Functions
+#=======================================================================================================================
+def _legacy_hex_add(ps_hex_a, ps_hex_b):
+    """
+    Old hex addition, digit by digit, kept here just for comparison purposes.
+    """
+    i_length = max(len(ps_hex_a), len(ps_hex_b)) + 1
+    s_hex_a = ps_hex_a.rjust(i_length, '0')
+    s_hex_b = ps_hex_b.rjust(i_length, '0')
+
+    s_hex_result = ''
+    i_carry_over = 0
+    for s_digit_a, s_digit_b in zip(s_hex_a[::-1], s_hex_b[::-1]):
+        i_digit_c = int(s_digit_a, 16) + int(s_digit_b, 16) + i_carry_over
+        s_digits_c = hex(i_digit_c).partition('x')[2]
+        if len(s_digits_c) == 2:
+            i_carry_over = int(s_digits_c[0])
+            s_hex_result += s_digits_c[1]
+        else:
+            i_carry_over = 0
+            s_hex_result += s_digits_c[0]
+
+    return s_hex_result[::-1].lstrip('0')
+
+
+def _legacy_hashes(po_dat):
+    """
+    Function computing all the compound hashes of a Dat the old way: relevant ROMs rebuilt on every access and hex
+    strings added digit by digit.
+    """
+    for o_romset in po_dat._do_romsets.values():
+        for s_type, (i_length, s_attribute) in dat_files._dti_HASH_TYPES.items():
+            for b_clean in (True, False):
+                o_romset._dx_cache.clear()
+                s_result = '0'
+                for o_rom in o_romset._get_lo_relevant_roms(pb_clean=b_clean):
+                    s_result = _legacy_hex_add(s_result, getattr(o_rom, s_attribute) or '')
+                if s_result:
+                    s_result = s_result[-i_length:].rjust(i_length, '0')
+
+
+def _current_hashes(po_dat):
+    for o_romset in po_dat._do_romsets.values():
+        for s_property in _ts_HASH_PROPERTIES:
+            getattr(o_romset, s_property)
+
+
+def _clear_caches(po_dat):
+    for o_romset in po_dat._do_romsets.values():
+        o_romset._dx_cache.clear()
+
+
+def run(pi_romsets=50000):
+    """
+    Function to run the benchmark and print the results.
+
+    :param pi_romsets: Number of ROMsets in the synthetic Dat.
+    :type pi_romsets: Int
+
+    :return: Nothing
+    """
+    with tempfile.TemporaryDirectory() as s_tmp_dir:
+        s_file = os.path.join(s_tmp_dir, 'mame.xml')
+        generators.write_mame_xml(s_file, pi_romsets)
+        o_dat = dat_files.Dat(s_file)
+
+    print(f'Synthetic Dat: {len(o_dat)} romsets')
+
+    f_start = time.perf_counter()
+    _legacy_hashes(o_dat)
+    print(f'  legacy (hex strings, no cache): {time.perf_counter() - f_start:.2f}s')
+
+    _clear_caches(o_dat)
+    f_start = time.perf_counter()
+    _current_hashes(o_dat)
+    print(f'  integer, 1st access:            {time.perf_counter() - f_start:.2f}s')
+
+    f_start = time.perf_counter()
+    _current_hashes(o_dat)
+    print(f'  integer, cached access:         {time.perf_counter() - f_start:.2f}s')
+
+    f_start = time.perf_counter()
+    o_dat.get_duplicated_crc32()
+    print(f'  get_duplicated_crc32():         {time.perf_counter() - f_start:.2f}s')
+
+
+# Main code
+#=======================================================================================================================
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run()
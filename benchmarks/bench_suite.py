@@ -0,0 +1,301 @@
+"""
+Benchmark suite for the DAT handling code. Synthetic ClrMamePro, generic xml and MAME xml dats of different sizes are
+generated (see generators.py) and the main operations over them are measured:
+
+    read        - Dat.read_from_dat()
+    hashes      - All the compound hashes and sizes of every ROMset (clean and dirty)
+    filter      - Dat.filter() by year
+    duplicates  - Dat.get_duplicated_crc32()
+    union       - Dat.union() by clean CRC32 with a Dat sharing half of its ROMsets
+    save_cmp    - Dat.save_to_dat() in ClrMamePro format
+    save_xml    - Dat.save_to_dat() in xml format
+
+For each operation, the wall time is measured several times (the minimum and the median are reported) and then the peak
+memory allocated by Python during one extra run is measured with tracemalloc (which is not enabled while timing, since
+it slows down the code a lot). The dats of each format and size are measured in a fresh process, which also reports
+its peak RSS.
+
+The results are written as JSON together with information about the environment (Python version, CPU, git commit...).
+The synthetic dats are deterministic, so results of different runs are comparable; use --baseline to compare a run with
+a previous results file.
+
+Usage:
+
+    python -m benchmarks.bench_suite [--sizes 1000,10000] [--formats cmp,xml,mame] [--repeat 3] [--output file.json]
+                                     [--data-dir dir] [--baseline old.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from libs import dat_files
+
+from . import generators
+
+
+# Constants
+#=======================================================================================================================
+# Increase it every time the generators change, so dats generated by older versions in --data-dir are not reused
+_i_GENERATOR_VERSION = 2
+
+_ti_SIZES = (1000, 10000, 100000, 1000000)
+_ts_FORMATS = ('cmp', 'xml', 'mame')
+_ts_OPERATIONS = ('read', 'hashes', 'filter', 'duplicates', 'union', 'save_cmp', 'save_xml')
+_ts_HASH_PROPERTIES = ('s_ccrc32', 's_dcrc32', 's_cmd5', 's_dmd5', 's_csha1', 's_dsha1', 'i_csize', 'i_dsize')
+
+
+# Functions
+#=======================================================================================================================
+def run(pli_sizes=_ti_SIZES, pls_formats=_ts_FORMATS, pi_repeat=3, ps_output='', ps_data_dir='', ps_baseline=''):
+    """
+    Function to run the benchmark suite, print the results and write them as JSON.
+
+    :param pli_sizes: Number of ROMsets of the synthetic dats.
+    :type pli_sizes: List[Int]
+
+    :param pls_formats: Formats of the synthetic dats: 'cmp', 'xml' and/or 'mame'.
+    :type pls_formats: List[Str]
+
+    :param pi_repeat: Number of times each operation is timed.
+    :type pi_repeat: Int
+
+    :param ps_output: Path of the JSON file with the results. Empty to just print them.
+    :type ps_output: Str
+
+    :param ps_data_dir: Directory where the synthetic dats are kept, so they don't need to be generated in every run.
+                        Empty to use a temporary directory.
+    :type ps_data_dir: Str
+
+    :param ps_baseline: Path of a JSON file of a previous run to compare the results with. Empty for no comparison.
+    :type ps_baseline: Str
+
+    :return: The results. A dictionary with the keys 'environment' and 'results'.
+    :rtype: Dict
+    """
+    do_results = {'environment': _get_environment(pi_repeat),
+                  'results': []}
+
+    o_context = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as s_tmp_dir:
+        s_data_dir = ps_data_dir or s_tmp_dir
+        os.makedirs(s_data_dir, exist_ok=True)
+
+        for s_format in pls_formats:
+            for i_size in pli_sizes:
+                s_file = os.path.join(s_data_dir, 'synthetic-v%i-%s-%i.%s'
+                                      % (_i_GENERATOR_VERSION, s_format, i_size, 'dat' if s_format == 'cmp' else 'xml'))
+                if not os.path.isfile(s_file):
+                    generators.write_dat(s_file + '.tmp', s_format, i_size)
+                    os.replace(s_file + '.tmp', s_file)
+
+                print(f'{s_format} x {i_size} romsets ({os.path.getsize(s_file) / 1048576.0:.1f} MiB)')
+
+                o_queue = o_context.Queue()
+                o_process = o_context.Process(target=_measure_file, args=(s_file, s_tmp_dir, pi_repeat, o_queue))
+                o_process.start()
+                ldx_file_results = o_queue.get()
+                o_process.join()
+
+                for dx_result in ldx_file_results:
+                    dx_result.update({'format': s_format, 'romsets': i_size,
+                                      'file_mib': round(os.path.getsize(s_file) / 1048576.0, 3)})
+                    do_results['results'].append(dx_result)
+                    print('  %-10s  min=%9.4fs  median=%9.4fs  peak=%9.2f MiB'
+                          % (dx_result['operation'], dx_result['wall_s_min'], dx_result['wall_s_median'],
+                             dx_result['peak_mib']))
+                print('  peak rss: %.1f MiB' % ldx_file_results[0]['process_peak_rss_mib'])
+
+    if ps_baseline:
+        _print_comparison(ps_baseline, do_results)
+
+    if ps_output:
+        with open(ps_output, 'w', encoding='utf8') as o_file:
+            json.dump(do_results, o_file, indent=2, sort_keys=True)
+
+    return do_results
+
+
+# Helper Functions
+#=======================================================================================================================
+def _get_environment(pi_repeat):
+    """
+    Function to get information about the environment where the benchmark is run, so results of different runs can be
+    compared knowing what changed.
+
+    :return: A dictionary with the information.
+    :rtype: Dict
+    """
+    s_commit = ''
+    try:
+        s_commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+            'numpy': dat_files.numpy is not None,
+            'commit': s_commit,
+            'parser_version': dat_files._i_PARSER_VERSION,
+            'generator_version': _i_GENERATOR_VERSION,
+            'repeat': pi_repeat,
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def _measure(pc_setup, pc_operation, pi_repeat):
+    """
+    Function to measure an operation. The setup is run before each measurement and it's not timed.
+
+    :param pc_setup: Function preparing the data for the operation. Its result is passed to the operation.
+    :type pc_setup: Callable
+
+    :param pc_operation: Function with the operation to be measured.
+    :type pc_operation: Callable
+
+    :param pi_repeat: Number of times the operation is timed.
+    :type pi_repeat: Int
+
+    :return: A dictionary with the minimum and median wall time (in seconds) and the peak memory allocated (in MiB).
+    :rtype: Dict
+    """
+    lf_times = []
+    for _ in range(pi_repeat):
+        x_data = pc_setup()
+        f_start = time.perf_counter()
+        pc_operation(x_data)
+        lf_times.append(time.perf_counter() - f_start)
+
+    x_data = pc_setup()
+    tracemalloc.start()
+    pc_operation(x_data)
+    _, i_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'wall_s_min': min(lf_times),
+            'wall_s_median': statistics.median(lf_times),
+            'peak_mib': i_peak / 1048576.0}
+
+
+def _measure_file(ps_file, ps_tmp_dir, pi_repeat, po_queue):
+    """
+    Function to measure all the operations over a dat. It's run in a fresh process so the peak RSS belongs just to the
+    operations over that dat.
+    """
+    o_dat = dat_files.Dat(ps_file)
+    s_output = os.path.join(ps_tmp_dir, 'output-%i' % os.getpid())
+
+    def _get_dat():
+        return o_dat
+
+    def _get_dat_without_cache():
+        for o_romset in o_dat.iter_unordered():
+            o_romset._dx_cache.clear()
+        o_dat._clear_indexes()
+        return o_dat
+
+    def _hashes(po_dat):
+        for o_romset in po_dat.iter_unordered():
+            for s_property in _ts_HASH_PROPERTIES:
+                getattr(o_romset, s_property)
+
+    o_filter = dat_files.Filter('s_year', 'equals', '1990', '1991', '1992')
+
+    # The ROMsets are shared, so the caches of both Dats are emptied by _get_dat_without_cache()
+    o_half_dat = dat_files.Dat()
+    for i_romset, o_romset in enumerate(o_dat.iter_unordered()):
+        if i_romset % 2:
+            o_half_dat.add_romset(o_romset)
+
+    dtc_operations = {'read': (lambda: ps_file, dat_files.Dat),
+                      'hashes': (_get_dat_without_cache, _hashes),
+                      'filter': (_get_dat, lambda po_dat: po_dat.filter(o_filter)),
+                      'duplicates': (_get_dat_without_cache, lambda po_dat: po_dat.get_duplicated_crc32()),
+                      'union': (_get_dat_without_cache, lambda po_dat: po_dat.union(o_half_dat, ps_key='s_ccrc32')),
+                      'save_cmp': (_get_dat, lambda po_dat: po_dat.save_to_dat(s_output, 'cmp')),
+                      'save_xml': (_get_dat, lambda po_dat: po_dat.save_to_dat(s_output, 'xml'))}
+
+    ldx_results = []
+    for s_operation in _ts_OPERATIONS:
+        dx_result = {'operation': s_operation}
+        dx_result.update(_measure(*dtc_operations[s_operation], pi_repeat))
+        ldx_results.append(dx_result)
+
+    if os.path.isfile(s_output):
+        os.remove(s_output)
+
+    # ru_maxrss is reported in KiB on Linux
+    f_peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    for dx_result in ldx_results:
+        dx_result['process_peak_rss_mib'] = f_peak_rss
+
+    po_queue.put(ldx_results)
+
+
+def _print_comparison(ps_baseline, pdx_results):
+    """
+    Function to print the ratio between the results of a previous run and the current ones.
+
+    :param ps_baseline: Path of the JSON file with the previous results.
+    :type ps_baseline: Str
+
+    :param pdx_results: Current results.
+    :type pdx_results: Dict
+
+    :return: Nothing
+    """
+    with open(ps_baseline, 'r', encoding='utf8') as o_file:
+        dx_baseline = json.load(o_file)
+
+    dtdx_baseline = {(dx_result['format'], dx_result['romsets'], dx_result['operation']): dx_result
+                     for dx_result in dx_baseline['results']}
+
+    print(f'Comparison with {ps_baseline} (commit {dx_baseline["environment"].get("commit", "")[:10]}), '
+          f'>1 means faster/smaller now:')
+    for dx_result in pdx_results['results']:
+        t_key = (dx_result['format'], dx_result['romsets'], dx_result['operation'])
+        if t_key not in dtdx_baseline:
+            continue
+        dx_old = dtdx_baseline[t_key]
+        f_time_ratio = dx_old['wall_s_min'] / max(dx_result['wall_s_min'], 1e-9)
+        f_memory_ratio = dx_old['peak_mib'] / max(dx_result['peak_mib'], 1e-9)
+        print('  %-4s %8i %-10s  time x%6.2f  memory x%6.2f' % (t_key + (f_time_ratio, f_memory_ratio)))
+
+
+def _parse_arguments(pls_args):
+    o_parser = argparse.ArgumentParser(description='Benchmark suite for the DAT handling code.')
+    o_parser.add_argument('--sizes', default=','.join(str(i_size) for i_size in _ti_SIZES),
+                          help='Comma separated number of ROMsets of the synthetic dats.')
+    o_parser.add_argument('--formats', default=','.join(_ts_FORMATS),
+                          help='Comma separated formats of the synthetic dats: cmp, xml, mame.')
+    o_parser.add_argument('--repeat', type=int, default=3, help='Number of times each operation is timed.')
+    o_parser.add_argument('--output', default='', help='JSON file where the results are written.')
+    o_parser.add_argument('--data-dir', default='', help='Directory where the synthetic dats are kept between runs.')
+    o_parser.add_argument('--baseline', default='', help='JSON file of a previous run to compare the results with.')
+    return o_parser.parse_args(pls_args)
+
+
+# Main code
+#=======================================================================================================================
+if __name__ == '__main__':
+    o_args = _parse_arguments(sys.argv[1:])
+    run(pli_sizes=[int(s_size) for s_size in o_args.sizes.split(',')],
+        pls_formats=o_args.formats.split(','),
+        pi_repeat=o_args.repeat,
+        ps_output=o_args.output,
+        ps_data_dir=o_args.data_dir,
+        ps_baseline=o_args.baseline)
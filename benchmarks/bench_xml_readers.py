@@ -0,0 +1,86 @@
+"""
+Benchmark to compare the peak memory (RSS) used when reading a MAME xml .dat with a full element tree (the old way)
+and with the incremental iterparse reader of dat_files.Dat.
+
+Usage:
+
+    python -m benchmarks.bench_xml_readers [romsets]
+"""
+
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import xml.etree.cElementTree
+
+from libs import dat_files
+
+from . import generators
+
+
+# Functions
+#=======================================================================================================================
+def _read_full_tree(ps_file):
+    """
+    Function reproducing the old reader: the whole element tree is built before walking the <machine> elements.
+    """
+    o_dat = dat_files.Dat()
+    o_xml_root = xml.etree.cElementTree.parse(ps_file).getroot()
+    for o_xmachine in o_xml_root.findall('machine'):
+        o_dat.add_romset(dat_files._xml_mame_romset(o_xmachine))
+    return o_dat
+
+
+def _read_iterparse(ps_file):
+    return dat_files.Dat(ps_file)
+
+
+def _measure(ps_reader, ps_file, po_queue):
+    """
+    Function to be run in a fresh process, so the peak RSS reported belongs just to the reader being measured.
+    """
+    c_reader = {'full_tree': _read_full_tree, 'iterparse': _read_iterparse}[ps_reader]
+    f_start = time.perf_counter()
+    o_dat = c_reader(ps_file)
+    f_elapsed = time.perf_counter() - f_start
+
+    # ru_maxrss is reported in KiB on Linux
+    i_peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    po_queue.put((len(o_dat), f_elapsed, i_peak_kib))
+
+
+def run(pi_romsets=20000):
+    """
+    Function to run the benchmark and print the results.
+
+    :param pi_romsets: Number of machines in the synthetic MAME xml.
+    :type pi_romsets: Int
+
+    :return: Nothing
+    """
+    o_context = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as s_tmp_dir:
+        s_file = os.path.join(s_tmp_dir, 'mame.xml')
+        generators.write_mame_xml(s_file, pi_romsets)
+        f_mib = os.path.getsize(s_file) / 1048576.0
+        print(f'Synthetic MAME xml: {pi_romsets} machines, {f_mib:.1f} MiB')
+
+        for s_reader in ('full_tree', 'iterparse'):
+            o_queue = o_context.Queue()
+            o_process = o_context.Process(target=_measure, args=(s_reader, s_file, o_queue))
+            o_process.start()
+            i_romsets, f_elapsed, i_peak_kib = o_queue.get()
+            o_process.join()
+            print(f'  {s_reader:<10} romsets={i_romsets} time={f_elapsed:.2f}s peak_rss={i_peak_kib / 1024.0:.1f} MiB')
+
+
+# Main code
+#=======================================================================================================================
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(int(sys.argv[1]))
+    else:
+        run()
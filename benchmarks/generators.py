@@ -0,0 +1,372 @@
+"""
+Library with functions to generate synthetic .dat files to be used by the benchmarks.
+
+The generated data is deterministic (a fixed seed is used) so results of different runs are comparable. Three formats
+are generated:
+
+    - ClrMamePro and generic xml (No-Intro/Redump style): mostly single-ROM cartridge sets plus some multi-track disc
+      sets with a .cue file, revisions sharing the ROMs of a previous set and a few bad-dumps.
+    - MAME xml: machines with several ROMs, bios sets whose ROMs are duplicated in all the machines using them, clones
+      sharing (merging) ROMs with their parents, devices, bad-dumps and no-dumps. Like in real MAME dats, most of the
+      file is made of elements not used by the launcher: chips, inputs, dipswitches, ports...
+"""
+
+import random
+import xml.sax.saxutils
+
+
+# Constants
+#=======================================================================================================================
+_ts_REGIONS = ('World', 'USA', 'Europe', 'Japan', 'USA, Europe', 'Brazil', 'Korea')
+
+# Probabilities of the different kinds of ROMsets and ROMs
+_f_DISC_RATIO = 0.08       # ROMsets that are multi-track discs (.cue + several .bin tracks)
+_f_REVISION_RATIO = 0.03   # ROMsets that are revisions with the same ROMs as a previous ROMset
+_f_BADDUMP_RATIO = 0.02    # ROMs that are bad-dumps
+_f_NODUMP_RATIO = 0.005    # MAME ROMs that are no-dumps
+_f_BIOS_USER_RATIO = 0.3   # MAME machines running on a bios
+_f_CLONE_RATIO = 0.4       # MAME machines that are clones of the previous parent
+_f_DEVICE_RATIO = 0.05     # MAME machines that are devices
+
+
+# Functions
+#=======================================================================================================================
+def write_cmp_dat(ps_file, pi_romsets, pi_seed=0):
+    """
+    Function to write a synthetic ClrMamePro dat (No-Intro/Redump style).
+
+    :param ps_file: Path of the file to be written.
+    :type ps_file: Str
+
+    :param pi_romsets: Number of games to generate.
+    :type pi_romsets: Int
+
+    :param pi_seed: Seed for the random generator.
+    :type pi_seed: Int
+
+    :return: Nothing
+    """
+    with open(ps_file, 'w', encoding='utf8') as o_file:
+        o_file.write('clrmamepro (\n')
+        o_file.write('\tname "Synthetic - Console"\n')
+        o_file.write('\tdescription "Synthetic - Console (%i)"\n' % pi_romsets)
+        o_file.write('\tversion 20230101-000000\n')
+        o_file.write('\tauthor "benchmarks"\n')
+        o_file.write(')\n')
+
+        for s_name, s_year, s_manufacturer, ltx_roms in _iter_console_romsets(pi_romsets, pi_seed):
+            o_file.write('\ngame (\n')
+            o_file.write('\tname "%s"\n' % s_name)
+            o_file.write('\tdescription "%s"\n' % s_name)
+            o_file.write('\tyear %s\n' % s_year)
+            o_file.write('\tmanufacturer "%s"\n' % s_manufacturer)
+            for s_rom, i_size, s_crc32, s_md5, s_sha1, s_status in ltx_roms:
+                s_flags = ''
+                if s_status:
+                    s_flags = ' flags %s' % s_status
+                o_file.write('\trom ( name "%s" size %i crc %s md5 %s sha1 %s%s )\n'
+                             % (s_rom, i_size, s_crc32, s_md5, s_sha1, s_flags))
+            o_file.write(')\n')
+
+
+def write_generic_xml(ps_file, pi_romsets, pi_seed=0):
+    """
+    Function to write a synthetic generic xml dat (No-Intro/Redump style). It contains the same ROMsets as the
+    ClrMamePro dat generated with the same parameters.
+
+    :param ps_file: Path of the file to be written.
+    :type ps_file: Str
+
+    :param pi_romsets: Number of games to generate.
+    :type pi_romsets: Int
+
+    :param pi_seed: Seed for the random generator.
+    :type pi_seed: Int
+
+    :return: Nothing
+    """
+    with open(ps_file, 'w', encoding='utf8') as o_file:
+        o_file.write('<?xml version="1.0"?>\n')
+        o_file.write('<!DOCTYPE datafile PUBLIC "-//Logiqx//DTD ROM Management Datafile//EN" '
+                     '"http://www.logiqx.com/Dats/datafile.dtd">\n')
+        o_file.write('<datafile>\n')
+        o_file.write('\t<header>\n')
+        o_file.write('\t\t<name>Synthetic - Console</name>\n')
+        o_file.write('\t\t<description>Synthetic - Console (%i)</description>\n' % pi_romsets)
+        o_file.write('\t\t<version>20230101-000000</version>\n')
+        o_file.write('\t\t<author>benchmarks</author>\n')
+        o_file.write('\t</header>\n')
+
+        for s_name, s_year, s_manufacturer, ltx_roms in _iter_console_romsets(pi_romsets, pi_seed):
+            s_name = xml.sax.saxutils.escape(s_name, {'"': '&quot;'})
+            o_file.write('\t<game name="%s">\n' % s_name)
+            o_file.write('\t\t<description>%s</description>\n' % s_name)
+            o_file.write('\t\t<year>%s</year>\n' % s_year)
+            o_file.write('\t\t<manufacturer>%s</manufacturer>\n' % s_manufacturer)
+            for s_rom, i_size, s_crc32, s_md5, s_sha1, s_status in ltx_roms:
+                s_status_attr = ''
+                if s_status:
+                    s_status_attr = ' status="%s"' % s_status
+                o_file.write('\t\t<rom name="%s" size="%i" crc="%s" md5="%s" sha1="%s"%s/>\n'
+                             % (xml.sax.saxutils.escape(s_rom, {'"': '&quot;'}), i_size, s_crc32, s_md5, s_sha1,
+                                s_status_attr))
+            o_file.write('\t</game>\n')
+
+        o_file.write('</datafile>\n')
+
+
+def write_mame_xml(ps_file, pi_romsets, pi_seed=0):
+    """
+    Function to write a synthetic MAME listxml file. Each machine contains a few ROMs plus some extra children that
+    the launcher doesn't use (chips, display, sound...) so the structure resembles the real thing. Like in real MAME
+    dats, the ROMs of the bios are repeated in every machine running on it, clones share some ROMs with their parent
+    (merge attribute) and some machines are devices without ROMs.
+
+    :param ps_file: Path of the file to be written.
+    :type ps_file: Str
+
+    :param pi_romsets: Number of <machine> elements to generate.
+    :type pi_romsets: Int
+
+    :param pi_seed: Seed for the random generator.
+    :type pi_seed: Int
+
+    :return: Nothing
+    """
+    o_random = random.Random(pi_seed)
+
+    # One bios every 500 machines, each of them with a few ROMs
+    i_bioses = min(pi_romsets, pi_romsets // 500 + 1)
+    dltx_bios_roms = {}
+    for i_bios in range(i_bioses):
+        s_bios = 'bios%03i' % i_bios
+        dltx_bios_roms[s_bios] = [('%s.%i' % (s_bios, i_rom), 2 ** o_random.randint(12, 17), _crc32(o_random),
+                                   _sha1(o_random)) for i_rom in range(o_random.randint(2, 6))]
+
+    with open(ps_file, 'w', encoding='utf8') as o_file:
+        o_file.write('<?xml version="1.0"?>\n')
+        o_file.write('<!DOCTYPE mame [\n<!ELEMENT mame (machine+)>\n]>\n\n')
+        o_file.write('<mame build="0.250 (synthetic)" debug="no" mameconfig="10">\n')
+
+        s_parent = ''
+        ltx_parent_roms = []
+        for i_romset in range(pi_romsets):
+            s_name = 'm%06i' % i_romset
+            s_desc = xml.sax.saxutils.escape('Machine %i & co.' % i_romset)
+            s_bios = ''
+            s_attribs = ''
+            ltx_roms = []
+
+            # Bios machines
+            if i_romset < i_bioses:
+                s_name = 'bios%03i' % i_romset
+                s_attribs = ' isbios="yes"'
+                ltx_roms = [(s_rom, i_size, s_crc32, s_sha1, '', '')
+                            for s_rom, i_size, s_crc32, s_sha1 in dltx_bios_roms[s_name]]
+
+            # Devices, without ROMs or with just one
+            elif o_random.random() < _f_DEVICE_RATIO:
+                s_attribs = ' isdevice="yes" runnable="no"'
+                if o_random.random() < 0.5:
+                    ltx_roms.append(('%s.0' % s_name, 2 ** o_random.randint(8, 12), _crc32(o_random), _sha1(o_random),
+                                     '', ''))
+
+            # Regular machines, some of them clones and/or running on a bios
+            else:
+                if s_parent and o_random.random() < _f_CLONE_RATIO:
+                    s_attribs = ' cloneof="%s" romof="%s"' % (s_parent, s_parent)
+                    for s_rom, i_size, s_crc32, s_sha1, _, _ in ltx_parent_roms:
+                        if o_random.random() < 0.7:
+                            ltx_roms.append((s_rom, i_size, s_crc32, s_sha1, s_rom, ''))
+                else:
+                    s_parent = s_name
+                    if o_random.random() < _f_BIOS_USER_RATIO:
+                        s_bios = 'bios%03i' % o_random.randrange(i_bioses)
+                        s_attribs = ' romof="%s"' % s_bios
+
+                for i_rom in range(o_random.randint(1, 12)):
+                    ltx_roms.append(('%s.%i' % (s_name, i_rom), 2 ** o_random.randint(10, 20), _crc32(o_random),
+                                     _sha1(o_random), '', ''))
+
+                if s_parent == s_name:
+                    ltx_parent_roms = ltx_roms
+
+            o_file.write('\t<machine name="%s" sourcefile="synth.cpp"%s>\n' % (s_name, s_attribs))
+            o_file.write('\t\t<description>%s</description>\n' % s_desc)
+            o_file.write('\t\t<year>%i</year>\n' % o_random.randint(1975, 2015))
+            o_file.write('\t\t<manufacturer>Maker %i</manufacturer>\n' % o_random.randint(0, 200))
+
+            if s_bios:
+                for s_rom, i_size, s_crc32, s_sha1 in dltx_bios_roms[s_bios]:
+                    o_file.write('\t\t<rom name="%s" merge="%s" bios="%s" size="%i" crc="%s" sha1="%s" '
+                                 'region="mainbios" offset="0"/>\n' % (s_rom, s_rom, s_bios, i_size, s_crc32, s_sha1))
+
+            for s_rom, i_size, s_crc32, s_sha1, s_merge, _ in ltx_roms:
+                s_merge_attr = ''
+                if s_merge:
+                    s_merge_attr = ' merge="%s"' % s_merge
+
+                f_random = o_random.random()
+                if f_random < _f_NODUMP_RATIO:
+                    o_file.write('\t\t<rom name="%s"%s size="%i" status="nodump" region="maincpu" offset="0"/>\n'
+                                 % (s_rom, s_merge_attr, i_size))
+                elif f_random < _f_NODUMP_RATIO + _f_BADDUMP_RATIO:
+                    o_file.write('\t\t<rom name="%s"%s size="%i" crc="%s" sha1="%s" status="baddump" '
+                                 'region="maincpu" offset="0"/>\n' % (s_rom, s_merge_attr, i_size, s_crc32, s_sha1))
+                else:
+                    o_file.write('\t\t<rom name="%s"%s size="%i" crc="%s" sha1="%s" region="maincpu" offset="0"/>\n'
+                                 % (s_rom, s_merge_attr, i_size, s_crc32, s_sha1))
+
+            _write_mame_extras(o_file, o_random, ' isdevice="yes"' in s_attribs)
+            o_file.write('\t</machine>\n')
+
+        o_file.write('</mame>\n')
+
+
+def _write_mame_extras(po_file, po_random, pb_device):
+    """
+    Function to write the children of a MAME <machine> element not used by the launcher. Their size and number are
+    similar to the ones found in real MAME dats, where they are most of the file.
+
+    :param po_file: The file object.
+    :type po_file: io.TextIOBase
+
+    :param po_random: The random generator.
+    :type po_random: random.Random
+
+    :param pb_device: Whether the machine is a device, which just have chips.
+    :type pb_device: Bool
+
+    :return: Nothing
+    """
+    ls_lines = []
+    for i_chip in range(po_random.randint(1, 4)):
+        ls_lines.append('\t\t<chip type="cpu" tag="cpu%i" name="Zilog Z80" clock="%i"/>\n'
+                        % (i_chip, po_random.randint(1000000, 8000000)))
+
+    if not pb_device:
+        ls_lines.append('\t\t<display tag="screen" type="raster" rotate="0" width="256" height="224" '
+                        'refresh="60.000000" pixclock="6000000" htotal="384" hbend="0" hbstart="256" vtotal="264" '
+                        'vbend="16" vbstart="240"/>\n')
+        ls_lines.append('\t\t<sound channels="%i"/>\n' % po_random.randint(1, 2))
+
+        ls_lines.append('\t\t<input players="2" coins="2">\n')
+        for i_player in range(1, 3):
+            ls_lines.append('\t\t\t<control type="joy" player="%i" buttons="%i" ways="8"/>\n'
+                            % (i_player, po_random.randint(1, 6)))
+        ls_lines.append('\t\t</input>\n')
+
+        for i_dipswitch in range(po_random.randint(0, 4)):
+            ls_lines.append('\t\t<dipswitch name="Setting %i" tag="DSW" mask="%i">\n' % (i_dipswitch, 3 << i_dipswitch))
+            ls_lines.append('\t\t\t<diplocation name="SW1" number="%i"/>\n' % (i_dipswitch + 1))
+            for i_value in range(po_random.randint(2, 8)):
+                ls_lines.append('\t\t\t<dipvalue name="Value %i" value="%i"%s/>\n'
+                                % (i_value, i_value, ' default="yes"' if i_value == 0 else ''))
+            ls_lines.append('\t\t</dipswitch>\n')
+
+        for i_port in range(po_random.randint(3, 10)):
+            ls_lines.append('\t\t<port tag=":IN%i">\n' % i_port)
+            ls_lines.append('\t\t\t<analog mask="%i"/>\n' % po_random.randint(1, 255))
+            ls_lines.append('\t\t</port>\n')
+
+        ls_lines.append('\t\t<driver status="good" emulation="good" savestate="supported"/>\n')
+
+    po_file.write(''.join(ls_lines))
+
+
+def write_dat(ps_file, ps_format, pi_romsets, pi_seed=0):
+    """
+    Function to write a synthetic dat in any of the supported formats.
+
+    :param ps_file: Path of the file to be written.
+    :type ps_file: Str
+
+    :param ps_format: Format of the dat: 'cmp', 'xml' or 'mame'.
+    :type ps_format: Str
+
+    :param pi_romsets: Number of ROMsets to generate.
+    :type pi_romsets: Int
+
+    :param pi_seed: Seed for the random generator.
+    :type pi_seed: Int
+
+    :return: Nothing
+    """
+    dc_writers = {'cmp': write_cmp_dat,
+                  'xml': write_generic_xml,
+                  'mame': write_mame_xml}
+
+    try:
+        c_writer = dc_writers[ps_format]
+    except KeyError:
+        raise ValueError('Unknown synthetic dat format "%s"' % ps_format)
+
+    c_writer(ps_file, pi_romsets, pi_seed=pi_seed)
+
+
+# Helper Functions
+#=======================================================================================================================
+def _crc32(po_random):
+    return '%08x' % po_random.getrandbits(32)
+
+
+def _md5(po_random):
+    return '%032x' % po_random.getrandbits(128)
+
+
+def _sha1(po_random):
+    return '%040x' % po_random.getrandbits(160)
+
+
+def _iter_console_romsets(pi_romsets, pi_seed):
+    """
+    Function to generate the ROMsets of a synthetic console dat, shared by the ClrMamePro and the generic xml writers.
+
+    :param pi_romsets: Number of ROMsets to generate.
+    :type pi_romsets: Int
+
+    :param pi_seed: Seed for the random generator.
+    :type pi_seed: Int
+
+    :return: An iterator of tuples (name, year, manufacturer, roms). Each ROM is a tuple (name, size, crc32, md5, sha1,
+             status).
+    :rtype: Iterator[Tuple[Str, Str, Str, List[Tuple]]]
+    """
+    o_random = random.Random(pi_seed)
+
+    s_previous = ''
+    ltx_previous_roms = []
+    for i_romset in range(pi_romsets):
+        s_name = 'Game %06i (%s)' % (i_romset, o_random.choice(_ts_REGIONS))
+        s_year = str(o_random.randint(1985, 2005))
+        s_manufacturer = 'Publisher %i' % o_random.randint(0, 300)
+
+        f_random = o_random.random()
+
+        # Revisions of the previous ROMset, with the same data
+        if ltx_previous_roms and f_random < _f_REVISION_RATIO:
+            s_name = '%s (Rev %i)' % (s_name, o_random.randint(1, 3))
+            ltx_roms = [(s_name + tx_rom[0][len(s_previous):],) + tx_rom[1:] for tx_rom in ltx_previous_roms]
+
+        # Multi-track discs
+        elif f_random < _f_REVISION_RATIO + _f_DISC_RATIO:
+            ltx_roms = [('%s.cue' % s_name, o_random.randint(100, 2000), _crc32(o_random), _md5(o_random),
+                         _sha1(o_random), '')]
+            i_tracks = o_random.randint(1, 20)
+            for i_track in range(1, i_tracks + 1):
+                i_size = o_random.randint(300, 700 * 1024 * 1024 // i_tracks // 2352) * 2352
+                ltx_roms.append(('%s (Track %02i).bin' % (s_name, i_track), i_size, _crc32(o_random), _md5(o_random),
+                                 _sha1(o_random), ''))
+
+        # Cartridges
+        else:
+            ltx_roms = [('%s.md' % s_name, 2 ** o_random.randint(17, 23), _crc32(o_random), _md5(o_random),
+                         _sha1(o_random), '')]
+
+        for i_rom, tx_rom in enumerate(ltx_roms):
+            if o_random.random() < _f_BADDUMP_RATIO:
+                ltx_roms[i_rom] = tx_rom[:5] + ('baddump',)
+
+        s_previous = s_name
+        ltx_previous_roms = ltx_roms
+        yield s_name, s_year, s_manufacturer, ltx_roms
@@ -372,7 +372,8 @@ if __name__ == '__main__':
 
     s_dat_path = os.path.join(o_main_cfg.s_dats_dir, f'{o_cmd_args.s_system}.dat')
 
-    o_rom = roms.Rom(ps_platform=o_cmd_args.s_system, ps_path=o_cmd_args.s_rom, ps_dat=s_dat_path)
+    o_rom = roms.Rom(ps_platform=o_cmd_args.s_system, ps_path=o_cmd_args.s_rom, ps_dat=s_dat_path,
+                     ps_cache_dir=o_main_cfg.s_cache_dir)
     print(o_rom.nice_format())
 
     o_window = MainWindow(po_rom=o_rom, po_cfg=o_main_cfg)
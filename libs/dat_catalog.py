@@ -0,0 +1,548 @@
+"""
+Library to store the data of many .dat files in a single SQLite database (a catalog), so single ROMsets can be found
+with indexed queries instead of parsing the whole .dat file every time.
+
+The catalog is optional, everything can be done with dat_files.Dat objects; the catalog is just a faster way to look up
+data. ROMsets and ROMs are stored in normalized tables:
+
+    dats        - One row per .dat file (header data and the fingerprint of the source file).
+    romsets     - One row per ROMset, including its compound hashes and sizes, so they can be searched.
+    roms        - One row per ROM.
+    device_refs - One row per device used by a ROMset.
+"""
+
+import os
+import sqlite3
+
+from . import dat_files
+
+
+# Constants
+#=======================================================================================================================
+# Version of the database schema. Databases with a different version are rebuilt from scratch.
+_i_SCHEMA_VERSION = 2
+
+_s_SCHEMA = '''
+CREATE TABLE dats (
+    id          INTEGER PRIMARY KEY,
+    key         TEXT NOT NULL UNIQUE,
+    name        TEXT,
+    description TEXT,
+    version     TEXT,
+    comment     TEXT,
+    type        TEXT,
+    author      TEXT,
+    homepage    TEXT,
+    fingerprint TEXT
+);
+
+CREATE TABLE romsets (
+    id          INTEGER PRIMARY KEY,
+    dat_id      INTEGER NOT NULL REFERENCES dats(id) ON DELETE CASCADE,
+    name        TEXT NOT NULL,
+    description TEXT,
+    sort_key    TEXT,
+    author      TEXT,
+    year        TEXT,
+    device      INTEGER,
+    cloneof     TEXT,
+    romof       TEXT,
+    sampleof    TEXT,
+    ccrc32      TEXT,
+    dcrc32      TEXT,
+    cmd5        TEXT,
+    dmd5        TEXT,
+    csha1       TEXT,
+    dsha1       TEXT,
+    csize       INTEGER,
+    dsize       INTEGER
+);
+CREATE UNIQUE INDEX romsets_name ON romsets (dat_id, name);
+CREATE INDEX romsets_sort_key ON romsets (dat_id, sort_key);
+CREATE INDEX romsets_description ON romsets (dat_id, description);
+CREATE INDEX romsets_author ON romsets (dat_id, author);
+CREATE INDEX romsets_year ON romsets (dat_id, year);
+CREATE INDEX romsets_ccrc32 ON romsets (dat_id, ccrc32);
+CREATE INDEX romsets_dcrc32 ON romsets (dat_id, dcrc32);
+CREATE INDEX romsets_cmd5 ON romsets (dat_id, cmd5);
+CREATE INDEX romsets_dmd5 ON romsets (dat_id, dmd5);
+CREATE INDEX romsets_csha1 ON romsets (dat_id, csha1);
+CREATE INDEX romsets_dsha1 ON romsets (dat_id, dsha1);
+CREATE INDEX romsets_csize ON romsets (dat_id, csize);
+
+CREATE TABLE roms (
+    id          INTEGER PRIMARY KEY,
+    romset_id   INTEGER NOT NULL REFERENCES romsets(id) ON DELETE CASCADE,
+    name        TEXT,
+    size        INTEGER,
+    crc32       TEXT,
+    md5         TEXT,
+    sha1        TEXT,
+    merge       TEXT,
+    baddump     INTEGER,
+    nodump      INTEGER,
+    bios        INTEGER
+);
+CREATE INDEX roms_romset ON roms (romset_id);
+CREATE INDEX roms_crc32 ON roms (crc32);
+CREATE INDEX roms_md5 ON roms (md5);
+CREATE INDEX roms_sha1 ON roms (sha1);
+CREATE INDEX roms_size ON roms (size);
+
+CREATE TABLE device_refs (
+    id          INTEGER PRIMARY KEY,
+    romset_id   INTEGER NOT NULL REFERENCES romsets(id) ON DELETE CASCADE,
+    name        TEXT
+);
+CREATE INDEX device_refs_romset ON device_refs (romset_id);
+'''
+
+# RomSet attributes that can be searched and the column of the romsets table where they are stored
+_ds_SEARCH_COLUMNS = {'s_year': 'year',
+                      's_ccrc32': 'ccrc32',
+                      's_dcrc32': 'dcrc32',
+                      's_cmd5': 'cmd5',
+                      's_dmd5': 'dmd5',
+                      's_csha1': 'csha1',
+                      's_dsha1': 'dsha1',
+                      's_desc': 'description',
+                      's_name': 'name',
+                      's_auth': 'author'}
+
+_s_ROMSET_COLUMNS = 'id, name, description, device, author, year, cloneof, romof, sampleof'
+_s_ROM_COLUMNS = 'name, size, crc32, md5, sha1, merge, baddump, nodump, bios'
+
+
+# Classes
+#=======================================================================================================================
+class DatCatalog:
+    """
+    Class to store the data of many Dat objects in a SQLite database. Each Dat is stored under a key, which is the
+    absolute path of the .dat file when the data comes from one.
+    """
+    def __init__(self, ps_file):
+        """
+        :param ps_file: Path of the SQLite database. It will be created if it doesn't exist.
+        :type ps_file: Str
+        """
+        self.s_file = ps_file
+
+        s_dir = os.path.dirname(os.path.abspath(ps_file))
+        os.makedirs(s_dir, exist_ok=True)
+
+        self._o_db = sqlite3.connect(ps_file)
+        self._o_db.execute('PRAGMA foreign_keys = ON')
+        self._o_db.execute('PRAGMA journal_mode = WAL')
+        self._create_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __str__(self):
+        s_out = '<DatCatalog>\n'
+        s_out += f'  .s_file:  {self.s_file}\n'
+        s_out += f'  .i_dats:  {len(self.get_keys())}\n'
+        return s_out
+
+    def add_dat(self, po_dat, ps_key, ptx_fingerprint=None):
+        """
+        Method to store a Dat in the catalog. If a Dat already exists with the same key, it'll be replaced.
+
+        :param po_dat: The Dat to be stored.
+        :type po_dat: dat_files.Dat
+
+        :param ps_key: Key to store the Dat under. e.g. '/home/john/dats/mdr-crt.dat'
+        :type ps_key: Str
+
+        :param ptx_fingerprint: Fingerprint of the source file, as returned by dat_files.get_file_fingerprint().
+        :type ptx_fingerprint: Tuple
+
+        :return: The stored data.
+        :rtype: CatalogDat
+        """
+        s_fingerprint = None
+        if ptx_fingerprint is not None:
+            s_fingerprint = repr(tuple(ptx_fingerprint))
+
+        with self._o_db:
+            self._o_db.execute('DELETE FROM dats WHERE key = ?', (ps_key,))
+            o_cursor = self._o_db.execute('INSERT INTO dats (key, name, description, version, comment, type, author, '
+                                          'homepage, fingerprint) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                          (ps_key, po_dat.s_name, po_dat.s_description, po_dat.s_version,
+                                           po_dat.s_comment, po_dat.s_type, po_dat.s_author, po_dat.s_homepage,
+                                           s_fingerprint))
+            i_dat_id = o_cursor.lastrowid
+            self._insert_romsets(i_dat_id, po_dat.iter_unordered())
+
+        return self.get_dat(ps_key)
+
+    def apply_diff(self, ps_key, po_diff, ptx_fingerprint=None):
+        """
+        Method to update a Dat stored in the catalog in place, applying the differences with a new version of it (see
+        dat_files.Dat.get_diff()). Only the rows of the ROMsets in the diff are modified, the rest are kept untouched.
+
+        :param ps_key: Key of the Dat.
+        :type ps_key: Str
+
+        :param po_diff: The differences between the stored version and the new version.
+        :type po_diff: dat_files.DatDiff
+
+        :param ptx_fingerprint: Fingerprint of the new source file, as returned by dat_files.get_file_fingerprint().
+        :type ptx_fingerprint: Tuple
+
+        :return: The updated data.
+        :rtype: CatalogDat
+        """
+        s_fingerprint = None
+        if ptx_fingerprint is not None:
+            s_fingerprint = repr(tuple(ptx_fingerprint))
+
+        with self._o_db:
+            tx_row = self._o_db.execute('SELECT id FROM dats WHERE key = ?', (ps_key,)).fetchone()
+            if tx_row is None:
+                raise ValueError('ERROR: Dat "%s" not found in the catalog' % ps_key)
+            i_dat_id = tx_row[0]
+
+            self._o_db.execute('UPDATE dats SET name = ?, description = ?, version = ?, comment = ?, type = ?, '
+                               'author = ?, homepage = ?, fingerprint = ? WHERE id = ?',
+                               po_diff.tx_header + (s_fingerprint, i_dat_id))
+
+            # Renamed and changed ROMsets are removed and inserted again, with their new data
+            lo_old_romsets = po_diff.lo_removed + [o_old for o_old, _ in po_diff.lto_renamed + po_diff.lto_changed]
+            self._o_db.executemany('DELETE FROM romsets WHERE dat_id = ? AND name = ?',
+                                   [(i_dat_id, o_romset.s_name) for o_romset in lo_old_romsets])
+
+            lo_new_romsets = [o_new for _, o_new in po_diff.lto_renamed + po_diff.lto_changed] + po_diff.lo_added
+            self._insert_romsets(i_dat_id, lo_new_romsets)
+
+        return self.get_dat(ps_key)
+
+    def close(self):
+        """
+        Method to close the database.
+
+        :return: Nothing
+        """
+        self._o_db.close()
+
+    def del_dat(self, ps_key):
+        """
+        Method to remove a Dat from the catalog.
+
+        :param ps_key: Key of the Dat.
+        :type ps_key: Str
+
+        :return: True if the Dat existed and was removed.
+        :rtype: Bool
+        """
+        with self._o_db:
+            o_cursor = self._o_db.execute('DELETE FROM dats WHERE key = ?', (ps_key,))
+        return o_cursor.rowcount > 0
+
+    def get_dat(self, ps_key):
+        """
+        Method to get a Dat stored in the catalog. ROMsets are not loaded, they will be queried when needed.
+
+        :param ps_key: Key of the Dat.
+        :type ps_key: Str
+
+        :return: The stored Dat or None if it doesn't exist.
+        :rtype: Union[CatalogDat, None]
+        """
+        tx_row = self._o_db.execute('SELECT id, name, description, version, comment, type, author, homepage '
+                                    'FROM dats WHERE key = ?', (ps_key,)).fetchone()
+        o_dat = None
+        if tx_row is not None:
+            o_dat = CatalogDat(self, tx_row[0])
+            (o_dat.s_name, o_dat.s_description, o_dat.s_version, o_dat.s_comment, o_dat.s_type, o_dat.s_author,
+             o_dat.s_homepage) = tx_row[1:]
+
+        return o_dat
+
+    def get_keys(self):
+        """
+        Method to get the keys of all the Dats stored in the catalog.
+
+        :return: A list of keys.
+        :rtype: List[Str]
+        """
+        return [tx_row[0] for tx_row in self._o_db.execute('SELECT key FROM dats ORDER BY key')]
+
+    def load_dat_file(self, ps_file):
+        """
+        Method to get the data of a .dat file from the catalog. When the file is not in the catalog yet, or it has
+        changed since it was stored (different size, modification time or parser version), it's parsed and stored
+        again.
+
+        :param ps_file: Path of the .dat file. e.g. '/home/john/dats/mdr-crt.dat'
+        :type ps_file: Str
+
+        :return: The stored Dat.
+        :rtype: CatalogDat
+        """
+        if not os.path.isfile(ps_file):
+            raise ValueError('Can\'t find dat file "%s"' % ps_file)
+
+        s_key = os.path.abspath(ps_file)
+        tx_fingerprint = dat_files.get_file_fingerprint(ps_file)
+
+        tx_row = self._o_db.execute('SELECT fingerprint FROM dats WHERE key = ?', (s_key,)).fetchone()
+        if tx_row is not None and tx_row[0] == repr(tx_fingerprint):
+            o_dat = self.get_dat(s_key)
+        else:
+            o_dat = self.add_dat(dat_files.Dat(ps_file), s_key, ptx_fingerprint=tx_fingerprint)
+
+        return o_dat
+
+    def _create_schema(self):
+        """
+        Method to create the tables of the database when they don't exist or were created with a different schema.
+
+        :return: Nothing
+        """
+        i_version = self._o_db.execute('PRAGMA user_version').fetchone()[0]
+        if i_version != _i_SCHEMA_VERSION:
+            with self._o_db:
+                for s_table in ('device_refs', 'roms', 'romsets', 'dats'):
+                    self._o_db.execute(f'DROP TABLE IF EXISTS {s_table}')
+            self._o_db.executescript(_s_SCHEMA)
+            self._o_db.execute(f'PRAGMA user_version = {_i_SCHEMA_VERSION}')
+            self._o_db.commit()
+
+    def _insert_romsets(self, pi_dat_id, plo_romsets):
+        """
+        Method to insert ROMsets and their ROMs. Ids are assigned in advance so both tables can be filled with bulk
+        inserts. It must be called inside a transaction.
+
+        :param pi_dat_id: Id of the Dat the ROMsets belong to.
+        :type pi_dat_id: Int
+
+        :param plo_romsets: ROMsets to be inserted.
+        :type plo_romsets: Iterable[dat_files.RomSet]
+
+        :return: Nothing
+        """
+        i_romset_id = self._o_db.execute('SELECT COALESCE(MAX(id), 0) FROM romsets').fetchone()[0]
+
+        ltx_romsets = []
+        ltx_roms = []
+        ltx_device_refs = []
+        for o_romset in plo_romsets:
+            i_romset_id += 1
+            ltx_romsets.append((i_romset_id, pi_dat_id, o_romset.s_name, o_romset.s_desc,
+                                (o_romset.s_desc or '').lower(), o_romset.s_auth, o_romset.s_year,
+                                int(o_romset.b_device), o_romset.s_cloneof, o_romset.s_romof, o_romset.s_sampleof,
+                                o_romset.s_ccrc32, o_romset.s_dcrc32, o_romset.s_cmd5, o_romset.s_dmd5,
+                                o_romset.s_csha1, o_romset.s_dsha1, o_romset.i_csize, o_romset.i_dsize))
+            for o_rom in o_romset:
+                ltx_roms.append((i_romset_id, o_rom.s_name, o_rom.i_size, o_rom.s_crc32, o_rom.s_md5, o_rom.s_sha1,
+                                 o_rom.s_merge, int(o_rom.b_baddump), int(o_rom.b_nodump), int(o_rom.b_bios)))
+            for s_device_ref in o_romset.ts_device_refs:
+                ltx_device_refs.append((i_romset_id, s_device_ref))
+
+        self._o_db.executemany('INSERT INTO romsets (id, dat_id, name, description, sort_key, author, year, device, '
+                               'cloneof, romof, sampleof, ccrc32, dcrc32, cmd5, dmd5, csha1, dsha1, csize, dsize) '
+                               'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', ltx_romsets)
+        self._o_db.executemany(f'INSERT INTO roms (romset_id, {_s_ROM_COLUMNS}) '
+                               f'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', ltx_roms)
+        self._o_db.executemany('INSERT INTO device_refs (romset_id, name) VALUES (?, ?)', ltx_device_refs)
+
+    def _build_romsets(self, ps_where, ptx_params, ps_limit=''):
+        """
+        Method to query ROMsets and convert them into RomSet objects (including their ROMs).
+
+        :param ps_where: SQL condition for the romsets table.
+        :type ps_where: Str
+
+        :param ptx_params: Parameters of the condition.
+        :type ptx_params: Tuple
+
+        :param ps_limit: Optional SQL limit clause. e.g. 'LIMIT 1'
+        :type ps_limit: Str
+
+        :return: The ROMsets sorted by description.
+        :rtype: List[dat_files.RomSet]
+        """
+        lo_romsets = []
+        for i_id, s_name, s_desc, i_device, s_auth, s_year, s_cloneof, s_romof, s_sampleof in self._o_db.execute(
+                f'SELECT {_s_ROMSET_COLUMNS} FROM romsets WHERE {ps_where} ORDER BY sort_key, id {ps_limit}',
+                ptx_params):
+            o_romset = dat_files.RomSet(s_name, s_desc, pb_device=bool(i_device))
+            o_romset.s_auth = s_auth
+            o_romset.s_year = s_year
+            o_romset.s_cloneof = s_cloneof
+            o_romset.s_romof = s_romof
+            o_romset.s_sampleof = s_sampleof
+            o_romset.ts_device_refs = tuple(tx_row[0] for tx_row in self._o_db.execute(
+                'SELECT name FROM device_refs WHERE romset_id = ? ORDER BY id', (i_id,)))
+
+            for (s_rom_name, i_size, s_crc32, s_md5, s_sha1, s_merge, i_baddump, i_nodump,
+                 i_bios) in self._o_db.execute(f'SELECT {_s_ROM_COLUMNS} FROM roms WHERE romset_id = ? ORDER BY id',
+                                               (i_id,)):
+                o_rom = dat_files.Rom()
+                o_rom.s_name = s_rom_name
+                o_rom.i_size = i_size
+                o_rom.s_crc32 = s_crc32
+                o_rom.s_md5 = s_md5
+                o_rom.s_sha1 = s_sha1
+                o_rom.s_merge = s_merge
+                o_rom.b_baddump = bool(i_baddump)
+                o_rom.b_nodump = bool(i_nodump)
+                o_rom.b_bios = bool(i_bios)
+                o_romset.add_rom(o_rom)
+
+            lo_romsets.append(o_romset)
+
+        return lo_romsets
+
+
+class CatalogDat:
+    """
+    Class to access the data of a Dat stored in a DatCatalog. It offers the same lookup methods as dat_files.Dat, but
+    ROMsets are read from the database only when they are requested.
+    """
+    def __init__(self, po_catalog, pi_id):
+        """
+        :param po_catalog: Catalog where the data is stored.
+        :type po_catalog: DatCatalog
+
+        :param pi_id: Id of the Dat in the catalog.
+        :type pi_id: Int
+        """
+        self._o_catalog = po_catalog
+        self._i_id = pi_id
+
+        self.s_name = ''
+        self.s_description = ''
+        self.s_version = ''
+        self.s_comment = ''
+        self.s_type = ''
+        self.s_author = ''
+        self.s_homepage = ''
+
+    def __len__(self):
+        return self.i_romsets
+
+    def __str__(self):
+        s_out = '<CatalogDat>\n'
+        s_out += '  .s_name:     %s\n' % self.s_name
+        s_out += '  .s_desc:     %s\n' % self.s_description
+        s_out += '  .s_version:  %s\n' % self.s_version
+        s_out += '  .s_homepage: %s\n' % self.s_homepage
+        s_out += '  .s_comment:  %s\n' % self.s_comment
+        s_out += '  .s_type:     %s\n' % self.s_type
+        s_out += '  .s_author:   %s\n' % self.s_author
+        s_out += '  .i_romsets:  %s\n' % self.i_romsets
+        return s_out
+
+    def get_romset_by_name(self, ps_name):
+        """
+        Method to find and return a ROMset by its name.
+
+        :param ps_name:
+        :type ps_name: Str
+
+        :return: The found ROMset or None if no ROMset is found
+        :rtype: Union[dat_files.RomSet, None]
+        """
+        lo_romsets = self._o_catalog._build_romsets('dat_id = ? AND name = ?', (self._i_id, ps_name))
+
+        o_romset = None
+        if lo_romsets:
+            o_romset = lo_romsets[0]
+
+        return o_romset
+
+    def get_romsets_by_size(self, pi_size):
+        """
+        Method to get the ROMsets with a clean size.
+
+        :param pi_size: Clean size in bytes.
+        :type pi_size: Int
+
+        :return: A list with the found ROMsets, sorted by description.
+        :rtype: List[dat_files.RomSet]
+        """
+        return self._o_catalog._build_romsets('dat_id = ? AND csize = ?', (self._i_id, pi_size))
+
+    def get_romsets_by_field(self, ps_field, pb_first=False, ptx_search_values=()):
+        """
+        Method to get a list of ROMsets with certain content in a field. It works like
+        dat_files.Dat.get_romsets_by_field().
+
+        :param ps_field: Name of the field to use for the matching. i.e. 's_ccrc32'
+        :type ps_field: Str
+
+        :param pb_first: Whether the function will just return the first result or all of them.
+        :type pb_first: Bool
+
+        :param ptx_search_values: Content of the field to search for. i.e. '1985', '1986'
+        :type ptx_search_values: Tuple
+
+        :return: A list with the found romsets, sorted by description.
+        :rtype: List[dat_files.RomSet]
+        """
+        if not isinstance(ptx_search_values, tuple):
+            raise ValueError('ERROR: ptx_search_values must be a tuple. %s given instead' % type(ptx_search_values))
+
+        if ps_field not in _ds_SEARCH_COLUMNS:
+            raise ValueError('Error: ps_field must be one of %s' % str(tuple(_ds_SEARCH_COLUMNS.keys())))
+
+        lo_romsets = []
+        if ptx_search_values:
+            s_column = _ds_SEARCH_COLUMNS[ps_field]
+            s_values = ', '.join('?' * len(ptx_search_values))
+            s_limit = ''
+            if pb_first:
+                s_limit = 'LIMIT 1'
+
+            lo_romsets = self._o_catalog._build_romsets(f'dat_id = ? AND {s_column} IN ({s_values})',
+                                                        (self._i_id,) + ptx_search_values, s_limit)
+
+        return lo_romsets
+
+    def identify_file(self, ps_file, pc_hasher=None):
+        """
+        Method to identify a ROM file (or zip archive) by its content. It works like dat_files.Dat.identify_file(), the
+        candidates are found with the index of clean sizes of the catalog.
+
+        :param ps_file: Path of the file.
+        :type ps_file: Str
+
+        :param pc_hasher: Function used to hash the file. See dat_files.identify_file_by_hash().
+        :type pc_hasher: Union[Callable[[Str, List[Str]], Dict[Str:Str]], None]
+
+        :return: The found ROMset or None if no ROMset matches the file.
+        :rtype: Union[dat_files.RomSet, None]
+        """
+        ltx_members = dat_files.read_zip_members(ps_file)
+        if ltx_members is not None:
+            i_size = sum(i_member_size for _, i_member_size, _ in ltx_members)
+            return dat_files.identify_zip_members(ltx_members, self.get_romsets_by_size(i_size))
+
+        return dat_files.identify_file_by_hash(ps_file, self.get_romsets_by_size(os.path.getsize(ps_file)),
+                                               pc_hasher=pc_hasher)
+
+    def _get_i_romsets(self):
+        return self._o_catalog._o_db.execute('SELECT COUNT(*) FROM romsets WHERE dat_id = ?',
+                                             (self._i_id,)).fetchone()[0]
+
+    i_romsets = property(fget=_get_i_romsets, fset=None)
+
+
+# Functions
+#=======================================================================================================================
+def get_catalog_path(ps_cache_dir):
+    """
+    Function to get the path of the catalog database inside a cache dir.
+
+    :param ps_cache_dir: Root cache directory.
+    :type ps_cache_dir: Str
+
+    :return: The path of the catalog. e.g. '/home/john/cache/dats/catalog.sqlite3'
+    :rtype: Str
+    """
+    return os.path.join(ps_cache_dir, 'dats', 'catalog.sqlite3')
@@ -10,11 +10,31 @@ Link with information about different .dat file formats:
     https://github.com/SabreTools/SabreTools/wiki/DatFile-Formats#mame-list-xml-format
 """
 
-import codecs
-import configparser
+import abc
+import concurrent.futures
+import gzip
+import hashlib
+import html
+import io
+import itertools
+import lzma
+import mmap
+import pickle
 import xml.etree.cElementTree
 import os
 import re
+import sys
+import time
+import xml.sax.saxutils
+import zipfile
+
+# NumPy is optional, it's only required by the columnar representation of the dats (DatColumns).
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import hashing
 
 
 # Constants
@@ -25,12 +45,135 @@ _ts_IGNORE_EXTS = ('cue',)
 # Text values than will be considered as True
 ss_TRUE_VALUES = ('1', 'yes', 'true')
 
+# Sections of MAME support files with ini layout that don't contain ROMsets information
+_ts_INI_IGNORE_SECTIONS = ('folder_settings', 'root_folder')
+
+# Version of the parsed data layout. Increase it every time the readers change the data they produce, so the cached
+# snapshots created by older versions are considered stale and rebuilt.
+_i_PARSER_VERSION = 9
+
+# Number of bytes read from the beginning of .dat files to identify their format
+_i_SNIFF_SIZE = 8192
+
+# Magic numbers of the compression formats supported for .dat files
+_dx_COMPRESSION_MAGIC = {'zip': b'PK\x03\x04',
+                         'gzip': b'\x1f\x8b',
+                         'xz': b'\xfd7zXZ\x00'}
+
+# Extensions of the files that are considered .dat files inside zip archives
+_ts_ZIP_DAT_EXTS = ('dat', 'xml')
+
+# Regular expressions to tokenize ClrMamePro dats. A token is a key followed by a quoted value, a block without nested
+# blocks, the opening of a block with nested blocks or a bare value; or a closing parenthesis. Inside blocks without
+# nested blocks, pairs of key and value are found by the second expression.
+_o_CMP_TOKEN_REGEX = re.compile(rb'([^\s()"]+)\s*'
+                                rb'(?:"([^"]*)"|\(([^()"]*(?:"[^"]*"[^()"]*)*)\)|(\()|([^\s()"]+))'
+                                rb'|(\))')
+_o_CMP_PAIR_REGEX = re.compile(r'([^\s()"]+)\s+(?:"([^"]*)"|([^\s()"]+))')
+
+# Names of the ClrMamePro blocks containing ROMsets
+_ts_CMP_ROMSET_BLOCKS = (b'game', b'machine', b'resource')
+
+# ClrMamePro ROMset fields and the RomSet attributes they are stored in
+_ds_CMP_ROMSET_FIELDS = {b'name': 's_name',
+                         b'description': 's_desc',
+                         b'manufacturer': 's_auth',
+                         b'year': 's_year',
+                         b'cloneof': 's_cloneof',
+                         b'romof': 's_romof',
+                         b'sampleof': 's_sampleof'}
+
+# ClrMamePro ROMset fields whose values are repeated in many ROMsets, so they are interned
+_ts_CMP_INTERNED_FIELDS = (b'manufacturer', b'year', b'cloneof', b'romof', b'sampleof')
+
+# Regular expressions used to build the offset index of xml dats (lazy mode): "name" attribute of the ROMset elements
+# and encoding in the xml declaration.
+_o_XML_NAME_REGEX = re.compile(rb'\sname\s*=\s*(["\'])(.*?)\1', re.S)
+_o_XML_ENCODING_REGEX = re.compile(rb'<\?xml[^>]*?\sencoding\s*=\s*["\']([^"\']+)')
+
+# Regular expression to find the start of the <machine> elements of MAME xml dats, used to split them in chunks
+_o_XML_MACHINE_REGEX = re.compile(rb'<machine[\s/>]')
+
+# Children of the <machine> elements of MAME xml dats used by the reader. The rest of them (chips, inputs, dipswitches,
+# ports...), which are most of the file, are removed before the xml is parsed. See _xml_skip_regex().
+_ts_MAME_TAGS = ('description', 'year', 'manufacturer', 'rom', 'device_ref')
+
+# Size of the blocks MAME xml dats are read in, so the unwanted elements are removed from each block before parsing it.
+# All the machines of a block are built as xml elements at once, so bigger blocks use more memory without being faster.
+_i_XML_BLOCK_SIZE = 64 * 1024
+
+# Types of ROMsets collections: where the ROMs shared by parents, clones and bios are stored. See
+# Dat.get_required_files().
+_ts_SET_MODES = ('split', 'merged', 'non-merged')
+
+# Fields ROMsets can be matched by in set operations between Dats. See Dat.union().
+_ts_SET_KEYS = ('s_name', 's_ccrc32', 's_csha1')
+
+# Methods of the filters and operators of the groups of filters used to query Dats. See Filter and FilterGroup.
+_ts_FILTER_METHODS = ('equals', 'in', 'range', 'regex', 'prefix')
+_ts_FILTER_OPERATORS = ('and', 'or', 'not')
+
+# Length, in hex digits, of each type of hash and the Rom attribute where it's stored
+_dti_HASH_TYPES = {'crc32': (8, 's_crc32'),
+                   'md5': (32, 's_md5'),
+                   'sha1': (40, 's_sha1')}
+
+# Keys of the values cached by ROMsets (relevant ROMs and compound hashes, clean or dirty). The same tuple objects are
+# always used, since new tuples stored in the caches of millions of ROMsets trigger slow garbage collections.
+_dt_CACHE_KEYS = {(s_value, b_clean): (s_value, b_clean) for s_value in ('roms',) + tuple(_dti_HASH_TYPES)
+                  for b_clean in (False, True)}
+
+# Bit flags used to store the boolean properties of a Rom in a compact way inside cached snapshots
+_i_FLAG_BADDUMP = 1
+_i_FLAG_NODUMP = 2
+_i_FLAG_BIOS = 4
+
+# Extra bit flags used by the columnar representation of the dats (DatColumns): ROMsets being devices, ROMs being part
+# of the clean ROMs of their ROMset and ROMs with unknown (None) hashes.
+_i_FLAG_DEVICE = 8
+_i_FLAG_CLEAN = 16
+_di_FLAG_NO_HASH = {'crc32': 32,
+                    'md5': 64,
+                    'sha1': 128}
+
 
 # Classes
 #=======================================================================================================================
-class Filter:
+class _Query(abc.ABC):
+    """
+    Base class of the queries used to filter the ROMsets of a Dat (see Dat.query()). Queries are combined with the
+    operators & (and), | (or) and ~ (not).
+    """
+    def __and__(self, po_other):
+        return FilterGroup('and', self, po_other)
+
+    def __or__(self, po_other):
+        return FilterGroup('or', self, po_other)
+
+    def __invert__(self):
+        return FilterGroup('not', self)
+
+    @abc.abstractmethod
+    def compile(self, po_dat):
+        """
+        Method to compile the query for a Dat, choosing between the indexes of the Dat and a scan of all the ROMsets.
+
+        :param po_dat: The Dat.
+        :type po_dat: Dat
+
+        :return: The compiled query.
+        :rtype: _QueryPlan
+        """
+
+
+class Filter(_Query):
     """
-    Class to store information about a filter that will be applied later to Dat.
+    Class to store information about a filter that will be applied later to Dat. Methods:
+
+        - equals / in: the attribute is one of the values.
+        - range: the attribute is between the two values, both included. None for an open end.
+        - regex: the attribute matches (re.search) any of the regular expressions.
+        - prefix: the attribute starts with any of the values.
     """
 
     def __init__(self, s_attribute, s_method, *x_values):
@@ -38,13 +181,20 @@ class Filter:
         self.s_method = s_method
         self.lx_values = x_values
 
+        if s_method not in _ts_FILTER_METHODS:
+            raise ValueError('ERROR: s_method must be one of %s' % str(_ts_FILTER_METHODS))
+
+        if s_method == 'range' and len(x_values) != 2:
+            raise ValueError('ERROR: range filters need two values (minimum and maximum)')
+
         for x_value in x_values:
+            if s_method == 'range' and x_value is None:
+                continue
+            if s_method in ('regex', 'prefix') and not isinstance(x_value, str):
+                raise Exception('ERROR, type "%s" is not valid value for a %s filter' % (type(x_value), s_method))
             if not isinstance(x_value, (str, int, float)):
                 raise Exception('ERROR, type "%s" is not valid value for a filter' % type(x_value))
 
-        # TODO: Check for valid values for s_method. So far 'equals' is the only one implemented.
-        # TODO: Create a check for x_values to avoid the case when you create a wrong filter with a tuple (123, 145)
-
     def __str__(self):
         s_out = ''
         s_out += '<Filter>\n'
@@ -54,6 +204,183 @@ class Filter:
 
         return s_out.encode('utf8', 'strict')
 
+    def compile(self, po_dat):
+        """
+        Method to compile the filter for a Dat. Filters over an indexed field (see Dat.get_romsets_by_field()) use the
+        index of the field: equals/in filters build it when needed and get the ROMsets of each value; the rest of
+        methods check the values of an index already built instead of the ROMsets. Otherwise, all the ROMsets are
+        scanned.
+
+        :param po_dat: The Dat.
+        :type po_dat: Dat
+
+        :return: The compiled filter.
+        :rtype: _QueryPlan
+        """
+        s_attribute = self.s_attribute
+        if not hasattr(RomSet, s_attribute):
+            raise Exception('ERROR: You are trying to access the unknown attribute "%s"' % s_attribute)
+
+        c_value = self._get_value_matcher()
+        s_filter = '%s %s %s' % (s_attribute, self.s_method, str(self.lx_values))
+
+        dlo_index = None
+        if s_attribute in po_dat._ts_valid_search_fields or s_attribute == 'i_csize':
+            if self.s_method in ('equals', 'in'):
+                dlo_index = po_dat._get_index(s_attribute)
+            else:
+                dlo_index = po_dat._ddlo_indexes.get(s_attribute)
+
+        if dlo_index is None:
+            return _QueryPlan(lambda po_romset: c_value(getattr(po_romset, s_attribute)),
+                              pls_explain=['SCAN %s' % s_filter])
+
+        if self.s_method in ('equals', 'in'):
+            lx_keys = [x_value for x_value in dict.fromkeys(self.lx_values) if x_value in dlo_index]
+            s_keys = '%i values' % len(lx_keys)
+        else:
+            lx_keys = [x_key for x_key in dlo_index if c_value(x_key)]
+            s_keys = '%i of %i values' % (len(lx_keys), len(dlo_index))
+
+        lo_romsets = [o_romset for x_key in lx_keys for o_romset in dlo_index[x_key]]
+        s_explain = 'INDEX %s (%s): %i ROMsets' % (s_filter, s_keys, len(lo_romsets))
+        return _QueryPlan(lambda po_romset: c_value(getattr(po_romset, s_attribute)), lo_romsets, [s_explain])
+
+    def _get_value_matcher(self):
+        """
+        Method to build the function checking whether a value of the attribute matches the filter.
+
+        :return: The function, which gets the value and returns whether it matches.
+        :rtype: Callable[[Any], Bool]
+        """
+        if self.s_method in ('equals', 'in'):
+            sx_values = frozenset(self.lx_values)
+            return lambda px_value: px_value in sx_values
+
+        elif self.s_method == 'range':
+            x_min, x_max = self.lx_values
+
+            def _c_match(px_value):
+                # Values of other types (e.g. None for unknown hashes) are never in the range
+                try:
+                    return (x_min is None or px_value >= x_min) and (x_max is None or px_value <= x_max)
+                except TypeError:
+                    return False
+
+            return _c_match
+
+        elif self.s_method == 'regex':
+            o_regex = re.compile('|'.join('(?:%s)' % s_pattern for s_pattern in self.lx_values))
+            return lambda px_value: isinstance(px_value, str) and o_regex.search(px_value) is not None
+
+        else:
+            ts_prefixes = tuple(self.lx_values)
+            return lambda px_value: isinstance(px_value, str) and px_value.startswith(ts_prefixes)
+
+
+class FilterGroup(_Query):
+    """
+    Class to combine filters (or other groups) with a boolean operator: 'and', 'or' or 'not' (just one query).
+    """
+
+    def __init__(self, ps_operator, *po_queries):
+        if ps_operator not in _ts_FILTER_OPERATORS:
+            raise ValueError('ERROR: ps_operator must be one of %s' % str(_ts_FILTER_OPERATORS))
+
+        if ps_operator == 'not' and len(po_queries) != 1:
+            raise ValueError('ERROR: "not" groups need exactly one query')
+
+        if not po_queries:
+            raise ValueError('ERROR: Filter groups need at least one query')
+
+        self.s_operator = ps_operator
+        self.lo_queries = po_queries
+
+    def compile(self, po_dat):
+        """
+        Method to compile the group for a Dat:
+
+            - and: when any query uses an index, the ROMsets found with the smallest one are checked with the rest of
+              queries. Otherwise, all the ROMsets are scanned.
+            - or: when all the queries use indexes, the ROMsets found with them are joined. Otherwise, all the ROMsets
+              are scanned.
+            - not: all the ROMsets are scanned, checking whether they were found by the index of the query, if any.
+
+        :param po_dat: The Dat.
+        :type po_dat: Dat
+
+        :return: The compiled group.
+        :rtype: _QueryPlan
+        """
+        lo_plans = [o_query.compile(po_dat) for o_query in self.lo_queries]
+        ls_children = ['  %s' % s_line for o_plan in lo_plans for s_line in o_plan.ls_explain]
+        lc_matches = [o_plan.c_match for o_plan in lo_plans]
+        lo_indexed = [o_plan for o_plan in lo_plans if o_plan.lo_romsets is not None]
+
+        if self.s_operator == 'and':
+            c_match = lambda po_romset: all(c_query(po_romset) for c_query in lc_matches)
+            if not lo_indexed:
+                return _QueryPlan(c_match, pls_explain=['AND: SCAN'] + ls_children)
+
+            o_smallest = min(lo_indexed, key=lambda o_plan: len(o_plan.lo_romsets))
+            lc_others = [o_plan.c_match for o_plan in lo_plans if o_plan is not o_smallest]
+            lo_romsets = [o_romset for o_romset in o_smallest.lo_romsets
+                          if all(c_other(o_romset) for c_other in lc_others)]
+            s_explain = 'AND: INDEX of query %i (%i candidates): %i ROMsets' % (lo_plans.index(o_smallest) + 1,
+                                                                               len(o_smallest.lo_romsets),
+                                                                               len(lo_romsets))
+            return _QueryPlan(c_match, lo_romsets, [s_explain] + ls_children)
+
+        elif self.s_operator == 'or':
+            c_match = lambda po_romset: any(c_query(po_romset) for c_query in lc_matches)
+            if len(lo_indexed) < len(lo_plans):
+                return _QueryPlan(c_match, pls_explain=['OR: SCAN'] + ls_children)
+
+            # ROMsets found by several queries are kept once
+            do_romsets = {id(o_romset): o_romset for o_plan in lo_plans for o_romset in o_plan.lo_romsets}
+            lo_romsets = list(do_romsets.values())
+            return _QueryPlan(c_match, lo_romsets, ['OR: INDEX: %i ROMsets' % len(lo_romsets)] + ls_children)
+
+        else:
+            o_plan = lo_plans[0]
+            if o_plan.lo_romsets is None:
+                c_child = o_plan.c_match
+                return _QueryPlan(lambda po_romset: not c_child(po_romset), pls_explain=['NOT: SCAN'] + ls_children)
+
+            si_excluded = {id(o_romset) for o_romset in o_plan.lo_romsets}
+            return _QueryPlan(lambda po_romset: id(po_romset) not in si_excluded,
+                              pls_explain=['NOT: SCAN excluding the ROMsets of the index'] + ls_children)
+
+
+class _QueryPlan(object):
+    """
+    Class to store a query compiled for a Dat (see _Query.compile()).
+
+    :ivar c_match: Callable[[RomSet], Bool]
+    :ivar lo_romsets: Union[List[RomSet], None]
+    :ivar ls_explain: List[Str]
+    """
+    def __init__(self, pc_match, plo_romsets=None, pls_explain=()):
+        self.c_match = pc_match              # Function checking whether a ROMset matches the query.
+        self.lo_romsets = plo_romsets        # ROMsets matching the query found with indexes. None when not indexed.
+        self.ls_explain = list(pls_explain)  # Description of how the query is resolved, one line per query.
+
+    def get_romsets(self, po_dat):
+        """
+        Method to get the ROMsets of a Dat matching the query, from the indexes or scanning all of them.
+
+        :param po_dat: The Dat the query was compiled for.
+        :type po_dat: Dat
+
+        :return: The ROMsets.
+        :rtype: List[RomSet]
+        """
+        if self.lo_romsets is not None:
+            return self.lo_romsets
+
+        c_match = self.c_match
+        return [o_romset for o_romset in po_dat.iter_unordered() if c_match(o_romset)]
+
 
 class Field:
     """
@@ -73,7 +400,23 @@ class Dat(object):
 
     """
 
-    def __init__(self, ps_file=''):
+    def __init__(self, ps_file='', ps_cache_dir='', pb_lazy=False, pi_workers=1, pts_tags=None):
+        """
+        :param ps_file: Path of a .dat file to populate the object.
+        :type ps_file: Str
+
+        :param ps_cache_dir: Directory to store/read a compiled snapshot of the .dat file. Empty to disable the cache.
+        :type ps_cache_dir: Str
+
+        :param pb_lazy: Whether the .dat file is opened in lazy mode. See read_from_dat().
+        :type pb_lazy: Bool
+
+        :param pi_workers: Number of worker processes used to parse the .dat file. See read_from_dat().
+        :type pi_workers: Int
+
+        :param pts_tags: Children of the ROMset elements of MAME xml dats to be read. See read_from_dat().
+        :type pts_tags: Union[Tuple[Str], None]
+        """
 
         # TODO: Dat should contain an internal registry with all the manipulations suffered by the object so
         #       when you export the file to disk you know the information is not coming directly from the RAW dat file.
@@ -104,22 +447,36 @@ class Dat(object):
         self.s_type = ''         # type of DAT file the data comes from.
         self.s_author = ''       # Author of the dat.
         self.s_homepage = ''     # Homepage of the author of the DAT.
+        self.i_skipped = 0       # Number of children of the machines removed while parsing the file (MAME xml dats
+                                 # only). Just the outermost ones are counted, so a <dipswitch> with all its
+                                 # <dipvalue> children counts as one. Always 0 in lazy mode.
 
-        self._do_romsets = {}    # list of game objects inside the dat file
+        self._do_romsets = {}    # list of game objects inside the dat file (a _LazyRomSets in lazy mode)
+        self._ddlo_indexes = {}  # Secondary indexes, built on demand: field name => field value => list of ROMsets
+        self._lo_sorted = None   # ROMsets sorted by description, built on demand
+        self._ds_sort_keys = {}  # Collation keys used to sort the ROMsets: ROMset name => key
+        self._dx_closures = {}   # Dependencies and required files of the ROMsets, built on demand: key => result
 
         self._db_flags = {'from_dat': False,
                           'sets_added': False,
                           'sets_deleted': False,
                           'data_imported': False}       # Modification flags
 
-        self._ts_valid_search_fields = ('_i_year',
+        self._ts_valid_search_fields = ('s_year',
                                         's_ccrc32', 's_dcrc32',
                                         's_cmd5', 's_dmd5',
                                         's_csha1', 's_dsha1',
                                         's_desc', 's_name', 's_auth')
 
         if ps_file:
-            self.read_from_dat(ps_file)
+            self.read_from_dat(ps_file, ps_cache_dir=ps_cache_dir, pb_lazy=pb_lazy, pi_workers=pi_workers,
+                               pts_tags=pts_tags)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def __str__(self):
         s_out = '<Dat>\n'
@@ -139,11 +496,21 @@ class Dat(object):
 
     def __iter__(self):
         """
+        Iteration over the ROMsets sorted by description. The sorted list is cached until ROMsets are added or removed.
+        When order is not important, use iter_unordered() which is faster.
 
         :return:
         :rtype Iterator[RomSet]
         """
-        return iter(sorted(self._do_romsets.values(), key=lambda o_romset: o_romset.s_desc.lower()))
+        if self._lo_sorted is None:
+            ds_sort_keys = self._ds_sort_keys
+            for s_name, o_romset in self._do_romsets.items():
+                if s_name not in ds_sort_keys:
+                    ds_sort_keys[s_name] = o_romset.s_desc.lower()
+
+            self._lo_sorted = sorted(self._do_romsets.values(), key=lambda o_romset: ds_sort_keys[o_romset.s_name])
+
+        return iter(self._lo_sorted)
 
     def __len__(self):
         return self.i_romsets
@@ -159,6 +526,30 @@ class Dat(object):
             raise ValueError('ERROR: ROMset already exists in the Dat.')
 
         self._do_romsets[po_romset.s_name] = po_romset
+        self._clear_indexes()
+
+    def apply_diff(self, po_diff):
+        """
+        Method to apply a diff generated by get_diff() to the Dat, so it becomes equal to the new version of the Dat.
+        Only the ROMsets in the diff are modified, and the RomSet objects of the new version are shared, not copied.
+
+        :param po_diff: The diff.
+        :type po_diff: DatDiff
+
+        :return: Nothing
+        """
+        (self.s_name, self.s_description, self.s_version, self.s_comment, self.s_type, self.s_author,
+         self.s_homepage) = po_diff.tx_header
+
+        for o_romset in po_diff.lo_removed:
+            self.del_romset(o_romset.s_name)
+
+        for o_old_romset, o_new_romset in po_diff.lto_renamed + po_diff.lto_changed:
+            self.del_romset(o_old_romset.s_name)
+            self.add_romset(o_new_romset)
+
+        for o_romset in po_diff.lo_added:
+            self.add_romset(o_romset)
 
     def del_romset(self, ps_name):
         """
@@ -175,6 +566,8 @@ class Dat(object):
         if ps_name in self._do_romsets:
             b_found = True
             del self._do_romsets[ps_name]
+            self._ds_sort_keys.pop(ps_name, None)
+            self._clear_indexes()
 
         return b_found
 
@@ -182,32 +575,15 @@ class Dat(object):
         """
         Method to return ROMsets with duplicated CRC32
 
-        :return: a list of ROMsets
-        :rtype: List[RomSet]
+        :return: a dictionary with the ROMsets sharing each duplicated clean CRC32
+        :rtype: Dict[Str:List[RomSet]]
         """
 
-        # [1/3] We count how many times each CRC32 appears in the Dat
-        #------------------------------------------------------------------------
-        di_romsets = {}
-        for o_romset in self:
-            s_ccrc32 = o_romset.s_ccrc32
-            if s_ccrc32 not in di_romsets:
-                di_romsets[s_ccrc32] = 1
-            else:
-                di_romsets[s_ccrc32] += 1
-
-        # [2/3] Then we keep only those that appear more than once
-        #---------------------------------------------------------
-        ls_repeated_ccrc32 = []
-        for s_ccrc32, i_times in di_romsets.items():
-            if i_times > 1:
-                ls_repeated_ccrc32.append(s_ccrc32)
-
-        # [3/3] For each repeated CRC32, we get all the ROMsets with that CRC32
-        #----------------------------------------------------------------------
+        # The index of clean CRC32 already groups the ROMsets, so we just keep the groups with more than one ROMset
         do_romset_collisions = {}
-        for s_ccrc32 in ls_repeated_ccrc32:
-            do_romset_collisions[s_ccrc32] = self.get_romsets_by_field('s_ccrc32', False, s_ccrc32)
+        for s_ccrc32, lo_romsets in self._get_index('s_ccrc32').items():
+            if len(lo_romsets) > 1:
+                do_romset_collisions[s_ccrc32] = list(lo_romsets)
 
         return do_romset_collisions
 
@@ -222,7 +598,7 @@ class Dat(object):
 
         # 1st we group the ROMsets with equal MD5 in a dictionary, so for each MD5 (key), we have a list o ROMset names
         dls_duplicated_romsets = {}
-        for o_romset in self:
+        for o_romset in self.iter_unordered():
             if o_romset.s_dmd5 not in dls_duplicated_romsets:
                 dls_duplicated_romsets[o_romset.s_dmd5] = []
 
@@ -231,7 +607,7 @@ class Dat(object):
         # Then we filter out those "families" of ROMsets with only one member so we actually have a dictionary of
         # ROMsets with duplicated MD5
         dls_clean_duplicated_romsets = {}
-        for s_key, ls_values in dls_duplicated_romsets.iteritems():
+        for s_key, ls_values in dls_duplicated_romsets.items():
             if len(ls_values) > 1:
                 dls_clean_duplicated_romsets[s_key] = set(ls_values)
 
@@ -244,6 +620,19 @@ class Dat(object):
         :return: Nothing
         """
         self._do_romsets = {}
+        self._ds_sort_keys = {}
+        self._clear_indexes()
+
+    def close(self):
+        """
+        Method to release the .dat file memory-mapped in lazy mode, so it can be replaced or modified. ROMsets already
+        parsed are kept, but the ones not parsed yet can't be read anymore. It does nothing for Dats not opened in lazy
+        mode, or once all the ROMsets have been parsed.
+
+        :return: Nothing
+        """
+        if isinstance(self._do_romsets, _LazyRomSets):
+            self._do_romsets.close()
 
     def copy_metadata_from(self, po_game_container):
         """
@@ -273,12 +662,12 @@ class Dat(object):
 
     def filter(self, o_filter):
         """
-        Method to filter in/out games depending on a field name and allowed/disallowed values for that field.
+        Method to filter in/out games depending on a query (a Filter or a group of them). See query().
 
         :param o_filter: Filter object.
-        :type o_filter Filter
+        :type o_filter Union[Filter, FilterGroup]
 
-        :return: A list of games that match or don't match your filter criteria.
+        :return: A Dat with the games that match your filter criteria and another one with the ones that don't.
         """
 
         # Two Dat objects are created to store the games that matched the filter and the games that didn't match it.
@@ -287,27 +676,279 @@ class Dat(object):
         o_unmatched_container = Dat()
         o_unmatched_container.copy_metadata_from(self)
 
-        for o_game in self:
+        # Since we are filtering already unique games present in our container, we don't need to perform any uniqueness
+        # test while adding the games to the matched/unmatched containers. So the dictionaries are filled directly.
+        si_matched = {id(o_game) for o_game in self.query(o_filter).iter_unordered()}
+        do_matched = o_matched_container._do_romsets
+        do_unmatched = o_unmatched_container._do_romsets
+        for o_game in self.iter_unordered():
+            if id(o_game) in si_matched:
+                do_matched[o_game.s_name] = o_game
+            else:
+                do_unmatched[o_game.s_name] = o_game
 
-            # The first thing to do is (to try) to obtain o_dat_game.<s_attribute>
-            try:
-                x_value = getattr(o_game, o_filter.s_attribute)
+        return o_matched_container, o_unmatched_container
+
+    def query(self, po_query):
+        """
+        Method to get the ROMsets matching a query, which is compiled once to choose between the indexes of the Dat and
+        a scan of all the ROMsets (see explain()). e.g.
+
+            o_dat.query(Filter('s_year', 'range', '1990', '1995') & ~Filter('s_desc', 'prefix', 'Tetris'))
+
+        :param po_query: The query.
+        :type po_query: Union[Filter, FilterGroup]
+
+        :return: A view of the ROMsets.
+        :rtype: DatView
+        """
+        return DatView(self, list(po_query.compile(self).get_romsets(self)))
+
+    def explain(self, po_query):
+        """
+        Method to describe how a query is resolved: using an index (INDEX) or scanning all the ROMsets (SCAN). Equals/in
+        filters over indexed fields build the index, so they always use it. e.g.
+
+            AND: INDEX of query 1 (120 candidates): 12 ROMsets
+              INDEX s_year equals ('1991',) (1 values): 120 ROMsets
+              SCAN s_desc regex ('Fighter',)
+
+        :param po_query: The query.
+        :type po_query: Union[Filter, FilterGroup]
+
+        :return: The description, one line per filter or group.
+        :rtype: Str
+        """
+        return '\n'.join(po_query.compile(self).ls_explain)
+
+    def get_diff(self, po_new_dat):
+        """
+        Method to compute the differences between the Dat and a newer version of it. See DatDiff.
+
+        ROMsets are matched by name with the dictionaries of ROMsets of both Dats, and renamed ROMsets are matched by
+        clean CRC32 with a dictionary of the removed ones, so no nested loops are needed. ROMsets without clean ROMs
+        (or with unknown clean CRC32) are never considered renamed, since their CRC32 doesn't identify them.
+
+        :param po_new_dat: The new version of the Dat.
+        :type po_new_dat: Dat
+
+        :return: The differences.
+        :rtype: DatDiff
+        """
+        o_diff = DatDiff()
+        o_diff.tx_header = (po_new_dat.s_name, po_new_dat.s_description, po_new_dat.s_version, po_new_dat.s_comment,
+                            po_new_dat.s_type, po_new_dat.s_author, po_new_dat.s_homepage)
+
+        # ROMsets with the same name
+        #---------------------------
+        lo_removed = []
+        for o_old_romset in self.iter_unordered():
+            o_new_romset = po_new_dat.get_romset_by_name(o_old_romset.s_name)
+            if o_new_romset is None:
+                lo_removed.append(o_old_romset)
+            elif _romset_to_tuple(o_old_romset) != _romset_to_tuple(o_new_romset):
+                o_diff.lto_changed.append((o_old_romset, o_new_romset))
+
+        # Renamed ROMsets
+        #----------------
+        dlo_removed_by_crc32 = {}
+        for o_old_romset in lo_removed:
+            if o_old_romset.i_croms and o_old_romset.s_ccrc32:
+                dlo_removed_by_crc32.setdefault(o_old_romset.s_ccrc32, []).append(o_old_romset)
+
+        si_renamed = set()
+        for o_new_romset in po_new_dat.iter_unordered():
+            if o_new_romset.s_name in self._do_romsets:
+                continue
+
+            lo_candidates = None
+            if o_new_romset.i_croms and o_new_romset.s_ccrc32:
+                lo_candidates = dlo_removed_by_crc32.get(o_new_romset.s_ccrc32)
+
+            if lo_candidates:
+                o_old_romset = lo_candidates.pop(0)
+                si_renamed.add(id(o_old_romset))
+                o_diff.lto_renamed.append((o_old_romset, o_new_romset))
+            else:
+                o_diff.lo_added.append(o_new_romset)
+
+        o_diff.lo_removed = [o_romset for o_romset in lo_removed if id(o_romset) not in si_renamed]
+
+        return o_diff
+
+    def union(self, po_other, ps_key='s_name'):
+        """
+        Method to get the ROMsets of the Dat plus the ROMsets of another Dat not matching any of them. See _join() for
+        details about how ROMsets are matched.
+
+        :param po_other: The other Dat.
+        :type po_other: Dat
+
+        :param ps_key: Field used to match the ROMsets: 's_name', 's_ccrc32' or 's_csha1'.
+        :type ps_key: Str
+
+        :return: A view of the ROMsets, the ones of this Dat first.
+        :rtype: DatView
+        """
+        lo_romsets = list(self.iter_unordered())
+        lo_romsets.extend(self._join(po_other, ps_key, pb_matched=False))
+        return DatView(self, lo_romsets)
+
+    def intersection(self, po_other, ps_key='s_name'):
+        """
+        Method to get the ROMsets of the Dat matching any ROMset of another Dat. See _join().
+
+        :param po_other: The other Dat.
+        :type po_other: Dat
+
+        :param ps_key: Field used to match the ROMsets: 's_name', 's_ccrc32' or 's_csha1'.
+        :type ps_key: Str
+
+        :return: A view of the ROMsets of this Dat.
+        :rtype: DatView
+        """
+        return DatView(self, po_other._join(self, ps_key, pb_matched=True))
+
+    def difference(self, po_other, ps_key='s_name'):
+        """
+        Method to get the ROMsets of the Dat not matching any ROMset of another Dat. See _join().
+
+        :param po_other: The other Dat.
+        :type po_other: Dat
+
+        :param ps_key: Field used to match the ROMsets: 's_name', 's_ccrc32' or 's_csha1'.
+        :type ps_key: Str
+
+        :return: A view of the ROMsets of this Dat.
+        :rtype: DatView
+        """
+        return DatView(self, po_other._join(self, ps_key, pb_matched=False))
+
+    def symmetric_difference(self, po_other, ps_key='s_name'):
+        """
+        Method to get the ROMsets of the Dat not matching any ROMset of another Dat plus the ROMsets of the other Dat
+        not matching any ROMset of this one. See _join().
+
+        :param po_other: The other Dat.
+        :type po_other: Dat
+
+        :param ps_key: Field used to match the ROMsets: 's_name', 's_ccrc32' or 's_csha1'.
+        :type ps_key: Str
+
+        :return: A view of the ROMsets, the ones of this Dat first.
+        :rtype: DatView
+        """
+        lo_romsets = po_other._join(self, ps_key, pb_matched=False)
+        lo_romsets.extend(self._join(po_other, ps_key, pb_matched=False))
+        return DatView(self, lo_romsets)
+
+    def get_dependencies(self, ps_name):
+        """
+        Method to get the ROMsets a ROMset depends on: the ones its ROMs are taken from (the parent and/or the bios,
+        following the "romof" chain) and its devices (recursively, devices can use other devices). References to
+        ROMsets not present in the Dat are ignored. The result is cached until ROMsets are added or removed.
+
+        :param ps_name: Name of the ROMset. i.e. 'mslug'
+        :type ps_name: Str
+
+        :return: The names of the ROMsets, first the "romof" chain and then the devices. i.e. ('neogeo', 'ng_memcard').
+                 None if the ROMset is not found.
+        :rtype: Union[Tuple[Str], None]
+        """
+        t_key = ('dependencies', ps_name)
+        try:
+            return self._dx_closures[t_key]
+        except KeyError:
+            pass
+
+        o_romset = self.get_romset_by_name(ps_name)
+        if o_romset is None:
+            return None
+
+        ds_dependencies = {}  # Used as an ordered set
+        o_source = o_romset
+        while o_source.s_romof and o_source.s_romof != ps_name and o_source.s_romof not in ds_dependencies:
+            o_source = self.get_romset_by_name(o_source.s_romof)
+            if o_source is None:
+                break
+            ds_dependencies[o_source.s_name] = None
+
+        if o_romset.s_cloneof in self._do_romsets:
+            ds_dependencies.setdefault(o_romset.s_cloneof, None)
+
+        for o_device in self._get_devices(o_romset):
+            ds_dependencies.setdefault(o_device.s_name, None)
+
+        ts_dependencies = tuple(ds_dependencies)
+        self._dx_closures[t_key] = ts_dependencies
+        return ts_dependencies
+
+    def get_required_files(self, ps_name, ps_mode='split'):
+        """
+        Method to get the files needed to run a ROMset and the archives containing them. The archives depend on the
+        type of the ROMsets collection:
+
+            split       Each archive contains the ROMs of its ROMset not taken from other ROMsets ("merge" field of the
+                        ROMs). So, clones need the archive of their parent, and games running on a bios system need the
+                        archive of the bios.
+            merged      Like split, but the ROMs of the clones are stored in the archive of their parent.
+            non-merged  Each archive contains all the ROMs of its ROMset, including the ones of the parent, but not the
+                        ones of the bios.
+
+        In all the cases, the ROMs of the devices are in the archives of the devices, and no-dump ROMs are not included
+        since they don't exist. The ROMs are found following the "merge" fields through the "romof" chain, so the cost
+        is proportional to the size of the result, which is cached until ROMsets are added or removed.
+
+        :param ps_name: Name of the ROMset. i.e. 'mslug'
+        :type ps_name: Str
+
+        :param ps_mode: Type of the ROMsets collection: 'split', 'merged' or 'non-merged'.
+        :type ps_mode: Str
 
-            except AttributeError:
-                raise Exception('ERROR: You are trying to access the unknown attribute "%s"' % o_filter.s_attribute)
+        :return: A dictionary archive name => ROMs needed from that archive. The files inside the archives have the
+                 names of the ROMs. None if the ROMset is not found.
+        :rtype: Union[Dict[Str:Tuple[Rom]], None]
+        """
+        if ps_mode not in _ts_SET_MODES:
+            raise ValueError('Unknown ROMsets mode "%s", valid ones are: %s' % (ps_mode, ', '.join(_ts_SET_MODES)))
+
+        t_key = ('files', ps_name, ps_mode)
+        try:
+            return self._dx_closures[t_key]
+        except KeyError:
+            pass
 
-            # Then we can filter. Since we are filtering already unique games present in our container, we don't need
-            # to perform any uniqueness test while adding the games to the matched/unmatched containers. So, we use the
-            # method add_romset which doesn't perform that test and is much faster than the equivalent one with test
-            # add_romset.
-            if o_filter.s_method == 'equals':
-                if x_value in o_filter.lx_values:
-                    o_matched_container.add_romset(o_game)
+        o_romset = self.get_romset_by_name(ps_name)
+        if o_romset is None:
+            return None
 
+        ddo_files = {}
+        for o_machine in [o_romset] + self._get_devices(o_romset):
+            for o_rom in o_machine:
+                if o_rom.b_nodump:
+                    continue
+
+                o_owner, o_owner_rom = self._resolve_rom(o_machine, o_rom)
+                if ps_mode == 'split':
+                    s_archive = o_owner.s_name
+                elif ps_mode == 'merged':
+                    s_archive = o_owner.s_cloneof if o_owner.s_cloneof in self._do_romsets else o_owner.s_name
+                elif o_owner is o_machine or o_owner.s_name == o_machine.s_cloneof:
+                    s_archive = o_machine.s_name
                 else:
-                    o_unmatched_container.add_romset(o_game)
+                    s_archive = o_owner.s_name
 
-        return o_matched_container, o_unmatched_container
+                # Files stored in the archive of the machine itself have the name they have in the machine, which can
+                # be different from the one in the parent (e.g. name="clone.p1" merge="parent.p1")
+                if s_archive == o_machine.s_name:
+                    o_owner_rom = o_rom
+
+                # The same file can be reached several times (e.g. a bios ROM used by the game and by a device)
+                ddo_files.setdefault(s_archive, {}).setdefault((o_owner_rom.s_name, o_owner_rom.s_crc32), o_owner_rom)
+
+        dto_files = {s_archive: tuple(do_roms.values()) for s_archive, do_roms in ddo_files.items()}
+        self._dx_closures[t_key] = dto_files
+        return dto_files
 
     def get_romset_by_name(self, ps_name):
         """
@@ -329,17 +970,18 @@ class Dat(object):
 
     def get_romsets_by_field(self, ps_field, pb_first=False, ptx_search_values=()):
         """
-        Method to get a list of MULTIPLE GAMES with certain content in a field.
+        Method to get a list of MULTIPLE GAMES with certain content in a field. The search uses an index of the field
+        which is built the first time it's needed and kept until ROMsets are added or removed.
 
-        :param ps_field: Name of the field to use for the matching. i.e. '_i_year'
+        :param ps_field: Name of the field to use for the matching. i.e. 's_year'
         :type ps_field unicode
 
         :param pb_first: Whether the function will just return the first result or all of them.
         :type pb_first bool
 
-        :param ptx_search_values: Content of the field to search for. i.e. 1985, 1986
+        :param ptx_search_values: Content of the field to search for. i.e. '1985', '1986'
 
-        :return: A list with the found romsets.
+        :return: A list with the found romsets, sorted by description.
         """
 
         # This search function doesn't correctly if the search field is text and the ptx_search_values is incorrectly
@@ -348,27 +990,118 @@ class Dat(object):
         if not isinstance(ptx_search_values, tuple):
             raise ValueError('ERROR: ptx_search_values must be a tuple. %s given instead' % type(ptx_search_values))
 
-        lo_romsets = []
-
         if ps_field not in self._ts_valid_search_fields:
             raise ValueError('Error: ps_field must be one of %s' % str(self._ts_valid_search_fields))
 
-        else:
-            for o_romset in self:
-                if getattr(o_romset, ps_field) in ptx_search_values:
-                    lo_romsets.append(o_romset)
-                    if pb_first:
-                        break
+        dlo_index = self._get_index(ps_field)
+
+        # Each list in the index is already sorted, but results for different values need to be merged
+        lo_romsets = []
+        llo_matches = [dlo_index[x_value] for x_value in dict.fromkeys(ptx_search_values) if x_value in dlo_index]
+        if len(llo_matches) == 1:
+            lo_romsets = list(llo_matches[0])
+        elif llo_matches:
+            lo_romsets = sorted((o_romset for lo_match in llo_matches for o_romset in lo_match),
+                                key=lambda o_romset: o_romset.s_desc.lower())
+
+        if pb_first:
+            lo_romsets = lo_romsets[:1]
 
         return lo_romsets
 
-    def read_from_dat(self, ps_file):
+    def get_romsets_by_size(self, pi_size):
+        """
+        Method to get the ROMsets with a clean size. The search uses an index of clean sizes built the first time it's
+        needed (like the other secondary indexes).
+
+        :param pi_size: Clean size in bytes.
+        :type pi_size: Int
+
+        :return: A list with the found ROMsets, sorted by description.
+        :rtype: List[RomSet]
+        """
+        return list(self._get_index('i_csize').get(pi_size, ()))
+
+    def identify_file(self, ps_file, pc_hasher=None):
+        """
+        Method to identify a ROM file by its content instead of by its name, so renamed files can still be found in the
+        Dat. The candidates are first narrowed by the size of the file using the index of clean sizes, so files whose
+        size doesn't match any ROMset are never read. Otherwise, the file is hashed once to resolve the ROMset (see
+        identify_file_by_hash()). Zip archives (.zip extension) are identified by the sizes and CRC32 of the files
+        inside them, which are read from the archive without decompressing it (see identify_zip_members()).
+
+        :param ps_file: Path of the file.
+        :type ps_file: Str
+
+        :param pc_hasher: Function used to hash the file. See identify_file_by_hash().
+        :type pc_hasher: Union[Callable[[Str, List[Str]], Dict[Str:Str]], None]
+
+        :return: The found ROMset or None if no ROMset matches the file.
+        :rtype: Union[RomSet, None]
+        """
+        # Zip archives are identified by the files inside them, without decompressing them (see read_zip_members())
+        ltx_members = read_zip_members(ps_file)
+        if ltx_members is not None:
+            i_size = sum(i_member_size for _, i_member_size, _ in ltx_members)
+            return identify_zip_members(ltx_members, self._get_index('i_csize').get(i_size, ()))
+
+        return identify_file_by_hash(ps_file, self._get_index('i_csize').get(os.path.getsize(ps_file), ()),
+                                     pc_hasher=pc_hasher)
+
+    def iter_unordered(self):
+        """
+        Method to iterate over the ROMsets without any particular order (well, the order they were added). It's faster
+        than the sorted iteration of the Dat itself and should be preferred when the order is not important.
+
+        :return:
+        :rtype Iterator[RomSet]
+        """
+        return iter(self._do_romsets.values())
+
+    def read_from_dat(self, ps_file, ps_cache_dir='', pb_lazy=False, pi_workers=1, pts_tags=None):
         """
         Method to load Dat data from a file on disk.
 
-        :param ps_file: File containing the data. i.e. '/home/john/mame.dat'
+        When a cache dir is given, a compiled snapshot of the parsed data is stored in it. Later reads of the same file
+        will load the snapshot instead of parsing the text file again, as long as the path, size and modification time
+        of the file (and the version of the parser) are the same. Otherwise, the snapshot is rebuilt.
+
+        In lazy mode, the file is memory-mapped and just an index with the byte range of each ROMset is read, so
+        opening the file is much quicker. Each ROMset is parsed the first time it's accessed (e.g. by
+        get_romset_by_name()), while operations requiring all the ROMsets (iteration, searches by field...) parse all
+        the pending ones. When a cache dir is given, the index is stored in it instead of the full snapshot, so it only
+        needs to be built again when the file changes. The file is kept mapped until all the ROMsets are parsed or the
+        Dat is closed (see close(), Dats can be used as context managers).
+
+        Dats compressed with zip, gzip or xz (e.g. the ones distributed by No-Intro and Redump) are read transparently.
+        They are decompressed in memory while they are parsed, without extracting them to disk. Compressed files can't
+        be memory-mapped, so they are always fully read (even in lazy mode) by a single process.
+
+        The <machine> elements of MAME xml dats contain lots of children useless for the Dat (chips, displays, inputs,
+        dipswitches, ports...), which are removed before the xml is parsed, so they are never built as xml elements.
+        The number of removed children (just the outermost ones, nested elements are not counted) is kept in
+        .i_skipped, and in the snapshots of the cache; in lazy mode, ROMsets are parsed on demand, so the count is not
+        available and it's always 0. By default, only the children used by the Dat are read,
+        but a smaller selection can be given to make the parsing even quicker. e.g. ('description',) to get just a
+        list of the machines, without ROMs.
+
+        :param ps_file: File containing the data. i.e. '/home/john/mame.dat', '/home/john/mdr-crt.zip'
         :type ps_file: Unicode
 
+        :param ps_cache_dir: Directory for the compiled snapshots. Empty to disable the cache.
+        :type ps_cache_dir: Str
+
+        :param pb_lazy: Whether the file is opened in lazy mode.
+        :type pb_lazy: Bool
+
+        :param pi_workers: Number of worker processes used to parse the file, 0 to use one per CPU. So far, only MAME
+                           xml dats are parsed in parallel (see _read_from_xml_mame()).
+        :type pi_workers: Int
+
+        :param pts_tags: Children of the <machine> elements of MAME xml dats to be read: 'description', 'year',
+                         'manufacturer', 'rom' and/or 'device_ref'. None to read all of them.
+        :type pts_tags: Union[Tuple[Str], None]
+
         :return: Nothing.
         """
 
@@ -376,37 +1109,59 @@ class Dat(object):
         if not os.path.isfile(ps_file):
             raise ValueError('Can\'t find dat file "%s"' % ps_file)
 
-        o_file = codecs.open(ps_file, 'rb', 'utf8', 'ignore')
-
-        # We try to automatically identify it reading the beginning of the file.
-        s_first_line = o_file.readline()
-        o_file.close()
-
-        # Identifying ClrMamePro mode
-        if (s_first_line.find('clrmamepro') != -1) or (s_first_line.find('emulator') != -1):
-            s_format = 'cmp'
-
-        # Identifying Xml mode
-        elif s_first_line.find('<?xml') != -1:
-            s_format = 'xml'
-
-        # Unknown format error raise
-        else:
-            raise IOError('Unknown DAT format')
-
-        # Loading the file using the different readers depending on the format parameter
-        if s_format == 'cmp':
-            self._read_from_cmp(ps_file)
-        elif s_format == 'xml':
-            s_xml_type = self._identify_xml_format(ps_file)
-            if s_xml_type == 'mame':
-                self._read_from_xml_mame(ps_file)
+        # Snapshots of partial reads are kept apart from the complete ones
+        ts_tags = _ts_MAME_TAGS if pts_tags is None else tuple(pts_tags)
+        s_cache_kind = 'dat'
+        if set(ts_tags) != set(_ts_MAME_TAGS):
+            s_cache_kind = 'dat-%s' % '-'.join(sorted(ts_tags))
+
+        if ps_cache_dir and not pb_lazy:
+            tx_snapshot = _cache_read(ps_cache_dir, ps_file, s_cache_kind)
+            if tx_snapshot is not None:
+                self._from_snapshot(tx_snapshot[:2])
+                self.i_skipped = tx_snapshot[2]
+                self._db_flags['from_dat'] = True
+                return
+
+        # We try to automatically identify it reading the beginning of the file. For compressed files, the beginning
+        # of the decompressed data is used instead, and the rest of the data is read from the same stream.
+        with open(ps_file, 'rb') as o_file:
+            x_head = o_file.read(_i_SNIFF_SIZE)
+
+        o_stream = _open_compressed(ps_file, x_head)
+        if o_stream is not None:
+            x_head = o_stream.read(_i_SNIFF_SIZE)
+
+        try:
+            s_format = self._identify_format(x_head)
+
+            # Loading the file using the different readers depending on the format parameter
+            if o_stream is not None:
+                if s_format == 'cmp':
+                    self._read_from_cmp(_PrefixedReader(x_head, o_stream))
+                elif s_format == 'mame':
+                    self._read_from_xml_mame(io.BufferedReader(_PrefixedReader(x_head, o_stream)), pts_tags=ts_tags)
+                else:
+                    self._read_from_xml_generic(io.BufferedReader(_PrefixedReader(x_head, o_stream)))
+            elif pb_lazy:
+                self._read_lazy(ps_file, s_format, ps_cache_dir, pts_tags=ts_tags)
+            elif s_format == 'cmp':
+                self._read_from_cmp(ps_file)
+            elif s_format == 'mame':
+                self._read_from_xml_mame(ps_file, pi_workers=pi_workers, pts_tags=ts_tags)
             else:
                 self._read_from_xml_generic(ps_file)
+        finally:
+            if o_stream is not None:
+                o_stream.close()
 
         # We alter the proper flag
         self._db_flags['from_dat'] = True
 
+        # The number of skipped elements is stored too, since it's only known when the file is parsed
+        if ps_cache_dir and not pb_lazy:
+            _cache_write(ps_cache_dir, ps_file, s_cache_kind, self._to_snapshot() + (self.i_skipped,))
+
     def save_to_dat(self, ps_file, ps_format):
         """
         Method to save the contents of the Dat to a .dat file
@@ -414,231 +1169,277 @@ class Dat(object):
         :param ps_file: Path of the file to be saved. e.g. '/home/john/my_new_dat.dat'
         :type ps_file: Unicode
 
-        :param ps_format: Format of the dat to be generated. So far, the only format available is 'cmp' for ClrMamePro
-                          format.
+        :param ps_format: Format of the dat to be generated: 'cmp' for ClrMamePro format or 'xml' for Logiqx xml format
+                          (the one used by No-Intro).
+        :type ps_format: Unicode
+
+        :return: Nothing
+        """
+        if ps_format not in ('cmp', 'xml'):
+            raise ValueError('ERROR: Unknown dat format "%s"' % ps_format)
+
+        # The data is written to a temporary file first, so a failed write (e.g. a text that can't be written in
+        # ClrMamePro format) doesn't leave an incomplete file behind, nor replaces the existing one.
+        s_tmp_file = '%s.%i.tmp' % (ps_file, os.getpid())
+        try:
+            with open(s_tmp_file, 'w', encoding='utf8', newline='\n') as o_file:
+                self.write_dat(o_file, ps_format)
+            os.replace(s_tmp_file, ps_file)
+        finally:
+            if os.path.exists(s_tmp_file):
+                os.remove(s_tmp_file)
+
+    def write_dat(self, po_file, ps_format):
+        """
+        Method to write the contents of the Dat to a text file object. The output is written ROMset by ROMset, so it's
+        never completely built in memory. Texts with double quotes can't be written in ClrMamePro format, a ValueError
+        is raised when one is found (and the file object keeps what was written up to that point).
+
+        :param po_file: The file object. e.g. the one returned by open('/home/john/my_new_dat.dat', 'w')
+        :type po_file: io.TextIOBase
+
+        :param ps_format: Format of the dat to be generated: 'cmp' for ClrMamePro format or 'xml' for Logiqx xml format
+                          (the one used by No-Intro).
         :type ps_format: Unicode
 
         :return: Nothing
         """
         if ps_format == 'cmp':
-            s_data = self._to_clrmamepro()
+            self._write_clrmamepro(po_file)
+        elif ps_format == 'xml':
+            self._write_xml(po_file)
         else:
-            raise ValueError
-
-        with codecs.open(ps_file, 'w', 'utf8') as o_file:
-            o_file.write(s_data)
+            raise ValueError('ERROR: Unknown dat format "%s"' % ps_format)
 
     def to_dict(self, ps_property):
         """
         Method to return a dictionary with all the romsets keyed by the desired property "ps_property". No checks will
         be performed so if the values of ps_property are not unique for all the RomSets, the later occurrences will
-        overwrite the older ones.
+        overwrite the older ones. ROMsets are taken in the order they were added to the Dat (the one of the file), no
+        matter the property.
 
         :param ps_property:
         :type ps_property: Str
 
         :return:
+        :rtype: Dict[Any:RomSet]
         """
-        do_output = {}
-        for o_romset in self._do_romsets:
-            do_output[getattr(o_romset, ps_property)] = o_romset
+        if ps_property == 's_name':
+            do_output = dict(self._do_romsets)
+        else:
+            do_output = {getattr(o_romset, ps_property): o_romset for o_romset in self._do_romsets.values()}
 
         return do_output
 
+    def to_columns(self):
+        """
+        Method to build a columnar representation of the Dat, where the data of all the ROMsets and ROMs is stored in
+        NumPy arrays. See DatColumns.
+
+        :return: The columnar representation.
+        :rtype: DatColumns
+        """
+        return DatColumns(self)
+
     def _read_from_cmp(self, ps_file):
         """
         Method to process ClrMamePro DATs.
+
+        The file is memory-mapped and tokenized in a single pass, filling RomSet and Rom objects directly. Each token
+        is a field (key and value), a block without nested blocks (e.g. 'rom ( name "a.bin" size 1024 )'), the opening
+        of a block with nested blocks (e.g. 'game (') or a closing parenthesis. As ClrMamePro itself does when writing
+        dats, values containing spaces or parentheses must be quoted.
+
+        :param ps_file: Path of the file to be read (or a binary file object, which is fully read in memory).
+        :type ps_file: Union[Str, io.RawIOBase]
+
+        :return: Nothing, the object will be populated in place.
         """
         self.s_type = 'ClrMamePro'
 
-        o_file = codecs.open(ps_file, 'rb', 'utf8', 'ignore')
+        if not isinstance(ps_file, str):
+            o_data = ps_file.read()
+        else:
+            with open(ps_file, 'rb') as o_file:
+                try:
+                    o_data = mmap.mmap(o_file.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # Empty files can't be memory-mapped
+                    o_data = b''
+
+        try:
+            self._parse_cmp(o_data)
+        finally:
+            if isinstance(o_data, mmap.mmap):
+                o_data.close()
+
+    def _parse_cmp(self, px_data, pdo_roms=None):
+        """
+        Method to populate the container from ClrMamePro data already in memory (or memory-mapped). It's used by the
+        ClrMamePro reader to process whole files and by the lazy mode to process single ROMsets.
 
-        b_head_mode = False
-        b_game_mode = False
+        :param px_data: The ClrMamePro data.
+        :type px_data: Union[Bytes, mmap.mmap]
 
-        ls_head_strings = []    # List that will contain the multiple lines with data from the heading.
-        ls_game_strings = []    # List that will contain the multiple lines with data for a game.
+        :param pdo_roms: Table of the ROMs already read by the content of their "rom" block, so identical ROMs are
+                         shared instead of being parsed again (see Rom). None to use a new table.
+        :type pdo_roms: Union[Dict[Bytes:Rom], None]
 
-        for s_line in o_file:
+        :return: Nothing, the object will be populated in place.
+        """
+        i_depth = 0         # Nesting level of the current token
+        o_romset = None     # RomSet being read, if any
+        si_used = set()     # ids of the ROMs already in the RomSet being read
+        do_roms = {} if pdo_roms is None else pdo_roms
+
+        for o_match in _o_CMP_TOKEN_REGEX.finditer(px_data):
+            s_key, s_quoted, s_block, s_open, s_bare, s_close = o_match.groups()
+
+            # Closing of a block with nested blocks
+            if s_close:
+                i_depth = max(i_depth - 1, 0)
+                if i_depth == 0 and o_romset is not None:
+                    self.add_romset(o_romset)
+                    o_romset = None
+
+            # Opening of a block with nested blocks
+            elif s_open:
+                if i_depth == 0 and s_key in _ts_CMP_ROMSET_BLOCKS:
+                    o_romset = RomSet('', '')
+                    o_romset.s_year = '0'
+                    si_used.clear()
+                i_depth += 1
+
+            # Fields and ROMs of the ROMset being read
+            elif i_depth == 1 and o_romset is not None:
+                if s_key == b'rom':
+                    if s_block is not None:
+                        o_romset.add_rom(_get_shared_rom(do_roms, s_block, si_used, _cmp_rom))
+                elif s_block is None and s_key in _ds_CMP_ROMSET_FIELDS:
+                    s_value = (s_quoted or s_bare or b'').decode('utf8', 'ignore')
+                    if s_key == b'year' and not s_value:
+                        s_value = '0'
+                    if s_key in _ts_CMP_INTERNED_FIELDS:
+                        s_value = sys.intern(s_value)
+                    setattr(o_romset, _ds_CMP_ROMSET_FIELDS[s_key], s_value)
+
+            # Top level blocks without nested blocks: header or ROMsets without ROMs
+            elif i_depth == 0 and s_block is not None:
+                ds_fields = _cmp_fields(s_block)
+                if s_key in (b'clrmamepro', b'emulator'):
+                    self.s_name = ds_fields.get('name', '')
+                    self.s_description = ds_fields.get('description', '')
+                    self.s_version = ds_fields.get('version', '')
+                    self.s_comment = ds_fields.get('comment', '')
+                elif s_key in _ts_CMP_ROMSET_BLOCKS:
+                    o_empty_romset = RomSet(ds_fields.get('name', ''), ds_fields.get('description', ''))
+                    o_empty_romset.s_auth = sys.intern(ds_fields.get('manufacturer', ''))
+                    o_empty_romset.s_year = sys.intern(ds_fields.get('year', '') or '0')
+                    o_empty_romset.s_cloneof = sys.intern(ds_fields.get('cloneof', ''))
+                    o_empty_romset.s_romof = sys.intern(ds_fields.get('romof', ''))
+                    o_empty_romset.s_sampleof = sys.intern(ds_fields.get('sampleof', ''))
+                    self.add_romset(o_empty_romset)
 
-            # Detection of the start of the heading of the file
-            if (s_line.find('clrmamepro (') == 0) or (s_line.find('emulator (') == 0):
-                b_head_mode = True
-                continue
+    def _read_from_xml_generic(self, ps_file):
+        """
+        Method to populate the container from a generic .xml file. This format is compatible, for example, with No-Intro
+        dats.
 
-            # If we are in "head-mode" and the first character of the line is ")", it means we have reached the end of
-            # the heading (so we have all its lines) and we can parse them.
-            if b_head_mode and s_line.find(')') == 0:
-                self.s_name = _dat_vertical_parse(ls_head_strings, 'name')
-                self.s_description = _dat_vertical_parse(ls_head_strings, 'description')
-                self.s_version = _dat_vertical_parse(ls_head_strings, 'version')
-                self.s_comment = _dat_vertical_parse(ls_head_strings, 'comment')
+        The file is read incrementally with iterparse, so each <game> element is converted to a RomSet and then freed.
+        That way the memory used doesn't depend on the size of the .dat file.
 
-                ls_head_strings = []
-                b_head_mode = False
-                continue
+        :param ps_file: The path of the file to be read (or a binary file object).
+        :type ps_file: Union[Str, io.BufferedIOBase]
 
-            # If we are in "head-mode", we add the found lines to a list that will be parsed later (look the code just
-            # above).
-            if b_head_mode:
-                ls_head_strings.append(s_line)
-                continue
+        :return: Nothing, the object will be populated in place.
+        """
+        self.s_type = 'xml'
 
-            # RomSet data
-            if s_line.find('game (') == 0:
-                b_game_mode = True
+        do_roms = {}  # Table to share identical ROMs between ROMsets (see Rom)
+        o_xml_root = None
+        for s_event, o_xelem in xml.etree.cElementTree.iterparse(ps_file, events=('start', 'end')):
+            # The first "start" event is the one of the root element. We keep it to free its children once processed.
+            if s_event == 'start':
+                if o_xml_root is None:
+                    o_xml_root = o_xelem
                 continue
 
-            if b_game_mode and s_line.find(')') == 0:
-                s_romset_name = _dat_vertical_parse(ls_game_strings, 'name')
-                s_romset_description = _dat_vertical_parse(ls_game_strings, 'description')
-                s_romset_author = _dat_vertical_parse(ls_game_strings, 'manufacturer')
-                s_game_year = _dat_vertical_parse(ls_game_strings, 'year')
-                if s_game_year == '':
-                    s_game_year = '0'
-
-                ls_game_roms = _dat_vertical_parse(ls_game_strings, 'rom', 'multi')
-
-                o_dat_romset = RomSet(s_romset_name, s_romset_description)
-                o_dat_romset.s_year = s_game_year
-                o_dat_romset.s_auth = s_romset_author
-
-                for s_game_rom in ls_game_roms:
-                    # sometimes name has quotes " around and sometimes not, so it's safer to use size as end.
-                    s_rom_name = _dat_horizontal_parse(s_game_rom, 'name ', 'size')
-
-                    s_rom_size = _dat_horizontal_parse(s_game_rom, 'size ', ' ')
-                    s_rom_crc = _dat_horizontal_parse(s_game_rom, 'crc ', ' ')
-                    s_rom_md5 = _dat_horizontal_parse(s_game_rom, 'md5 ', ' ')
-                    s_rom_sha1 = _dat_horizontal_parse(s_game_rom, 'sha1 ', ' ')
-
-                    # So far, MAME is the only dat providing flags, and it's only one.
-                    s_rom_flags = _dat_horizontal_parse(s_game_rom, 'flags ', ' ')
-                    b_baddump = False
-                    if s_rom_flags == 'baddump':
-                        b_baddump = True
-
-                    b_nodump = False
-                    if s_rom_flags == 'nodump':
-                        b_nodump = True
-
-                    # create a rom object
-                    o_rom = Rom()
-                    o_rom.b_baddump = b_baddump
-                    o_rom.b_nodump = b_nodump
-                    o_rom.s_name = s_rom_name
-                    o_rom.i_size = int(s_rom_size)
-                    o_rom.s_crc32 = s_rom_crc.lower()
-                    o_rom.s_md5 = s_rom_md5.lower()
-                    o_rom.s_sha1 = s_rom_sha1.lower()
-
-                    # add the rom object to the list
-                    o_dat_romset.add_rom(o_rom)
-
-                # We add the game to the container without any kind of check, we will do it later.
-                self.add_romset(o_dat_romset)
-
-                ls_game_strings = []
-                b_game_mode = False
-                continue
+            # Header information
+            #-------------------
+            # "<header>" section is optional in generic xml, so we need to take that in consideration.
+            if o_xelem.tag == 'header':
+                self._read_xml_generic_header(o_xelem)
+                del o_xml_root[:]
 
-            # RomSet mode actions
-            if b_game_mode:
-                ls_game_strings.append(s_line)
-                pass
+            # ROMsets information
+            #--------------------
+            elif o_xelem.tag == 'game':
+                self.add_romset(_xml_generic_romset(o_xelem, do_roms))
+                del o_xml_root[:]
 
-    def _read_from_xml_generic(self, ps_file):
+    def _read_xml_generic_header(self, po_xelem):
         """
-        Method to populate the container from a generic .xml file. This format is compatible, for example, with No-Intro
-        dats.
+        Method to read the metadata of the Dat from the <header> element of a generic .xml dat.
+
+        :param po_xelem: The <header> element.
+        :type po_xelem: xml.etree.ElementTree.Element
+
+        :return: Nothing, the object will be populated in place.
+        """
+        self.s_name = po_xelem.findtext('name')
+        self.s_description = po_xelem.findtext('description')
+        self.s_version = po_xelem.findtext('version')
+
+        o_xelem_homepage = po_xelem.find('homepage')
+        if o_xelem_homepage is not None:
+            self.s_homepage = o_xelem_homepage.text
+
+        o_xelem_author = po_xelem.find('author')
+        if o_xelem_author is not None:
+            self.s_author = o_xelem_author.text
+        else:
+            self.s_author = 'None'
+
+    def _read_lazy(self, ps_file, ps_format, ps_cache_dir='', pts_tags=_ts_MAME_TAGS):
+        """
+        Method to open a .dat file in lazy mode. The header and the byte range of each ROMset are taken from the offset
+        index of the file, which is read from the cache dir or built (and then cached) when it's missing or stale.
 
         :param ps_file: The path of the file to be read.
-        :type ps_file: Unicode
+        :type ps_file: Str
+
+        :param ps_format: Format of the file: 'cmp', 'generic' or 'mame'.
+        :type ps_format: Str
+
+        :param ps_cache_dir: Directory for the offset index. Empty to build it every time.
+        :type ps_cache_dir: Str
+
+        :param pts_tags: Children of the <machine> elements of MAME xml dats to be read.
+        :type pts_tags: Tuple[Str]
 
         :return: Nothing, the object will be populated in place.
         """
-        self.s_type = 'xml'
+        o_romsets = _LazyRomSets(ps_file, ps_format, pts_tags=pts_tags)
 
-        o_xml_tree = xml.etree.cElementTree.parse(ps_file)
-        o_xml_root = o_xml_tree.getroot()
+        tx_index = None
+        if ps_cache_dir:
+            tx_index = _cache_read(ps_cache_dir, ps_file, 'offsets')
 
-        # Header information
-        #-------------------
-        # "<header>" section is optional in generic xml, so we need to take that in consideration.
-        o_header = o_xml_root.find('header')
-        if o_header is not None:
-            self.s_name = o_header.find('name').text
-            self.s_description = o_header.find('description').text
-            self.s_version = o_header.find('version').text
+        if tx_index is None:
+            tx_index = _build_offsets(o_romsets.x_data, ps_format)
+            if ps_cache_dir:
+                _cache_write(ps_cache_dir, ps_file, 'offsets', tx_index)
 
-            o_xelem_homepage = o_header.find('homepage')
-            if o_xelem_homepage:
-                self.s_homepage = o_xelem_homepage.text
+        tx_header, dti_ranges = tx_index
+        (self.s_name, self.s_description, self.s_version, self.s_comment, self.s_type, self.s_author,
+         self.s_homepage) = tx_header
 
-            if o_header.find('author'):
-                self.s_author = o_header.find('author').text
-            else:
-                self.s_author = 'None'
-
-        # ROMsets information
-        #--------------------
-        for o_xelem_game in o_xml_root.findall('game'):
-            s_game_name = o_xelem_game.attrib['name']
-            s_game_description = o_xelem_game.find('description').text
-
-            o_dat_game = RomSet(s_game_name, s_game_description)
-
-            for o_xelem_rom in o_xelem_game.findall('rom'):
-                    o_rom = Rom()
-                    try:
-                        o_rom.s_name = o_xelem_rom.attrib['name']
-                    except KeyError:
-                        pass
-
-                    # TODO: Not sure about this code. Maybe I should only trust specifically indicated nodumps
-                    try:
-                        o_rom.i_size = int(o_xelem_rom.attrib['size'])
-                    except KeyError:
-                        o_rom.b_nodump = True
-
-                    # TODO: Not sure about this code. Maybe I should only trust specifically indicated nodumps
-                    try:
-                        o_rom.s_crc32 = o_xelem_rom.attrib['crc'].lower()
-                    except KeyError:
-                        o_rom.b_nodump = True
-
-                    try:
-                        o_rom.s_md5 = o_xelem_rom.attrib['md5'].lower()
-                    except KeyError:
-                        o_rom.s_md5 = None
-
-                    try:
-                        o_rom.s_sha1 = o_xelem_rom.attrib['sha1'].lower()
-                    except KeyError:
-                        o_rom.s_sha1 = None
-
-                    # MAME generated XML (later converted generic format (AFAIK) includes a status field which can
-                    # contain "baddump" and "nodump" status information
-                    try:
-                        s_status = o_xelem_rom.attrib['status'].lower()
-                        if s_status == 'baddump':
-                            o_rom.b_baddump = True
-                        if s_status == 'nodump':
-                            o_rom.b_nodump = True
-                    except KeyError:
-                        pass
-
-                    try:
-                        o_rom.s_merge = o_xelem_rom.attrib['merge']
-                    except KeyError:
-                        pass
-
-                    # Adding the rom object to the list
-                    o_dat_game._lo_roms.append(o_rom)
-
-            self.add_romset(o_dat_game)
-
-    def _read_from_xml_mame(self, ps_file):
+        o_romsets.set_ranges(dti_ranges)
+        self._do_romsets = o_romsets
+        self._ds_sort_keys = {}
+        self._clear_indexes()
+
+    def _read_from_xml_mame(self, ps_file, pi_workers=1, pts_tags=_ts_MAME_TAGS):
         """
         Method to import data from a MAME xml which has some differences with respect to a standard format one.
 
@@ -656,156 +1457,468 @@ class Dat(object):
               </machine>
             </mame>
 
-        :param ps_file: Path of the xml file to be imported
-        :type ps_file: Str
+        Like the generic reader, the file is read incrementally, so a full MAME xml (hundreds of MB) never needs to be
+        completely loaded in memory as an element tree. Each block read is stripped of the children of the machines not
+        included in pts_tags before parsing it (see read_from_dat()).
+
+        With more than one worker, the file is split in chunks at <machine> boundaries which are parsed in parallel by
+        a pool of processes. The ROMsets of the chunks are added in the same order they have in the file, so the result
+        is exactly the same as the one of the serial read.
+
+        :param ps_file: Path of the xml file to be imported (or a binary file object)
+        :type ps_file: Union[Str, io.BufferedIOBase]
+
+        :param pi_workers: Number of worker processes, 0 to use one per CPU.
+        :type pi_workers: Int
+
+        :param pts_tags: Children of the <machine> elements to be read.
+        :type pts_tags: Tuple[Str]
+
         :return:
         """
 
         self.s_type = 'xml'
 
-        o_xml_tree = xml.etree.cElementTree.parse(ps_file)
-        o_xml_root = o_xml_tree.getroot()
+        i_workers = pi_workers or os.cpu_count() or 1
+        if i_workers > 1 and isinstance(ps_file, str) and os.path.getsize(ps_file):
+            self._read_from_xml_mame_parallel(ps_file, i_workers, pts_tags)
+            return
+
+        o_skip_regex = _xml_skip_regex(pts_tags)
+        o_parser = xml.etree.cElementTree.XMLPullParser(events=('start', 'end'))
+        do_roms = {}  # Table to share identical ROMs between ROMsets (see Rom)
+        o_xml_root = None
+
+        o_file = open(ps_file, 'rb') if isinstance(ps_file, str) else ps_file
+        try:
+            for x_block in itertools.chain(_iter_xml_blocks(o_file), (None,)):
+                if x_block is None:
+                    o_parser.close()
+                else:
+                    x_block, i_skipped = o_skip_regex.subn(b'', x_block)
+                    self.i_skipped += i_skipped
+                    o_parser.feed(x_block)
+
+                for s_event, o_xelem in o_parser.read_events():
+                    # Header information
+                    #-------------------
+                    if s_event == 'start':
+                        if o_xml_root is None:
+                            o_xml_root = o_xelem
+                            self.s_name = 'MAME'
+                            self.s_version = o_xml_root.get('build')
+                        continue
+
+                    # ROMsets information
+                    #--------------------
+                    if o_xelem.tag == 'machine':
+                        self.add_romset(_xml_mame_romset(o_xelem, do_roms))
+                        del o_xml_root[:]
+        finally:
+            if o_file is not ps_file:
+                o_file.close()
+
+    def _read_from_xml_mame_parallel(self, ps_file, pi_workers, pts_tags=_ts_MAME_TAGS):
+        """
+        Method to import data from a MAME xml using a pool of processes. See _read_from_xml_mame().
 
-        # Header information
-        #-------------------
-        self.s_name = 'MAME'
-        self.s_version = o_xml_root.get('build')
+        :param ps_file: Path of the xml file to be imported.
+        :type ps_file: Str
 
-        # ROMsets information
-        #--------------------
-        for o_xmachine in o_xml_root.findall('machine'):
-            s_name = o_xmachine.get('name')
-            s_desc = o_xmachine.find('description').text
+        :param pi_workers: Number of worker processes.
+        :type pi_workers: Int
 
-            b_device = False
-            try:
-                s_device = o_xmachine.get('isdevice')
-                if s_device.lower() in ss_TRUE_VALUES:
-                    b_device = True
-            except AttributeError:
-                pass
+        :param pts_tags: Children of the <machine> elements to be read.
+        :type pts_tags: Tuple[Str]
 
-            o_romset = RomSet(ps_name=s_name, ps_description=s_desc, pb_device=b_device)
+        :return: Nothing, the object will be populated in place.
+        """
+        self.s_name = 'MAME'
 
-            for o_xrom in o_xmachine.findall('rom'):
-                o_rom = Rom()
-                o_rom.s_name = o_xrom.get('name')
-                o_rom.i_size = int(o_xrom.get('size'))
+        # The file is memory-mapped just to find the header and the chunk boundaries
+        with open(ps_file, 'rb') as o_file:
+            o_data = mmap.mmap(o_file.fileno(), 0, access=mmap.ACCESS_READ)
 
-                try:
-                    o_rom.s_crc32 = o_xrom.get('crc').lower()
-                except AttributeError:
-                    o_rom.s_crc32 = None
+        try:
+            x_prolog = b'<?xml version="1.0" encoding="%s"?>' % _xml_encoding(o_data).encode('ascii')
 
-                try:
-                    o_rom.s_md5 = o_xrom.get('md5').lower()
-                except AttributeError:
-                    o_rom.s_md5 = None
+            o_match = _o_XML_MACHINE_REGEX.search(o_data)
+            i_first = o_match.start() if o_match else len(o_data)
+            i_last = max(o_data.rfind(b'</mame>'), i_first)
 
-                try:
-                    o_rom.s_sha1 = o_xrom.get('sha1').lower()
-                except AttributeError:
-                    o_rom.s_sha1 = None
+            self.s_version = _xml_mame_build(o_data[:i_first], x_prolog)
 
-                if 'bios' in o_xrom.attrib:
-                    o_rom.b_bios = True
+            # More chunks than workers, so a slow chunk doesn't keep the rest of workers idle
+            lti_chunks = _xml_chunks(o_data, _o_XML_MACHINE_REGEX, i_first, i_last, pi_workers * 4)
 
-                if 'status' in o_xrom.attrib:
-                    if o_xrom.get('status').lower() == 'baddump':
-                        o_rom.b_baddump = True
-                    if o_xrom.get('status').lower() == 'nodump':
-                        o_rom.b_nodump = True
+        finally:
+            o_data.close()
 
-                o_romset.add_rom(o_rom)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=pi_workers) as o_pool:
+            lo_futures = [o_pool.submit(_read_mame_chunk, ps_file, i_start, i_end, x_prolog, pts_tags)
+                          for i_start, i_end in lti_chunks]
 
-            self.add_romset(o_romset)
+            # The ROMs are shared between the ROMsets of all the chunks, not only the ones of the same chunk
+            do_roms = {}
+            for o_future in lo_futures:
+                ltx_romsets, i_skipped = o_future.result()
+                self._add_snapshot_romsets(ltx_romsets, do_roms)
+                self.i_skipped += i_skipped
 
-    def _to_clrmamepro(self):
+    def _write_clrmamepro(self, po_file):
         """
-        Function to export the ROMset Container as a ClrMamePro dat file.
+        Method to write the Dat to a file object in ClrMamePro format. ClrMamePro dats don't have any way to escape
+        double quotes, so texts containing them can't be written (see _cmp_quote()).
 
-        :return: A string.
-        :rtype Unicode
-        """
-        ls_chunks = []
+        :param po_file: The file object.
+        :type po_file: io.TextIOBase
 
+        :return: Nothing
+        """
         # Header
         #-------
-        s_header = ''
-        s_header += 'clrmamepro (\n'
-        s_header += '\tname "%s"\n' % self.s_name
-        s_header += '\tdescription "%s"\n' % self.s_description
-        s_header += '\tversion "%s"\n' % self.s_version
-        s_header += '\tcomment "%s"\n' % self.s_comment
+        s_header = 'clrmamepro (\n'
+        s_header += '\tname %s\n' % _cmp_quote(self.s_name)
+        s_header += '\tdescription %s\n' % _cmp_quote(self.s_description)
+        s_header += '\tversion %s\n' % _cmp_quote(self.s_version)
+        s_header += '\tcomment %s\n' % _cmp_quote(self.s_comment)
         s_header += ')\n\n'
-        ls_chunks.append(s_header)
+        po_file.write(s_header)
 
         # ROMset data
         #------------
         for o_romset in self:
-            # Output generation
-            #------------------
-            s_romset = 'game (\n'
-            s_romset += '\tname "%s"\n' % o_romset.s_name
-            s_romset += '\tdescription "%s"\n' % o_romset.s_desc
-            for o_rom in o_romset:
-                ls_rom_data = ['name "%s"' % o_rom.s_name]
+            ls_lines = ['game (\n',
+                        '\tname %s\n' % _cmp_quote(o_romset.s_name),
+                        '\tdescription %s\n' % _cmp_quote(o_romset.s_desc)]
+            if o_romset.s_year:
+                ls_lines.append('\tyear %s\n' % _cmp_quote(o_romset.s_year))
+            if o_romset.s_auth:
+                ls_lines.append('\tmanufacturer %s\n' % _cmp_quote(o_romset.s_auth))
+            if o_romset.s_cloneof:
+                ls_lines.append('\tcloneof %s\n' % _cmp_quote(o_romset.s_cloneof))
+            if o_romset.s_romof:
+                ls_lines.append('\tromof %s\n' % _cmp_quote(o_romset.s_romof))
+            if o_romset.s_sampleof:
+                ls_lines.append('\tsampleof %s\n' % _cmp_quote(o_romset.s_sampleof))
 
-                i_size = 0
-                if o_rom.i_size:
-                    i_size = o_rom.i_size
-                ls_rom_data.append('size "%s"' % i_size)
+            for o_rom in o_romset:
+                ls_rom_data = ['name %s' % _cmp_quote(o_rom.s_name), 'size "%s"' % (o_rom.i_size or 0)]
 
-                s_crc32 = ''
                 if o_rom.s_crc32:
-                    s_crc32 = o_rom.s_crc32
-                if s_crc32:
-                    ls_rom_data.append('crc "%s"' % s_crc32)
-
-                s_md5 = ''
+                    ls_rom_data.append('crc "%s"' % o_rom.s_crc32)
                 if o_rom.s_md5:
-                    s_md5 = o_rom.s_md5
-                if s_md5:
-                    ls_rom_data.append('md5 "%s"' % s_md5)
-
-                s_sha1 = ''
+                    ls_rom_data.append('md5 "%s"' % o_rom.s_md5)
                 if o_rom.s_sha1:
-                    s_sha1 = o_rom.s_sha1
-                if s_sha1:
-                    ls_rom_data.append('sha1 "%s"' % s_sha1)
+                    ls_rom_data.append('sha1 "%s"' % o_rom.s_sha1)
+                if o_rom.s_merge:
+                    ls_rom_data.append('merge %s' % _cmp_quote(o_rom.s_merge))
 
                 ls_flags = []
                 if o_rom.b_baddump:
                     ls_flags.append('baddump')
                 if o_rom.b_nodump:
                     ls_flags.append('nodump')
+                if o_rom.b_bios:
+                    ls_flags.append('bios')
                 if ls_flags:
                     ls_rom_data.append('flags "%s"' % ' '.join(ls_flags))
 
-                s_romset += '\trom ( %s )\n' % (' '.join(ls_rom_data))
+                ls_lines.append('\trom ( %s )\n' % ' '.join(ls_rom_data))
+
+            ls_lines.append(')\n\n')
+            po_file.write(''.join(ls_lines))
+
+    def _write_xml(self, po_file):
+        """
+        Method to write the Dat to a file object in Logiqx xml format (the generic one, used by No-Intro).
+
+        :param po_file: The file object.
+        :type po_file: io.TextIOBase
+
+        :return: Nothing
+        """
+        # Header
+        #-------
+        ls_lines = ['<?xml version="1.0"?>\n',
+                    '<!DOCTYPE datafile PUBLIC "-//Logiqx//DTD ROM Management Datafile//EN" '
+                    '"http://www.logiqx.com/Dats/datafile.dtd">\n',
+                    '<datafile>\n',
+                    '\t<header>\n']
+        for s_tag, s_value in (('name', self.s_name),
+                               ('description', self.s_description),
+                               ('version', self.s_version),
+                               ('author', self.s_author),
+                               ('homepage', self.s_homepage),
+                               ('comment', self.s_comment)):
+            if s_value or s_tag in ('name', 'description', 'version'):
+                ls_lines.append('\t\t<%s>%s</%s>\n' % (s_tag, _xml_escape(s_value or ''), s_tag))
+        ls_lines.append('\t</header>\n')
+        po_file.write(''.join(ls_lines))
+
+        # ROMset data
+        #------------
+        for o_romset in self:
+            s_attribs = ''
+            if o_romset.b_device:
+                s_attribs += ' isdevice="yes"'
+            if o_romset.s_cloneof:
+                s_attribs += ' cloneof="%s"' % _xml_escape(o_romset.s_cloneof)
+            if o_romset.s_romof:
+                s_attribs += ' romof="%s"' % _xml_escape(o_romset.s_romof)
+            if o_romset.s_sampleof:
+                s_attribs += ' sampleof="%s"' % _xml_escape(o_romset.s_sampleof)
+
+            ls_lines = ['\t<game name="%s"%s>\n' % (_xml_escape(o_romset.s_name), s_attribs),
+                        '\t\t<description>%s</description>\n' % _xml_escape(o_romset.s_desc or '')]
+            if o_romset.s_year:
+                ls_lines.append('\t\t<year>%s</year>\n' % _xml_escape(o_romset.s_year))
+            if o_romset.s_auth:
+                ls_lines.append('\t\t<manufacturer>%s</manufacturer>\n' % _xml_escape(o_romset.s_auth))
+
+            for o_rom in o_romset:
+                ls_rom_data = ['name="%s"' % _xml_escape(o_rom.s_name), 'size="%i"' % (o_rom.i_size or 0)]
+
+                if o_rom.s_crc32:
+                    ls_rom_data.append('crc="%s"' % o_rom.s_crc32)
+                if o_rom.s_md5:
+                    ls_rom_data.append('md5="%s"' % o_rom.s_md5)
+                if o_rom.s_sha1:
+                    ls_rom_data.append('sha1="%s"' % o_rom.s_sha1)
+                if o_rom.s_merge:
+                    ls_rom_data.append('merge="%s"' % _xml_escape(o_rom.s_merge))
+
+                if o_rom.b_nodump:
+                    ls_rom_data.append('status="nodump"')
+                elif o_rom.b_baddump:
+                    ls_rom_data.append('status="baddump"')
+
+                # MAME indicates the name of the bios in the attribute, but just whether the ROM is a bios one is kept
+                if o_rom.b_bios:
+                    ls_rom_data.append('bios="yes"')
+
+                ls_lines.append('\t\t<rom %s/>\n' % ' '.join(ls_rom_data))
+
+            for s_device_ref in o_romset.ts_device_refs:
+                ls_lines.append('\t\t<device_ref name="%s"/>\n' % _xml_escape(s_device_ref))
+
+            ls_lines.append('\t</game>\n')
+            po_file.write(''.join(ls_lines))
+
+        po_file.write('</datafile>\n')
+
+    def _from_snapshot(self, ptx_snapshot):
+        """
+        Method to populate the object from a compact snapshot generated by _to_snapshot().
+
+        :param ptx_snapshot: The snapshot.
+        :type ptx_snapshot: Tuple
+
+        :return: Nothing, the object will be populated in place.
+        """
+        tx_header, ltx_romsets = ptx_snapshot
+        (self.s_name, self.s_description, self.s_version, self.s_comment, self.s_type, self.s_author,
+         self.s_homepage) = tx_header
+
+        self._add_snapshot_romsets(ltx_romsets)
+
+    def _add_snapshot_romsets(self, pltx_romsets, pdo_roms=None):
+        """
+        Method to add the ROMsets stored in a snapshot generated by _to_snapshot().
+
+        :param pltx_romsets: The ROMsets part of the snapshot.
+        :type pltx_romsets: List[Tuple]
+
+        :param pdo_roms: Table of the ROMs already added, so identical ROMs are shared (see _get_shared_rom()). None to
+                         use a new table.
+        :type pdo_roms: Union[Dict[Tuple:Rom], None]
+
+        :return: Nothing, the object will be populated in place.
+        """
+        do_roms = {} if pdo_roms is None else pdo_roms
+        si_used = set()
+
+        for s_name, s_desc, b_device, s_auth, s_year, ltx_roms, s_cloneof, s_romof, s_sampleof, ts_refs in pltx_romsets:
+            o_romset = RomSet(s_name, s_desc, pb_device=b_device)
+            o_romset.s_auth = sys.intern(s_auth)
+            o_romset.s_year = sys.intern(s_year)
+            o_romset.s_cloneof = sys.intern(s_cloneof)
+            o_romset.s_romof = sys.intern(s_romof)
+            o_romset.s_sampleof = sys.intern(s_sampleof)
+            o_romset.ts_device_refs = tuple(sys.intern(s_ref) for s_ref in ts_refs)
+
+            si_used.clear()
+            for t_rom in ltx_roms:
+                o_romset.add_rom(_get_shared_rom(do_roms, t_rom, si_used))
+
+            self.add_romset(o_romset)
+
+    def _to_snapshot(self):
+        """
+        Method to build a compact representation of the Dat made just of tuples and basic types, so it can be quickly
+        serialised to and loaded from disk.
+
+        :return: A tuple with the header data and the data of the ROMsets.
+        :rtype: Tuple
+        """
+        tx_header = (self.s_name, self.s_description, self.s_version, self.s_comment, self.s_type, self.s_author,
+                     self.s_homepage)
+
+        ltx_romsets = [_romset_to_tuple(o_romset) for o_romset in self._do_romsets.values()]
+
+        return tx_header, ltx_romsets
+
+    def _clear_indexes(self):
+        """
+        Method to discard the secondary indexes and the sorted list of ROMsets of the Dat. It must be called every time
+        the ROMsets are modified.
+
+        :return: Nothing
+        """
+        if self._ddlo_indexes:
+            self._ddlo_indexes = {}
+        if self._dx_closures:
+            self._dx_closures = {}
+        self._lo_sorted = None
+
+    def _get_devices(self, po_romset):
+        """
+        Method to get the devices used by a ROMset, including the devices used by other devices. Devices not present in
+        the Dat are ignored.
+
+        :param po_romset: The ROMset.
+        :type po_romset: RomSet
+
+        :return: The devices, sorted by distance to the ROMset.
+        :rtype: List[RomSet]
+        """
+        ss_seen = {po_romset.s_name}
+        lo_devices = []
+        lo_pending = [po_romset]
+
+        # Devices appended to the list while iterating it are iterated too
+        for o_pending in lo_pending:
+            for s_device in o_pending.ts_device_refs:
+                if s_device not in ss_seen:
+                    ss_seen.add(s_device)
+                    o_device = self.get_romset_by_name(s_device)
+                    if o_device is not None:
+                        lo_devices.append(o_device)
+                        lo_pending.append(o_device)
+
+        return lo_devices
+
+    def _resolve_rom(self, po_romset, po_rom):
+        """
+        Method to find where a ROM is stored in split ROMsets collections. ROMs with "merge" field are taken from the
+        "romof" ROMset of their ROMset, where they can have a "merge" field again (e.g. a bios ROM listed in a clone,
+        its parent and the bios itself).
+
+        :param po_romset: The ROMset containing the ROM.
+        :type po_romset: RomSet
+
+        :param po_rom: The ROM.
+        :type po_rom: Rom
+
+        :return: A tuple with the ROMset storing the ROM and the ROM in that ROMset.
+        :rtype: Tuple[RomSet, Rom]
+        """
+        o_owner = po_romset
+        o_owner_rom = po_rom
+        ss_seen = {po_romset.s_name}
+
+        while o_owner_rom.s_merge and o_owner.s_romof and o_owner.s_romof not in ss_seen:
+            o_source = self.get_romset_by_name(o_owner.s_romof)
+            if o_source is None:
+                break
+
+            o_source_rom = o_source.get_rom_by_name(o_owner_rom.s_merge)
+            if o_source_rom is None:
+                break
+
+            ss_seen.add(o_source.s_name)
+            o_owner = o_source
+            o_owner_rom = o_source_rom
 
-            s_romset += ')\n\n'
-            ls_chunks.append(s_romset)
+        return o_owner, o_owner_rom
 
-        return ''.join(ls_chunks)
+    def _join(self, po_other, ps_key, pb_matched):
+        """
+        Method to get the ROMsets of another Dat that match (or don't match) any ROMset of this Dat. It's a hash join:
+        the keys of the ROMsets of this Dat are put in a set (the dictionary of ROMsets is used for names) and the
+        ROMsets of the other Dat are looked up in it, so no nested loops are needed. See _get_join_key() for the ROMsets
+        that can be matched.
+
+        :param po_other: The other Dat.
+        :type po_other: Dat
+
+        :param ps_key: Field used to match the ROMsets: 's_name', 's_ccrc32' or 's_csha1'.
+        :type ps_key: Str
+
+        :param pb_matched: Whether the matching ROMsets are returned (True) or the ones not matching (False).
+        :type pb_matched: Bool
+
+        :return: The ROMsets of the other Dat, in the order they were added to it.
+        :rtype: List[RomSet]
+        """
+        if ps_key not in _ts_SET_KEYS:
+            raise ValueError('ERROR: ps_key must be one of %s' % str(_ts_SET_KEYS))
+
+        if ps_key == 's_name':
+            # In lazy mode the names are known without parsing any ROMset
+            do_romsets = self._do_romsets
+            return [o_romset for o_romset in po_other.iter_unordered() if (o_romset.s_name in do_romsets) is pb_matched]
+
+        # The compound hashes are cached by the ROMsets, so only the first join by a hash computes them
+        sx_keys = {_get_join_key(o_romset, ps_key) for o_romset in self.iter_unordered()}
+        sx_keys.discard(None)
+        return [o_romset for o_romset in po_other.iter_unordered()
+                if (_get_join_key(o_romset, ps_key) in sx_keys) is pb_matched]
+
+    def _get_index(self, ps_field):
+        """
+        Method to get the index of a field, building it when it doesn't exist. Notice ROMsets modified in place (e.g.
+        adding ROMs to a ROMset already in the Dat) won't be updated in the indexes.
+
+        :param ps_field: Name of the field. e.g. 's_ccrc32'
+        :type ps_field: Str
+
+        :return: A dictionary field value => list of ROMsets with that value, sorted by description.
+        :rtype: Dict[Any:List[RomSet]]
+        """
+        try:
+            return self._ddlo_indexes[ps_field]
+        except KeyError:
+            pass
+
+        dlo_index = {}
+        for o_romset in self:
+            x_value = getattr(o_romset, ps_field)
+            try:
+                dlo_index[x_value].append(o_romset)
+            except KeyError:
+                dlo_index[x_value] = [o_romset]
+
+        self._ddlo_indexes[ps_field] = dlo_index
+        return dlo_index
 
     def _get_i_baddumps(self):
         i_baddumps = 0
-        for o_romset in self:
+        for o_romset in self.iter_unordered():
             if o_romset.b_baddump:
                 i_baddumps += 1
         return i_baddumps
 
     def _get_i_devices(self):
         i_devices = 0
-        for o_romset in self:
+        for o_romset in self.iter_unordered():
             if o_romset.b_device:
                 i_devices += 1
         return i_devices
 
     def _get_i_nodumps(self):
         i_nodumps = 0
-        for o_romset in self:
+        for o_romset in self.iter_unordered():
             if o_romset.b_nodump:
                 i_nodumps += 1
         return i_nodumps
@@ -814,25 +1927,34 @@ class Dat(object):
         return len(self._do_romsets)
 
     @staticmethod
-    def _identify_xml_format(ps_file):
+    def _identify_format(px_head):
         """
-        Method to identify the format of a .xml dat file. So far I've identified two formats: MAME and generic xml used
-        by No-Intro (and maybe others).
+        Method to identify the format of a .dat file from its first bytes. ClrMamePro dats are identified by their first
+        line, while two formats of xml dats are identified: MAME and generic xml used by No-Intro (and maybe others).
 
-        :param ps_file:
-        :type ps_file: Unicode
+        :param px_head: First bytes of the file (at least the ones containing the xml doctype).
+        :type px_head: Bytes
 
-        :return: The format of the xml file
-        :rtype Unicode
+        :return: The format of the file: 'cmp', 'mame' or 'generic'.
+        :rtype Str
         """
-        with codecs.open(ps_file, 'r', 'utf8') as o_file:
-            s_data = o_file.read(size=8192)
+        x_first_line = px_head.partition(b'\n')[0]
+
+        # Identifying ClrMamePro mode
+        if (x_first_line.find(b'clrmamepro') != -1) or (x_first_line.find(b'emulator') != -1):
+            s_format = 'cmp'
+
+        # Identifying Xml mode
+        elif x_first_line.find(b'<?xml') != -1:
+            s_format = 'generic'
+            if b'<!DOCTYPE mame' in px_head:
+                s_format = 'mame'
 
-        s_type = 'generic'
-        if '<!DOCTYPE mame' in s_data:
-            s_type = 'mame'
+        # Unknown format error raise
+        else:
+            raise IOError('Unknown DAT format')
 
-        return s_type
+        return s_format
 
     i_baddumps = property(fget=_get_i_baddumps, fset=None)
     i_nodumps = property(fget=_get_i_nodumps, fset=None)
@@ -846,6 +1968,9 @@ class RomSet(object):
 
     :ivar ._lo_roms = List[Rom]
     """
+    __slots__ = ('s_name', 's_desc', 'b_device', '_lo_roms', 's_auth', 's_year', 's_cloneof', 's_romof', 's_sampleof',
+                 'ts_device_refs', '_dx_cache')
+
     def __init__(self, ps_name, ps_description, pb_device=False):
         """
 
@@ -869,6 +1994,17 @@ class RomSet(object):
         # Properties: The rest
         self._lo_roms = []            # Somehow, ROMsets *CAN* have "duplicated" ROMs with the same name, so a list.
         self.s_auth = ''              # Author, company that programmed the game (MAME dat support only, AFAIK).
+        self.s_year = ''              # Year of release of the game (ClrMamePro dat support only, so far).
+
+        # Properties: Relations with other ROMsets (MAME and some other arcade dats only). See Dat.get_required_files().
+        self.s_cloneof = ''           # Parent of a clone. i.e. 'sf2' for 'sf2ua'.
+        self.s_romof = ''             # ROMset where the ROMs with "merge" field are taken from: the parent for clones,
+                                      # the bios for parents running on a bios system. i.e. 'neogeo' for 'mslug'.
+        self.s_sampleof = ''          # Set of samples (audio files, not ROMs) used by the game.
+        self.ts_device_refs = ()      # Devices used by the game. Their ROMs are not listed in the ROMset, but needed.
+
+        self._dx_cache = {}           # Cached values derived from the ROMs (relevant ROMs, compound hashes...). It's
+                                      # emptied every time a ROM is added.
 
     def __iter__(self):
         """
@@ -925,55 +2061,77 @@ class RomSet(object):
         :return: Nothing
         """
         self._lo_roms.append(po_rom)
+        self._dx_cache.clear()
+
+    def get_rom_by_name(self, ps_name):
+        """
+        Method to find a ROM of the ROMset by its name. The ROMs are indexed by name the first time it's needed, and the
+        index is kept until a new ROM is added to the ROMset.
+
+        :param ps_name: Name of the ROM. i.e. '253-p1p.p1'
+        :type ps_name: Str
+
+        :return: The first ROM with that name or None if no ROM is found.
+        :rtype: Union[Rom, None]
+        """
+        try:
+            do_roms = self._dx_cache['names']
+        except KeyError:
+            do_roms = {}
+            for o_rom in self._lo_roms:
+                do_roms.setdefault(o_rom.s_name, o_rom)
+            self._dx_cache['names'] = do_roms
 
-    def _get_so_relevant_roms(self, pb_clean=False):
+        return do_roms.get(ps_name)
+
+    def _get_lo_relevant_roms(self, pb_clean=False):
         """
-        Auxiliary method to build a set of relevant ROMs form a ROMset. Depending on whether we want all ROMs or just
-        clean ROMs (no bad-dumps, no bios, no .cue files...), the set will be different. This method will be called by
-        any other method that requires working with all ROMs or just "clean" ROMs.
+        Auxiliary method to build a list of relevant ROMs form a ROMset. Depending on whether we want all ROMs or just
+        clean ROMs (no bad-dumps, no bios, no .cue files...), the list will be different. This method will be called by
+        any other method that requires working with all ROMs or just "clean" ROMs. The result is cached until a new ROM
+        is added to the ROMset. The list can be the list of ROMs of the ROMset itself, so it must not be modified.
 
         :param pb_clean:
         :type pb_clean: Bool
 
         :return:
-        :rtype Set[Rom]
+        :rtype List[Rom]
         """
+        t_key = _dt_CACHE_KEYS['roms', bool(pb_clean)]
+        try:
+            return self._dx_cache[t_key]
+        except KeyError:
+            pass
+
         # The first step is to create a list with the desired ROMs
         #---------------------------------------------------------
-        # This set will be used to identify whether a ROM already has been already taken into account. For the clean
-        # hash, we only take duplicated ROMs into account once. Yes, it's possible that some games contain the same ROM
-        # twice.
-        ss_relevant_roms = set()
-        lo_relevant_roms = []
-
-        for o_rom in self._lo_roms:
-            # By default, every ROM will be taken into account...
-            b_include = True
-            s_rom_ext = o_rom.s_name.rpartition('.')[2].lower()
-            # o_rom_fp = files.FilePath(o_rom.s_name)
-
-            # ...unless we're in "clean mode" where we'll discard ROMs for different reasons
-            if pb_clean:
-                # ...for having an unwanted extension (like .cue)
-                #if o_rom_fp.has_exts(*_ts_IGNORE_EXTS):
-                if s_rom_ext in _ts_IGNORE_EXTS:
-                    b_include = False
-
-                # ...to be actually a bios ROM.
-                if o_rom.b_bios:
-                    b_include = False
+        # A Rom object added twice is only taken into account once...
+        if not pb_clean:
+            do_relevant_roms = {id(o_rom): o_rom for o_rom in self._lo_roms}
+
+        # ...and in "clean mode" we'll discard ROMs for different reasons too. For the clean hash, we only take
+        # duplicated ROMs into account once (there are MAME boards with duplicated chips => duplicated ROM files). Since
+        # ROMs are kept by name, a Rom object added twice is discarded by this check as well.
+        else:
+            do_relevant_roms = {}
+            for o_rom in self._lo_roms:
+                s_name = o_rom.s_name
+
+                # ...for being a bios ROM, being already taken into account or having an unwanted extension (like .cue)
+                if o_rom.b_bios or s_name in do_relevant_roms or s_name.rpartition('.')[2].lower() in _ts_IGNORE_EXTS:
+                    continue
 
-                # ...to be already taken into account (there are MAME boards with duplicated chips => duplicated
-                # ROM files)
-                if o_rom.s_name in ss_relevant_roms:
-                    b_include = False
+                do_relevant_roms[s_name] = o_rom
 
-            # Finally, we store the ROMs that passed the checks
-            if b_include:
-                ss_relevant_roms.update((o_rom.s_name,))
-                lo_relevant_roms.append(o_rom)
+        # When all the ROMs are relevant (the usual case), the list of ROMs itself is kept instead of a copy, since
+        # millions of small lists make the garbage collector of Python much slower for huge dats.
+        if len(do_relevant_roms) == len(self._lo_roms):
+            lo_relevant_roms = self._lo_roms
+        else:
+            lo_relevant_roms = list(do_relevant_roms.values())
 
-        return set(lo_relevant_roms)
+        self._dx_cache[t_key] = lo_relevant_roms
+        return lo_relevant_roms
 
     def _get_s_hash(self, ps_type='crc32', pb_clean=False):
         """
@@ -1006,44 +2164,47 @@ class RomSet(object):
                global hash of the whole game will be different. SO, TO AVOID THIS ISSUE, .CUE FILES AND OTHER META-DATA
                FILES ARE NOT CONSIDERED WHEN CALCULATING THE HASH OF THE GAME.
 
-        :return: A keyed dictionary with 'crc32', 'md5', and 'sha1' hashes in hex-string format
-        :rtype: Dict[Str:Str]
+        The sum is done with integers and only the last digits of the result are kept (8 for crc32, 32 for md5, 40 for
+        sha1). The result is cached until a new ROM is added to the ROMset. Some corner cases kept for backwards
+        compatibility: ROMsets without relevant ROMs get a hash full of zeros, ROMsets whose ROM hashes add up to zero
+        get an empty string, and ROMsets with any unknown (None) hash get None.
+
+        :return: The compound hash in hex-string format
+        :rtype: Union[Str, None]
         """
+        try:
+            i_hash_length, s_rom_attribute = _dti_HASH_TYPES[ps_type]
+        except KeyError:
+            raise Exception('Invalid hash type "%s"' % ps_type)
+
+        t_key = _dt_CACHE_KEYS[ps_type, bool(pb_clean)]
+        try:
+            return self._dx_cache[t_key]
+        except KeyError:
+            pass
 
-        so_relevant_roms = self._get_so_relevant_roms(pb_clean=pb_clean)
+        lo_relevant_roms = self._get_lo_relevant_roms(pb_clean=pb_clean)
 
         # Calculation ROMset "compound" hash (which is the sum of all the relevant ROMs hashes
         #-------------------------------------------------------------------------------------
-        ls_hexs = []
-        for o_rom in so_relevant_roms:
-            if ps_type == 'crc32':
-                ls_hexs.append(o_rom.s_crc32)
-            elif ps_type == 'md5':
-                ls_hexs.append(o_rom.s_md5)
-            elif ps_type == 'sha1':
-                ls_hexs.append(o_rom.s_sha1)
-            else:
-                raise Exception('Invalid hash type "%s"' % ps_type)
-
-        s_hash = _compound_hash(ls_hexs)
+        i_hash = 0
+        for o_rom in lo_relevant_roms:
+            s_hex = getattr(o_rom, s_rom_attribute)
+            if s_hex is None:
+                s_hash = None
+                break
+            elif s_hex:
+                i_hash += int(s_hex, 16)
 
         # Setting the proper length for each type of hash: crc32 = 8 chars, md5 = 32 chars, sha1 = 40 chars
         #--------------------------------------------------------------------------------------------------
-        if s_hash:
-            i_hash_length = 0
-            if ps_type == 'crc32':
-                i_hash_length = 8
-            elif ps_type == 'md5':
-                i_hash_length = 32
-            elif ps_type == 'sha1':
-                i_hash_length = 40
-
-            s_hash = s_hash[-i_hash_length:]
-            s_hash = s_hash.rjust(i_hash_length, '0')
-
         else:
-            pass
+            if lo_relevant_roms and i_hash == 0:
+                s_hash = ''
+            else:
+                s_hash = '%0*x' % (i_hash_length, i_hash & ((1 << (4 * i_hash_length)) - 1))
 
+        self._dx_cache[t_key] = s_hash
         return s_hash
 
     def _get_i_size(self, pb_clean=False):
@@ -1054,12 +2215,12 @@ class RomSet(object):
         :param pb_clean: True for clean mode, False for dirty mode
         :type pb_clean Bool
         """
-        so_relevant_roms = self._get_so_relevant_roms(pb_clean=pb_clean)
+        lo_relevant_roms = self._get_lo_relevant_roms(pb_clean=pb_clean)
 
         # Then we can compute the total size of the ROMs
         #-----------------------------------------------
         i_global_size = 0
-        for o_rom in so_relevant_roms:
+        for o_rom in lo_relevant_roms:
             i_global_size += o_rom.i_size
 
         return i_global_size
@@ -1075,8 +2236,7 @@ class RomSet(object):
         :return The number of ROMs
         :rtype Int
         """
-        so_relevant_roms = self._get_so_relevant_roms(pb_clean=pb_clean)
-        return len(so_relevant_roms)
+        return len(self._get_lo_relevant_roms(pb_clean=pb_clean))
 
     def _get_b_baddump(self):
         """
@@ -1172,8 +2332,15 @@ class Rom:
     280! times in MAME v238 .xml, INSANE! Well, anyway, after the long introduction: the idea behind including whether a
     file belongs to the bios is being to filter them when getting the clean CRC32 of a ROMset.
 
+    NOTE ABOUT MEMORY: Because of the above, the readers of the Dat class keep a table of the ROMs already read, and
+    identical ROMs (same name, size, hashes and flags) are shared by all the ROMsets containing them instead of being
+    copied. So, once a ROM is added to a ROMset, it must be treated as immutable; to change a ROM of a single ROMset,
+    replace it by a new Rom object. The class uses __slots__ for the same reason, there are hundreds of thousands of
+    ROMs in a MAME dat.
+
     :ivar b_bios Bool
     """
+    __slots__ = ('b_baddump', 'b_nodump', 'b_bios', 's_name', 's_crc32', 's_md5', 's_sha1', 'i_size', 's_merge')
 
     def __init__(self):
         self.b_baddump = False  # Whether it's a bad-dump. So far, MAME is the only one to indicate it.
@@ -1203,118 +2370,632 @@ class Rom:
         return s_out
 
 
-class CatVer:
+class DatColumns(object):
     """
-    Class to store the Category and Version information stored in catver.ini files for Mame. The category is the genre
-    of each of the ROMsets of MAME, while the version is the version number where a particular ROMset was included into
-    MAME.
-
-    :ivar _do_entries: Dict[Unicode:_CatVerEntry]
+    Class to store the data of a Dat in a columnar way, using NumPy arrays, so statistics and audits over whole dats
+    (duplicates, size ranges, compound hashes, counters...) are computed with vectorized operations instead of going
+    through thousands of RomSet and Rom objects. The data is a static copy of the Dat when the object was created.
+
+    ROMsets are stored in the same order as the Dat is iterated (sorted by description). The ROMs of the ROMset i are
+    the rows ai_offsets[i] to ai_offsets[i + 1] of the ROM arrays. Only the ROMs taken into account for the dirty hashes
+    are stored, and the ones taken into account for the clean hashes are marked with a flag.
+
+    NumPy is required by this class.
+
+    :ivar ls_names: List[Str]
+    :ivar ai_offsets: numpy.ndarray[int64]
+    :ivar ai_romset_flags: numpy.ndarray[uint8]
+    :ivar ai_sizes: numpy.ndarray[int64]
+    :ivar ai_crc32: numpy.ndarray[uint32]
+    :ivar ax_md5: numpy.ndarray[uint8]
+    :ivar ax_sha1: numpy.ndarray[uint8]
+    :ivar ai_flags: numpy.ndarray[uint8]
     """
-    def __init__(self, ps_file=''):
-        self.s_version = ''    # Version of the catver.ini
-        self.s_date = ''       # Date of the catver.ini
-        self.s_mame = ''       # MAME version for the catver.ini (typically the same as the version of catver.ini)
-        self._do_entries = {}  # Dictionary with all CatVer entries. Key is ROMset name.
+    def __init__(self, po_dat):
+        """
+        :param po_dat: The Dat to be converted.
+        :type po_dat: Dat
+        """
+        if numpy is None:
+            raise ImportError('ERROR: NumPy is required for the columnar representation of dats')
+
+        ls_names = []
+        li_offsets = [0]
+        li_romset_flags = []
+        li_sizes = []
+        li_crc32 = []
+        lx_md5 = []
+        lx_sha1 = []
+        li_flags = []
+
+        i_mask_md5 = (1 << 128) - 1
+        i_mask_sha1 = (1 << 160) - 1
+        i_no_crc32 = _di_FLAG_NO_HASH['crc32']
+        i_no_md5 = _di_FLAG_NO_HASH['md5']
+        i_no_sha1 = _di_FLAG_NO_HASH['sha1']
+
+        for o_romset in po_dat:
+            ls_names.append(o_romset.s_name)
+            li_romset_flags.append(_i_FLAG_DEVICE if o_romset.b_device else 0)
+
+            si_clean_roms = {id(o_rom) for o_rom in o_romset._get_lo_relevant_roms(pb_clean=True)}
+            lo_roms = o_romset._get_lo_relevant_roms(pb_clean=False)
+            li_offsets.append(li_offsets[-1] + len(lo_roms))
+
+            for o_rom in lo_roms:
+                i_flags = 0
+                if o_rom.b_baddump:
+                    i_flags |= _i_FLAG_BADDUMP
+                if o_rom.b_nodump:
+                    i_flags |= _i_FLAG_NODUMP
+                if o_rom.b_bios:
+                    i_flags |= _i_FLAG_BIOS
+                if id(o_rom) in si_clean_roms:
+                    i_flags |= _i_FLAG_CLEAN
+
+                # Unknown hashes are flagged, while empty ones are stored as zero (they don't add anything)
+                if o_rom.s_crc32 is None:
+                    i_flags |= i_no_crc32
+                    li_crc32.append(0)
+                else:
+                    li_crc32.append(int(o_rom.s_crc32 or '0', 16) & 0xffffffff)
 
-        if ps_file:
-            self.read_from_file(ps_file)
+                if o_rom.s_md5 is None:
+                    i_flags |= i_no_md5
+                    lx_md5.append(bytes(16))
+                else:
+                    lx_md5.append((int(o_rom.s_md5 or '0', 16) & i_mask_md5).to_bytes(16, 'big'))
 
-    def __iter__(self):
-        """
+                if o_rom.s_sha1 is None:
+                    i_flags |= i_no_sha1
+                    lx_sha1.append(bytes(20))
+                else:
+                    lx_sha1.append((int(o_rom.s_sha1 or '0', 16) & i_mask_sha1).to_bytes(20, 'big'))
 
-        :return:
-        :rtype Iterator[_CatVerEntry]
+                li_sizes.append(o_rom.i_size or 0)
+                li_flags.append(i_flags)
+
+        self.ls_names = ls_names                                          # ROMset names.
+        self.ai_offsets = numpy.array(li_offsets, dtype=numpy.int64)      # First ROM row of each ROMset (+ the end).
+        self.ai_romset_flags = numpy.array(li_romset_flags, dtype=numpy.uint8)  # Bit flags of the ROMsets.
+        self.ai_sizes = numpy.array(li_sizes, dtype=numpy.int64)          # Size of the ROMs.
+        self.ai_crc32 = numpy.array(li_crc32, dtype=numpy.uint32)         # CRC32 of the ROMs.
+        self.ax_md5 = numpy.frombuffer(b''.join(lx_md5), dtype=numpy.uint8).reshape(-1, 16)    # MD5 of the ROMs.
+        self.ax_sha1 = numpy.frombuffer(b''.join(lx_sha1), dtype=numpy.uint8).reshape(-1, 20)  # SHA1 of the ROMs.
+        self.ai_flags = numpy.array(li_flags, dtype=numpy.uint8)          # Bit flags of the ROMs.
+
+    def __len__(self):
+        return self.i_romsets
+
+    def filter_by_size(self, pi_min=0, pi_max=None, pb_clean=True):
         """
-        return iter(self._do_entries.values())
+        Method to get the ROMsets with a total size in a range.
 
-    def __str__(self):
-        s_out = '<CatVer>\n'
-        s_out += '  .s_version: %s\n' % self.s_version
-        s_out += '  .s_date:    %s\n' % self.s_date
-        s_out += '  .s_mame:    %s\n' % self.s_mame
-        s_out += '  .i_entries: %s\n' % self.i_entries
-        return s_out
+        :param pi_min: Minimum size in bytes (included).
+        :type pi_min: Int
 
-    def get_entry(self, ps_rom):
+        :param pi_max: Maximum size in bytes (included). None for no maximum.
+        :type pi_max: Union[Int, None]
+
+        :param pb_clean: Whether the clean or the dirty size is used.
+        :type pb_clean: Bool
+
+        :return: The names of the matching ROMsets.
+        :rtype: List[Str]
         """
-        Method to get the entry for a given ROMset name.
+        ai_sizes = self.get_sizes(pb_clean=pb_clean)
+        ab_matches = ai_sizes >= pi_min
+        if pi_max is not None:
+            ab_matches &= ai_sizes <= pi_max
 
-        :param ps_rom:
-        :type ps_rom: Unicode
+        return [self.ls_names[i_romset] for i_romset in numpy.flatnonzero(ab_matches).tolist()]
 
-        :return:
-        :rtype _CatVerEntry
+    def get_duplicated_crc32(self):
         """
-        return self._do_entries[ps_rom]
+        Method to return ROMsets with duplicated clean CRC32, as Dat.get_duplicated_crc32() does.
 
-    def read_from_file(self, ps_file):
+        :return: A dictionary with the names of the ROMsets sharing each duplicated clean CRC32.
+        :rtype: Dict[Str:List[Str]]
         """
-        Method to populate the object from a catver.ini file.
+        ai_limbs, ai_status = self.get_hashes(ps_type='crc32', pb_clean=True)
 
-        :param ps_file:
-        :type ps_file: Unicode
+        # Hash values and "status" (regular, empty, unknown) are combined in a single key
+        ai_keys = ai_limbs[:, 0].astype(numpy.int64) | (ai_status.astype(numpy.int64) << 32)
+        ai_order = numpy.argsort(ai_keys, kind='stable')
+        ai_sorted_keys = ai_keys[ai_order]
 
-        :return: Nothing, the object will be populated in place.
+        ai_starts = numpy.flatnonzero(numpy.r_[True, ai_sorted_keys[1:] != ai_sorted_keys[:-1]])
+        ai_ends = numpy.r_[ai_starts[1:], len(ai_sorted_keys)]
+        ab_duplicated = (ai_ends - ai_starts) > 1
+
+        dls_collisions = {}
+        for i_start, i_end in zip(ai_starts[ab_duplicated].tolist(), ai_ends[ab_duplicated].tolist()):
+            i_first = ai_order[i_start]
+            s_hash = self._format_hashes(ai_limbs[i_first:i_first + 1], ai_status[i_first:i_first + 1])[0]
+            dls_collisions[s_hash] = [self.ls_names[i_romset] for i_romset in ai_order[i_start:i_end].tolist()]
+
+        return dls_collisions
+
+    def get_hashes(self, ps_type='crc32', pb_clean=False):
         """
+        Method to compute the compound hashes of all the ROMsets (see RomSet._get_s_hash()).
 
-        # Reading the heading information
-        #--------------------------------
-        with codecs.open(ps_file, 'r', 'utf8') as o_file:
-            s_heading = o_file.read(8192)
-
-        for s_line in s_heading.splitlines():
-            if s_line.startswith(';;'):
-                s_line = s_line.strip(';')
-                s_line = s_line.strip()
-                ls_chunks = s_line.split('/')
-                self.s_version = ls_chunks[0].strip()
-                self.s_date = ls_chunks[1].strip()
-                self.s_mame = ls_chunks[2].strip()
-
-        # Reading the ROMsets information
-        #--------------------------------
-        with codecs.open(ps_file, 'r', 'utf8') as o_file:
-            # We need to skip the first lines because they don't follow the ini standard
-            ls_data = o_file.readlines()[8:]
-            o_ini = configparser.ConfigParser()
-            o_ini.read_string(''.join(ls_data))
-
-            # Reading the categories
-            for s_romset in o_ini.options('Category'):
-                s_categories = o_ini.get('Category', s_romset).lower()
-                s_cat_main, _, s_cat_second = s_categories.partition('/')
-                s_cat_main = s_cat_main.strip()
-                s_cat_second = s_cat_second.strip()
-
-                if s_romset not in self._do_entries:
-                    o_entry = _CatVerEntry(ps_romset=s_romset)
-                    self._do_entries[s_romset] = o_entry
+        :param ps_type: Type of hash: 'crc32', 'md5' or 'sha1'.
+        :type ps_type: Str
 
-                self._do_entries[s_romset].s_cat_1st = s_cat_main
-                self._do_entries[s_romset].s_cat_2nd = s_cat_second
+        :param pb_clean: Whether the clean or the dirty ROMs are used.
+        :type pb_clean: Bool
 
-            # Reading the MAME version when the ROMset was introduced
-            for s_romset in o_ini.options('VerAdded'):
-                s_version = o_ini.get('VerAdded', s_romset)
-                # At this point, the CatVerEntry should already exist, but I'll check it, just in case so the code is
-                # more robust.
-                if s_romset not in self._do_entries:
-                    o_entry = _CatVerEntry(ps_romset=s_romset)
-                    self._do_entries[s_romset] = o_entry
+        :return: A tuple with an array of 32 bits limbs of the hashes (most significant first, one row per ROMset) and
+                 an array with the status of each hash: 0 for regular hashes, 1 for empty hashes (all the ROM hashes
+                 are zero, not just their truncated sum) and 2 for unknown hashes (None).
+        :rtype: Tuple[numpy.ndarray[uint32], numpy.ndarray[int8]]
+        """
+        if ps_type == 'crc32':
+            ai_rom_limbs = self.ai_crc32.astype(numpy.int64).reshape(-1, 1)
+        elif ps_type == 'md5':
+            ai_rom_limbs = self.ax_md5.view('>u4').astype(numpy.int64)
+        elif ps_type == 'sha1':
+            ai_rom_limbs = self.ax_sha1.view('>u4').astype(numpy.int64)
+        else:
+            raise Exception('Invalid hash type "%s"' % ps_type)
 
-                self._do_entries[s_romset].s_version = s_version
+        ab_relevant = self._get_relevant_roms(pb_clean)
+        ai_limbs = self._sum_by_romset(ai_rom_limbs * ab_relevant[:, None])
 
-    def _get_i_entries(self):
-        return len(self._do_entries)
+        # Carry propagation from the least significant limb, the carry of the most significant one is discarded
+        ai_carry = numpy.zeros(len(ai_limbs), dtype=numpy.int64)
+        for i_limb in range(ai_limbs.shape[1] - 1, -1, -1):
+            ai_total = ai_limbs[:, i_limb] + ai_carry
+            ai_limbs[:, i_limb] = ai_total & 0xffffffff
+            ai_carry = ai_total >> 32
 
-    i_entries = property(fget=_get_i_entries, fset=None)
+        ai_roms = self._sum_by_romset(ab_relevant)
+        ai_unknown = self._sum_by_romset(ab_relevant & ((self.ai_flags & _di_FLAG_NO_HASH[ps_type]) != 0))
 
+        # The sum of the ROM hashes can overflow to zero (e.g. ffffffff + 00000001), the hash is empty only when the
+        # hashes of all the ROMs are zero.
+        ai_non_zero = self._sum_by_romset(ab_relevant & ai_rom_limbs.any(axis=1))
 
-class _CatVerEntry:
-    """
-    Class to store information about each of the catver.ini file entries.
-    """
+        ai_status = numpy.zeros(len(ai_limbs), dtype=numpy.int8)
+        ai_status[(ai_roms > 0) & (ai_non_zero == 0)] = 1
+        ai_status[ai_unknown > 0] = 2
+
+        return ai_limbs.astype(numpy.uint32), ai_status
+
+    def get_s_hashes(self, ps_type='crc32', pb_clean=False):
+        """
+        Method to get the compound hashes of all the ROMsets as hex strings, the same values returned by RomSet
+        properties (s_ccrc32, s_dmd5...).
+
+        :param ps_type: Type of hash: 'crc32', 'md5' or 'sha1'.
+        :type ps_type: Str
+
+        :param pb_clean: Whether the clean or the dirty ROMs are used.
+        :type pb_clean: Bool
+
+        :return: The hashes, in the same order as ls_names.
+        :rtype: List[Union[Str, None]]
+        """
+        return self._format_hashes(*self.get_hashes(ps_type=ps_type, pb_clean=pb_clean))
+
+    def get_sizes(self, pb_clean=False):
+        """
+        Method to get the total size of all the ROMsets.
+
+        :param pb_clean: Whether the clean or the dirty ROMs are used.
+        :type pb_clean: Bool
+
+        :return: The sizes, in the same order as ls_names.
+        :rtype: numpy.ndarray[int64]
+        """
+        return self._sum_by_romset(self.ai_sizes * self._get_relevant_roms(pb_clean))
+
+    def _count_romsets_with_flag(self, pi_flag):
+        """
+        Method to count the ROMsets having, at least, one ROM with a flag.
+
+        :param pi_flag: The flag. e.g. _i_FLAG_BADDUMP
+        :type pi_flag: Int
+
+        :return: The number of ROMsets.
+        :rtype: Int
+        """
+        return int(numpy.count_nonzero(self._sum_by_romset((self.ai_flags & pi_flag) != 0)))
+
+    @staticmethod
+    def _format_hashes(pai_limbs, pai_status):
+        """
+        Method to convert the hashes returned by get_hashes() to hex strings.
+
+        :return: The hashes.
+        :rtype: List[Union[Str, None]]
+        """
+        s_format = '%08x' * pai_limbs.shape[1]
+        ls_hashes = []
+        for ti_limbs, i_status in zip(pai_limbs.tolist(), pai_status.tolist()):
+            if i_status == 2:
+                ls_hashes.append(None)
+            elif i_status == 1:
+                ls_hashes.append('')
+            else:
+                ls_hashes.append(s_format % tuple(ti_limbs))
+        return ls_hashes
+
+    def _get_relevant_roms(self, pb_clean):
+        """
+        Method to get a mask with the ROMs taken into account in clean or dirty mode.
+
+        :param pb_clean: True for clean mode, False for dirty mode.
+        :type pb_clean: Bool
+
+        :return: The mask.
+        :rtype: numpy.ndarray[bool]
+        """
+        if pb_clean:
+            return (self.ai_flags & _i_FLAG_CLEAN) != 0
+        return numpy.ones(len(self.ai_flags), dtype=bool)
+
+    def _sum_by_romset(self, pax_values):
+        """
+        Method to add up the values of the ROMs of each ROMset. Cumulative sums are used instead of
+        numpy.add.reduceat() because the later doesn't handle ROMsets without ROMs.
+
+        :param pax_values: Array with one value (or row of values) per ROM.
+        :type pax_values: numpy.ndarray
+
+        :return: Array with one value (or row of values) per ROMset.
+        :rtype: numpy.ndarray[int64]
+        """
+        ax_values = pax_values.astype(numpy.int64)
+        ai_cumsum = numpy.zeros((len(ax_values) + 1,) + ax_values.shape[1:], dtype=numpy.int64)
+        numpy.cumsum(ax_values, axis=0, out=ai_cumsum[1:])
+        return ai_cumsum[self.ai_offsets[1:]] - ai_cumsum[self.ai_offsets[:-1]]
+
+    def _get_i_baddumps(self):
+        return self._count_romsets_with_flag(_i_FLAG_BADDUMP)
+
+    def _get_i_devices(self):
+        return int(numpy.count_nonzero(self.ai_romset_flags & _i_FLAG_DEVICE))
+
+    def _get_i_nodumps(self):
+        return self._count_romsets_with_flag(_i_FLAG_NODUMP)
+
+    def _get_i_roms(self):
+        return len(self.ai_flags)
+
+    def _get_i_romsets(self):
+        return len(self.ls_names)
+
+    i_baddumps = property(fget=_get_i_baddumps, fset=None)
+    i_devices = property(fget=_get_i_devices, fset=None)
+    i_nodumps = property(fget=_get_i_nodumps, fset=None)
+    i_roms = property(fget=_get_i_roms, fset=None)
+    i_romsets = property(fget=_get_i_romsets, fset=None)
+
+
+class DatDiff(object):
+    """
+    Class to store the differences between two versions of a Dat, as computed by Dat.get_diff(). ROMsets can be:
+
+        - Added: present only in the new version.
+        - Removed: present only in the old version.
+        - Renamed: present only in the old version with a name and only in the new version with another name, having
+          the same clean CRC32. Other data (e.g. .cue files, description) can be different too.
+        - Changed: present in both versions with the same name but different data (ROMs, description, year...).
+
+    :ivar lo_added: List[RomSet]
+    :ivar lo_removed: List[RomSet]
+    :ivar lto_renamed: List[Tuple[RomSet, RomSet]]
+    :ivar lto_changed: List[Tuple[RomSet, RomSet]]
+    """
+    def __init__(self):
+        self.tx_header = ()     # Header data of the new version (same layout as in snapshots).
+        self.lo_added = []      # ROMsets of the new version.
+        self.lo_removed = []    # ROMsets of the old version.
+        self.lto_renamed = []   # Pairs (ROMset of the old version, ROMset of the new version).
+        self.lto_changed = []   # Pairs (ROMset of the old version, ROMset of the new version).
+
+    def __len__(self):
+        return len(self.lo_added) + len(self.lo_removed) + len(self.lto_renamed) + len(self.lto_changed)
+
+    def __str__(self):
+        s_out = '<DatDiff>\n'
+        s_out += '  .lo_added:    %i\n' % len(self.lo_added)
+        s_out += '  .lo_removed:  %i\n' % len(self.lo_removed)
+        s_out += '  .lto_renamed: %i\n' % len(self.lto_renamed)
+        s_out += '  .lto_changed: %i\n' % len(self.lto_changed)
+        return s_out
+
+    @staticmethod
+    def get_rom_changes(po_old_romset, po_new_romset):
+        """
+        Method to get the ROMs added and removed between two versions of a ROMset (e.g. a pair of lto_changed). ROMs are
+        compared by all their data (name, size, hashes, flags...).
+
+        :param po_old_romset: The old version of the ROMset.
+        :type po_old_romset: RomSet
+
+        :param po_new_romset: The new version of the ROMset.
+        :type po_new_romset: RomSet
+
+        :return: A tuple with the list of added ROMs and the list of removed ROMs.
+        :rtype: Tuple[List[Rom], List[Rom]]
+        """
+        dio_old = {}
+        for o_rom in po_old_romset:
+            t_rom = _rom_to_tuple(o_rom)
+            dio_old[t_rom] = dio_old.get(t_rom, 0) + 1
+
+        lo_added = []
+        for o_rom in po_new_romset:
+            t_rom = _rom_to_tuple(o_rom)
+            if dio_old.get(t_rom, 0):
+                dio_old[t_rom] -= 1
+            else:
+                lo_added.append(o_rom)
+
+        lo_removed = []
+        for o_rom in po_old_romset:
+            t_rom = _rom_to_tuple(o_rom)
+            if dio_old.get(t_rom, 0):
+                dio_old[t_rom] -= 1
+                lo_removed.append(o_rom)
+
+        return lo_added, lo_removed
+
+
+class DatView(object):
+    """
+    Class to store the result of a set operation between Dats (see Dat.union()). The view just keeps references to the
+    ROMsets of the Dats, which are not copied, so it's cheap even for huge Dats. ROMsets are iterated like in Dat:
+    sorted by description or, with iter_unordered(), in the order of the operation. Use to_dat() to get a Dat from it.
+
+    Notice a view of ROMsets matched by hash can contain different ROMsets with the same name (one from each Dat), and
+    ROMsets modified after the operation are modified in the view too.
+
+    :ivar o_dat: Dat
+    """
+    def __init__(self, po_dat, plo_romsets):
+        """
+        :param po_dat: The Dat the operation was called on, whose metadata is used for the view.
+        :type po_dat: Dat
+
+        :param plo_romsets: The ROMsets of the view.
+        :type plo_romsets: List[RomSet]
+        """
+        self.o_dat = po_dat
+        self._lo_romsets = plo_romsets
+        self._lo_sorted = None
+
+    def __iter__(self):
+        if self._lo_sorted is None:
+            self._lo_sorted = sorted(self._lo_romsets, key=lambda o_romset: o_romset.s_desc.lower())
+        return iter(self._lo_sorted)
+
+    def __len__(self):
+        return len(self._lo_romsets)
+
+    def __str__(self):
+        s_out = '<DatView>\n'
+        s_out += '  .o_dat:      %s\n' % self.o_dat.s_name
+        s_out += '  .i_romsets:  %i\n' % self.i_romsets
+        return s_out
+
+    def iter_unordered(self):
+        """
+        Method to iterate over the ROMsets in the order of the operation, which is faster than the sorted iteration.
+
+        :return:
+        :rtype Iterator[RomSet]
+        """
+        return iter(self._lo_romsets)
+
+    def to_dat(self):
+        """
+        Method to build a Dat with the ROMsets of the view and the metadata of its Dat. ROMsets are shared, not copied.
+        When several ROMsets have the same name, just the first one is kept.
+
+        :return: The Dat.
+        :rtype: Dat
+        """
+        o_dat = Dat()
+        o_dat.copy_metadata_from(self.o_dat)
+        do_romsets = o_dat._do_romsets
+        for o_romset in self._lo_romsets:
+            do_romsets.setdefault(o_romset.s_name, o_romset)
+
+        return o_dat
+
+    def _get_i_romsets(self):
+        return len(self._lo_romsets)
+
+    i_romsets = property(fget=_get_i_romsets, fset=None)
+
+
+class CatVer:
+    """
+    Class to store the Category and Version information stored in catver.ini files for Mame. The category is the genre
+    of each of the ROMsets of MAME, while the version is the version number where a particular ROMset was included into
+    MAME.
+
+    :ivar _do_entries: Dict[Unicode:_CatVerEntry]
+    """
+    def __init__(self, ps_file='', ps_cache_dir=''):
+        self.s_version = ''        # Version of the catver.ini
+        self.s_date = ''           # Date of the catver.ini
+        self.s_mame = ''           # MAME version for the catver.ini (typically the same as the version of catver.ini)
+        self._do_entries = {}      # Dictionary with all CatVer entries. Key is ROMset name.
+        self._dls_categories = {}  # Reverse index, built on demand: category => names of the ROMsets with it (as main
+                                   # or secondary category).
+
+        if ps_file:
+            self.read_from_file(ps_file, ps_cache_dir=ps_cache_dir)
+
+    def __iter__(self):
+        """
+
+        :return:
+        :rtype Iterator[_CatVerEntry]
+        """
+        return iter(self._do_entries.values())
+
+    def __str__(self):
+        s_out = '<CatVer>\n'
+        s_out += '  .s_version: %s\n' % self.s_version
+        s_out += '  .s_date:    %s\n' % self.s_date
+        s_out += '  .s_mame:    %s\n' % self.s_mame
+        s_out += '  .i_entries: %s\n' % self.i_entries
+        return s_out
+
+    def get_entry(self, ps_rom):
+        """
+        Method to get the entry for a given ROMset name.
+
+        :param ps_rom:
+        :type ps_rom: Unicode
+
+        :return:
+        :rtype _CatVerEntry
+        """
+        return self._do_entries[ps_rom]
+
+    def get_romsets_by_category(self, *pxs_category):
+        """
+        Method to get the names of the ROMsets with any of the given categories, as main or secondary category. The
+        search uses a reverse index built the first time it's needed. Category matching is NOT case sensitive.
+
+        :param pxs_category: "list" of categories. e.g. 'shooter', 'maze'
+        :type pxs_category: Union[Tuple[Str], List[Str], Set[Str]]
+
+        :return: The names of the ROMsets, in the same order as in the catver.ini file.
+        :rtype: List[Str]
+        """
+        dls_categories = self._get_category_index()
+
+        ls_romsets = []
+        for s_category in dict.fromkeys(s_elem.strip().lower() for s_elem in pxs_category):
+            ls_romsets.extend(dls_categories.get(s_category, ()))
+
+        # Results for several categories are merged keeping the file order and removing duplicates
+        if len(pxs_category) > 1:
+            ss_romsets = set(ls_romsets)
+            ls_romsets = [s_romset for s_romset in self._do_entries if s_romset in ss_romsets]
+
+        return ls_romsets
+
+    def read_from_file(self, ps_file, ps_cache_dir=''):
+        """
+        Method to populate the object from a catver.ini file. The file is parsed line by line in a single pass, and
+        categories and versions are interned since the same few hundred values are repeated by tens of thousands of
+        ROMsets.
+
+        :param ps_file:
+        :type ps_file: Unicode
+
+        :param ps_cache_dir: Directory where a compiled snapshot of the file is kept, so following reads are faster.
+                             Empty to disable the cache.
+        :type ps_cache_dir: Str
+
+        :return: Nothing, the object will be populated in place.
+        """
+        if ps_cache_dir:
+            tx_snapshot = _cache_read(ps_cache_dir, ps_file, 'catver')
+            if tx_snapshot is not None:
+                self._from_snapshot(tx_snapshot)
+                return
+
+        ls_heading = []
+        with open(ps_file, 'r', encoding='utf-8-sig') as o_file:
+            for s_section, s_romset, s_value in _iter_ini_entries(o_file, ls_heading):
+                # Other sections (e.g. [FOLDER_SETTINGS]) don't contain ROMsets information
+                if s_value is None or s_section not in ('Category', 'VerAdded'):
+                    continue
+
+                s_romset = s_romset.lower()
+                try:
+                    o_entry = self._do_entries[s_romset]
+                except KeyError:
+                    o_entry = _CatVerEntry(ps_romset=s_romset)
+                    self._do_entries[s_romset] = o_entry
+
+                # Reading the categories
+                if s_section == 'Category':
+                    s_cat_main, _, s_cat_second = s_value.lower().partition('/')
+                    o_entry.s_cat_1st = sys.intern(s_cat_main.strip())
+                    o_entry.s_cat_2nd = sys.intern(s_cat_second.strip())
+
+                # Reading the MAME version when the ROMset was introduced
+                elif s_section == 'VerAdded':
+                    o_entry.s_version = sys.intern(s_value)
+
+        self.s_version, self.s_date, self.s_mame = _ini_heading(ls_heading)
+        self._dls_categories = {}
+
+        if ps_cache_dir:
+            _cache_write(ps_cache_dir, ps_file, 'catver', self._to_snapshot())
+
+    def _from_snapshot(self, ptx_snapshot):
+        """
+        Method to populate the object from a snapshot created by _to_snapshot().
+
+        :param ptx_snapshot: The snapshot.
+        :type ptx_snapshot: Tuple
+
+        :return: Nothing, the object will be populated in place.
+        """
+        (self.s_version, self.s_date, self.s_mame), ltx_entries = ptx_snapshot
+        self._do_entries = {}
+        self._dls_categories = {}
+
+        # Pickle shares repeated strings inside a snapshot, but they must be interned again to be shared with the rest
+        # of the process.
+        for s_romset, s_cat_1st, s_cat_2nd, s_version in ltx_entries:
+            self._do_entries[s_romset] = _CatVerEntry(s_romset, sys.intern(s_cat_1st), sys.intern(s_cat_2nd),
+                                                      sys.intern(s_version))
+
+    def _to_snapshot(self):
+        """
+        Method to get a compact snapshot of the data, to be stored in the cache.
+
+        :return: A tuple with the heading data and a list of tuples (romset, main category, secondary category,
+                 version).
+        :rtype: Tuple
+        """
+        ltx_entries = [(o_entry.s_romset, o_entry.s_cat_1st, o_entry.s_cat_2nd, o_entry.s_version)
+                       for o_entry in self._do_entries.values()]
+        return (self.s_version, self.s_date, self.s_mame), ltx_entries
+
+    def _get_category_index(self):
+        """
+        Method to get the reverse index of categories, building it when it doesn't exist.
+
+        :return: A dictionary category => names of the ROMsets with it, in the same order as in the file.
+        :rtype: Dict[Str:List[Str]]
+        """
+        if not self._dls_categories and self._do_entries:
+            dls_categories = {}
+            for s_romset, o_entry in self._do_entries.items():
+                for s_category in dict.fromkeys((o_entry.s_cat_1st, o_entry.s_cat_2nd)):
+                    if s_category:
+                        try:
+                            dls_categories[s_category].append(s_romset)
+                        except KeyError:
+                            dls_categories[s_category] = [s_romset]
+            self._dls_categories = dls_categories
+
+        return self._dls_categories
+
+    def _get_i_entries(self):
+        return len(self._do_entries)
+
+    i_entries = property(fget=_get_i_entries, fset=None)
+
+
+class _CatVerEntry:
+    """
+    Class to store information about each of the catver.ini file entries.
+    """
     def __init__(self, ps_romset='', ps_cat_1st='', ps_cat_2nd='', ps_version=''):
         self.s_romset = ps_romset    # ROMset name.
         self.s_version = ps_version  # MAME version when the ROMset was first introduced.
@@ -1329,32 +3010,551 @@ class _CatVerEntry:
         s_out += '  .s_cat_2nd: %s' % self.s_cat_2nd
         return s_out
 
-    def has_category(self, *pxs_category):
-        """
-        Method to check whether a CatVerEntry has certain category. Category matching is NOT case sensitive.
+    def has_category(self, *pxs_category):
+        """
+        Method to check whether a CatVerEntry has certain category. Category matching is NOT case sensitive.
+
+        :param pxs_category: "list" of categories to be checked.
+        :type pxs_category: Union[Tuple[Str], List[Str], Set[Str]]
+
+        :return: True if the entry has any of the categories, False otherwise.
+        :rtype Bool
+        """
+        # First we remove unwanted spaces, lowercase and convert to a set the input categories
+        ss_inputs = set()
+        for s_elem in pxs_category:
+            ss_inputs.add(s_elem.strip().lower())
+
+        b_match = False
+        for s_cat in ss_inputs:
+            if s_cat in (self.s_cat_1st, self.s_cat_2nd):
+                b_match = True
+                break
+
+        return b_match
+
+
+class MameIni:
+    """
+    Class to store the information of MAME support files with ini layout other than catver.ini, like nplayers.ini or
+    genre.ini. Two layouts are supported: sections with "romset=value" lines (e.g. nplayers.ini, where all the ROMsets
+    are in a single [NPlayers] section), and sections whose name is the value with just ROMset names as lines (e.g.
+    genre.ini, with one section per genre). Values are interned and a reverse index value => ROMsets is kept, so
+    queries like "all the 2 players games" are just dictionary lookups.
+
+    :ivar _ds_values: Dict[Str:Str]
+    """
+    def __init__(self, ps_file='', ps_cache_dir=''):
+        self.s_version = ''    # Version of the file
+        self.s_date = ''       # Date of the file
+        self.s_mame = ''       # MAME version for the file
+        self._ds_values = {}   # Dictionary ROMset name => value
+        self._dls_index = {}   # Reverse index, built on demand: lowercase value => names of the ROMsets with it.
+
+        if ps_file:
+            self.read_from_file(ps_file, ps_cache_dir=ps_cache_dir)
+
+    def __iter__(self):
+        """
+
+        :return:
+        :rtype Iterator[Tuple[Str, Str]]
+        """
+        return iter(self._ds_values.items())
+
+    def __str__(self):
+        s_out = '<MameIni>\n'
+        s_out += '  .s_version: %s\n' % self.s_version
+        s_out += '  .s_date:    %s\n' % self.s_date
+        s_out += '  .s_mame:    %s\n' % self.s_mame
+        s_out += '  .i_entries: %s\n' % self.i_entries
+        return s_out
+
+    def get_value(self, ps_romset):
+        """
+        Method to get the value for a given ROMset name.
+
+        :param ps_romset: Name of the ROMset. e.g. '005'
+        :type ps_romset: Str
+
+        :return: The value. e.g. '2P alt'
+        :rtype: Str
+        """
+        return self._ds_values[ps_romset]
+
+    def get_romsets(self, *pxs_values):
+        """
+        Method to get the names of the ROMsets with any of the given values. Value matching is NOT case sensitive.
+
+        :param pxs_values: "list" of values. e.g. '2P sim', '2P alt'
+        :type pxs_values: Union[Tuple[Str], List[Str], Set[Str]]
+
+        :return: The names of the ROMsets, in the same order as in the file.
+        :rtype: List[Str]
+        """
+        dls_index = self._get_index()
+
+        ls_romsets = []
+        for s_value in dict.fromkeys(s_elem.strip().lower() for s_elem in pxs_values):
+            ls_romsets.extend(dls_index.get(s_value, ()))
+
+        if len(pxs_values) > 1:
+            ss_romsets = set(ls_romsets)
+            ls_romsets = [s_romset for s_romset in self._ds_values if s_romset in ss_romsets]
+
+        return ls_romsets
+
+    def read_from_file(self, ps_file, ps_cache_dir=''):
+        """
+        Method to populate the object from a file. The file is parsed line by line in a single pass.
+
+        :param ps_file: Path of the file. e.g. '/home/john/mame/nplayers.ini'
+        :type ps_file: Str
+
+        :param ps_cache_dir: Directory where a compiled snapshot of the file is kept, so following reads are faster.
+                             Empty to disable the cache.
+        :type ps_cache_dir: Str
+
+        :return: Nothing, the object will be populated in place.
+        """
+        self._dls_index = {}
+
+        if ps_cache_dir:
+            tx_snapshot = _cache_read(ps_cache_dir, ps_file, 'ini')
+            if tx_snapshot is not None:
+                (self.s_version, self.s_date, self.s_mame), ltx_values = tx_snapshot
+                self._ds_values = {s_romset: sys.intern(s_value) for s_romset, s_value in ltx_values}
+                return
+
+        ls_heading = []
+        ds_values = {}
+        with open(ps_file, 'r', encoding='utf-8-sig') as o_file:
+            for s_section, s_key, s_value in _iter_ini_entries(o_file, ls_heading):
+                if s_section.lower() in _ts_INI_IGNORE_SECTIONS:
+                    continue
+
+                # Lines with just the ROMset name take the value from the section
+                if s_value is None:
+                    s_value = s_section
+                ds_values[s_key] = sys.intern(s_value)
+
+        self._ds_values = ds_values
+        self.s_version, self.s_date, self.s_mame = _ini_heading(ls_heading)
+
+        if ps_cache_dir:
+            _cache_write(ps_cache_dir, ps_file, 'ini', ((self.s_version, self.s_date, self.s_mame),
+                                                        list(ds_values.items())))
+
+    def _get_index(self):
+        """
+        Method to get the reverse index of values, building it when it doesn't exist.
+
+        :return: A dictionary lowercase value => names of the ROMsets with it, in the same order as in the file.
+        :rtype: Dict[Str:List[Str]]
+        """
+        if not self._dls_index and self._ds_values:
+            dls_index = {}
+            for s_romset, s_value in self._ds_values.items():
+                s_value = s_value.lower()
+                try:
+                    dls_index[s_value].append(s_romset)
+                except KeyError:
+                    dls_index[s_value] = [s_romset]
+            self._dls_index = dls_index
+
+        return self._dls_index
+
+    def _get_i_entries(self):
+        return len(self._ds_values)
+
+    i_entries = property(fget=_get_i_entries, fset=None)
+
+
+class _PrefixedReader(io.RawIOBase):
+    """
+    Class to read a stream whose first bytes were already read (e.g. to identify its format), so it doesn't need to be
+    opened again, which for compressed files would mean decompressing them twice. The bytes already read are returned
+    first, followed by the rest of the stream.
+    """
+    def __init__(self, px_prefix, po_file):
+        """
+        :param px_prefix: Bytes already read from the stream.
+        :type px_prefix: Bytes
+
+        :param po_file: Binary file object, positioned just after the prefix.
+        :type po_file: io.BufferedIOBase
+        """
+        super().__init__()
+        self._x_prefix = memoryview(px_prefix)
+        self._o_file = po_file
+
+    def readable(self):
+        return True
+
+    def readall(self):
+        x_prefix = bytes(self._x_prefix)
+        self._x_prefix = memoryview(b'')
+        return x_prefix + self._o_file.read()
+
+    def readinto(self, po_buffer):
+        if self._x_prefix:
+            i_size = min(len(po_buffer), len(self._x_prefix))
+            po_buffer[:i_size] = self._x_prefix[:i_size]
+            self._x_prefix = self._x_prefix[i_size:]
+            return i_size
+
+        return self._o_file.readinto(po_buffer)
+
+
+class _LazyRomSets(object):
+    """
+    Class used by Dat in lazy mode instead of the plain dictionary of ROMsets. It behaves like that dictionary, but the
+    ROMsets are parsed from the memory-mapped .dat file the first time they are accessed. Operations requiring all the
+    values (iteration, items, values...) parse all the pending ROMsets first, after that the file is released. The file
+    can also be released with close(), then the pending ROMsets can't be parsed anymore.
+
+    :ivar _do_loaded: Dict[Str:RomSet]
+    :ivar _dti_ranges: Dict[Str:Tuple[Int, Int]]
+    """
+    def __init__(self, ps_file, ps_format, pts_tags=_ts_MAME_TAGS):
+        """
+        :param ps_file: Path of the .dat file.
+        :type ps_file: Str
+
+        :param ps_format: Format of the file: 'cmp', 'generic' or 'mame'.
+        :type ps_format: Str
+
+        :param pts_tags: Children of the <machine> elements of MAME xml dats to be read.
+        :type pts_tags: Tuple[Str]
+        """
+        self.s_format = ps_format  # Format of the .dat file.
+        self.x_data = b''          # Memory-mapped content of the .dat file (None once it's closed).
+        self._x_prolog = b''       # xml declaration added to each xml fragment, so the right encoding is used.
+        self._do_loaded = {}       # ROMsets already parsed (or added), keyed by name.
+        self._dti_ranges = {}      # ROMsets present in the file: name => (start, end) byte range.
+        self._do_roms = {}         # Table to share identical ROMs between the parsed ROMsets (see Rom).
+        self._o_skip_regex = _xml_skip_regex(pts_tags)  # Children of the ROMset elements to be removed before parsing.
+
+        with open(ps_file, 'rb') as o_file:
+            try:
+                self.x_data = mmap.mmap(o_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be memory-mapped
+                pass
+
+        if ps_format != 'cmp':
+            self._x_prolog = b'<?xml version="1.0" encoding="%s"?>' % _xml_encoding(self.x_data).encode('ascii')
+
+    def __contains__(self, ps_name):
+        return ps_name in self._do_loaded or ps_name in self._dti_ranges
+
+    def __delitem__(self, ps_name):
+        if ps_name not in self:
+            raise KeyError(ps_name)
+
+        self._do_loaded.pop(ps_name, None)
+        self._dti_ranges.pop(ps_name, None)
+
+    def __getitem__(self, ps_name):
+        try:
+            return self._do_loaded[ps_name]
+        except KeyError:
+            pass
+
+        i_start, i_end = self._dti_ranges[ps_name]
+        o_romset = self._parse(self._get_fragment(i_start, i_end))
+        self._do_loaded[ps_name] = o_romset
+        return o_romset
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        i_len = len(self._do_loaded)
+        for s_name in self._dti_ranges:
+            if s_name not in self._do_loaded:
+                i_len += 1
+        return i_len
+
+    def __setitem__(self, ps_name, po_romset):
+        self._do_loaded[ps_name] = po_romset
+
+    def close(self):
+        """
+        Method to release the memory-mapped .dat file.
+
+        :return: Nothing
+        """
+        if isinstance(self.x_data, mmap.mmap):
+            self.x_data.close()
+        self.x_data = None
+
+    def items(self):
+        return self._load_all().items()
+
+    def keys(self):
+        return self._load_all().keys()
+
+    def set_ranges(self, pdti_ranges):
+        """
+        Method to set the byte ranges of the ROMsets in the file.
+
+        :param pdti_ranges: Dictionary ROMset name => (start, end) byte range, in the same order than in the file.
+        :type pdti_ranges: Dict[Str:Tuple[Int, Int]]
+
+        :return: Nothing
+        """
+        self._dti_ranges = dict(pdti_ranges)
+
+    def values(self):
+        return self._load_all().values()
+
+    def _load_all(self):
+        """
+        Method to parse all the pending ROMsets. The ROMsets coming from the file are sorted as in the file, followed by
+        the ones added later.
+
+        :return: A dictionary with all the ROMsets, keyed by name.
+        :rtype: Dict[Str:RomSet]
+        """
+        if self._dti_ranges:
+            do_romsets = {}
+            for s_name, (i_start, i_end) in self._dti_ranges.items():
+                try:
+                    do_romsets[s_name] = self._do_loaded[s_name]
+                except KeyError:
+                    do_romsets[s_name] = self._parse(self._get_fragment(i_start, i_end))
+            for s_name, o_romset in self._do_loaded.items():
+                do_romsets.setdefault(s_name, o_romset)
+
+            self._do_loaded = do_romsets
+            self._dti_ranges = {}
+            self._do_roms = {}
+
+        self.close()
+
+        return self._do_loaded
+
+    def _get_fragment(self, pi_start, pi_end):
+        """
+        Method to get the bytes of a ROMset from the memory-mapped file.
+
+        :param pi_start: Start of the ROMset in the file.
+        :type pi_start: Int
+
+        :param pi_end: End of the ROMset in the file.
+        :type pi_end: Int
+
+        :return: The bytes of the ROMset.
+        :rtype: Bytes
+        """
+        if self.x_data is None:
+            raise ValueError('ERROR: The dat file is closed, the ROMsets not parsed yet can\'t be read')
+
+        return self.x_data[pi_start:pi_end]
+
+    def _parse(self, px_fragment):
+        """
+        Method to build a RomSet from the bytes of a ROMset in the file.
+
+        :param px_fragment: The bytes of the ROMset. e.g. b'game ( name "foo" ... )'
+        :type px_fragment: Bytes
+
+        :return: The RomSet.
+        :rtype: RomSet
+        """
+        if self.s_format == 'cmp':
+            o_dat = Dat()
+            o_dat._parse_cmp(px_fragment, self._do_roms)
+            o_romset = next(o_dat.iter_unordered())
+        elif self.s_format == 'mame':
+            x_fragment = self._o_skip_regex.sub(b'', px_fragment)
+            o_romset = _xml_mame_romset(xml.etree.cElementTree.fromstring(self._x_prolog + x_fragment), self._do_roms)
+        else:
+            o_romset = _xml_generic_romset(xml.etree.cElementTree.fromstring(self._x_prolog + px_fragment),
+                                           self._do_roms)
+
+        return o_romset
+
+
+# Functions
+#=======================================================================================================================
+def get_file_fingerprint(ps_file):
+    """
+    Function to get the fingerprint of a .dat file used to check whether data compiled from it (cached snapshots,
+    catalogs...) is still valid.
+
+    :param ps_file: Path of the source file.
+    :type ps_file: Str
+
+    :return: A tuple with the absolute path, size, modification time and parser version.
+    :rtype: Tuple[Str, Int, Int, Int]
+    """
+    o_stat = os.stat(ps_file)
+    return os.path.abspath(ps_file), o_stat.st_size, o_stat.st_mtime_ns, _i_PARSER_VERSION
+
+
+def read_dats(pls_files, pi_workers=0, ps_cache_dir=''):
+    """
+    Function to read many .dat files at once, parsing them in parallel in a pool of processes. Each worker reads a file
+    with Dat.read_from_dat(), so the format is detected automatically and the cache dir is used, and sends back a
+    compact snapshot of the data (the same one stored in the cache dir). Transferring and loading the snapshot is much
+    cheaper than parsing the file or transferring the RomSet and Rom objects themselves.
+
+    Bigger files are sent to the workers first, so a big file read at the end doesn't keep the rest of workers idle.
+
+    :param pls_files: Paths of the .dat files.
+    :type pls_files: List[Str]
+
+    :param pi_workers: Number of worker processes. 0 to use one per CPU. With just one worker (or one file), the files
+                       are read in the current process.
+    :type pi_workers: Int
+
+    :param ps_cache_dir: Directory for the compiled snapshots. Empty to disable the cache.
+    :type ps_cache_dir: Str
+
+    :return: A tuple (file, Dat, seconds) for each file, in the same order as pls_files. Seconds is the time spent
+             reading the file.
+    :rtype: List[Tuple[Str, Dat, Float]]
+    """
+    # Missing files are reported before reading any file, and in the same way as Dat.read_from_dat() does, no matter
+    # the number of workers (the sizes of the files are needed to sort them).
+    for s_file in pls_files:
+        if not os.path.isfile(s_file):
+            raise ValueError('Can\'t find dat file "%s"' % s_file)
+
+    i_workers = min(pi_workers or os.cpu_count() or 1, len(pls_files))
+
+    ltx_results = []
+    if i_workers <= 1:
+        for s_file in pls_files:
+            f_start = time.perf_counter()
+            o_dat = Dat(s_file, ps_cache_dir=ps_cache_dir)
+            ltx_results.append((s_file, o_dat, time.perf_counter() - f_start))
+
+    else:
+        ls_sorted_files = sorted(set(pls_files), key=lambda s_file: os.path.getsize(s_file), reverse=True)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=i_workers) as o_pool:
+            do_futures = {s_file: o_pool.submit(_read_dat_snapshot, s_file, ps_cache_dir)
+                          for s_file in ls_sorted_files}
+
+            for s_file in pls_files:
+                tx_snapshot, i_skipped, f_seconds = do_futures[s_file].result()
+                o_dat = Dat()
+                o_dat._from_snapshot(tx_snapshot)
+                o_dat.i_skipped = i_skipped
+                o_dat._db_flags['from_dat'] = True
+                ltx_results.append((s_file, o_dat, f_seconds))
+
+    return ltx_results
+
+
+def identify_file_by_hash(ps_file, plo_candidates, pc_hasher=None):
+    """
+    Function to find, among some candidate ROMsets, the one whose clean hashes match the content of a file. The file is
+    hashed in a single pass, and only with the hashes needed: CRC32 is always computed; SHA1 (or MD5 when the dat
+    doesn't include SHA1) is only computed too when several candidates share the same CRC32. Nothing is read when there
+    are no candidates.
+
+    :param ps_file: Path of the file.
+    :type ps_file: Str
+
+    :param plo_candidates: Candidate ROMsets, typically the ones with the same clean size as the file.
+    :type plo_candidates: Sequence[RomSet]
+
+    :param pc_hasher: Function used to hash the file, getting its path and the hash types and returning a dictionary
+                      hash type => lowercase hex digest. e.g. hashing.FileHasher.hash_file, which caches the hashes.
+                      None to hash the file without cache (see hashing.hash_file()).
+    :type pc_hasher: Union[Callable[[Str, List[Str]], Dict[Str:Str]], None]
+
+    :return: The first matching ROMset or None if no ROMset matches the file.
+    :rtype: Union[RomSet, None]
+    """
+    if not plo_candidates:
+        return None
+
+    ls_types = ['crc32']
+    ls_crc32s = [o_romset.s_ccrc32 for o_romset in plo_candidates]
+    if len(set(ls_crc32s)) < len(ls_crc32s):
+        if all(o_romset.s_csha1 for o_romset in plo_candidates):
+            ls_types.append('sha1')
+        else:
+            ls_types.append('md5')
+
+    ds_hashes = (pc_hasher or hashing.hash_file)(ps_file, ls_types)
+
+    for o_romset in plo_candidates:
+        for s_type, s_hash in ds_hashes.items():
+            # Hashes not included in the dat can't be compared, only CRC32 is mandatory
+            s_romset_hash = o_romset._get_s_hash(ps_type=s_type, pb_clean=True)
+            if s_romset_hash != s_hash and (s_type == 'crc32' or s_romset_hash):
+                break
+        else:
+            return o_romset
+
+    return None
+
+
+def identify_zip_members(pltx_members, plo_candidates):
+    """
+    Function to find, among some candidate ROMsets, the one whose clean ROMs are the files inside a zip archive. Files
+    are compared by size and CRC32, not by name, so renamed files inside the archive are identified too.
+
+    :param pltx_members: Files inside the zip archive, as returned by read_zip_members().
+    :type pltx_members: List[Tuple[Str, Int, Str]]
+
+    :param plo_candidates: Candidate ROMsets, typically the ones with the same clean size as the files.
+    :type plo_candidates: Sequence[RomSet]
+
+    :return: The first matching ROMset or None if no ROMset matches the files.
+    :rtype: Union[RomSet, None]
+    """
+    if not pltx_members:
+        return None
+
+    lti_members = sorted((i_size, int(s_crc32, 16)) for _, i_size, s_crc32 in pltx_members)
+
+    for o_romset in plo_candidates:
+        lti_roms = []
+        for o_rom in o_romset._get_lo_relevant_roms(pb_clean=True):
+            # ROMs with unknown CRC32 can't be compared
+            if not o_rom.s_crc32:
+                break
+            lti_roms.append((o_rom.i_size, int(o_rom.s_crc32, 16)))
+        else:
+            if sorted(lti_roms) == lti_members:
+                return o_romset
+
+    return None
 
-        :param pxs_category: "list" of categories to be checked.
-        :type pxs_category: Union[Tuple[Str], List[Str], Set[Str]]
 
-        :return: True if the entry has any of the categories, False otherwise.
-        :rtype Bool
-        """
-        # First we remove unwanted spaces, lowercase and convert to a set the input categories
-        ss_inputs = set()
-        for s_elem in pxs_category:
-            ss_inputs.add(s_elem.strip().lower())
+def read_zip_members(ps_file):
+    """
+    Function to get the name, size and CRC32 of the files inside a zip archive. They are read from the central directory
+    of the archive, so nothing is decompressed and just the end of the archive is read (a few KB). Directories and files
+    with extensions ignored in clean hashes (like .cue) are skipped, so the files can be compared with the clean ROMs of
+    ROMsets.
 
-        b_match = False
-        for s_cat in ss_inputs:
-            if s_cat in (self.s_cat_1st, self.s_cat_2nd):
-                b_match = True
-                break
+    :param ps_file: Path of the file.
+    :type ps_file: Str
 
-        return b_match
+    :return: A list of tuples (name, size, lowercase CRC32) or None when the file is not a zip archive (it doesn't have
+             .zip extension or it's not a valid zip archive).
+    :rtype: Union[List[Tuple[Str, Int, Str]], None]
+    """
+    if not ps_file.lower().endswith('.zip'):
+        return None
+
+    try:
+        with zipfile.ZipFile(ps_file) as o_zip:
+            lo_infos = o_zip.infolist()
+    except zipfile.BadZipFile:
+        return None
+
+    return [(o_info.filename, o_info.file_size, '%08x' % o_info.CRC) for o_info in lo_infos
+            if not o_info.is_dir() and o_info.filename.rpartition('.')[2].lower() not in _ts_IGNORE_EXTS]
 
 
-# Functions
-#=======================================================================================================================
 # TODO: This function doesn't belong in here. It should be in another library called rom_tools or something like that.
 def get_rom_header(ps_rom_file):
     """
@@ -1395,143 +3595,886 @@ def get_rom_header(ps_rom_file):
 
 # Helper Functions
 #=======================================================================================================================
-def _dat_vertical_parse(ls_lines, s_section, s_mode='single'):
-    """Function to parse a group of lines which contains different information about the same item.
+def _iter_ini_entries(po_file, pls_heading=None):
+    """
+    Function to parse, line by line, MAME support files with ini layout (catver.ini, nplayers.ini, genre.ini...). It's
+    much faster than configparser and it accepts the non-standard heading of those files.
+
+    :param po_file: Text file object.
+    :type po_file: TextIO
+
+    :param pls_heading: Optional list where the heading lines (comments starting with ";;" before the first section) are
+                        appended. e.g. ';; CatVer 0.245 / 28-Jun-22 / MAME 0.245 ;;'
+    :type pls_heading: List[Str]
 
-    So, the information follows a pattern similar to:
+    :return: An iterator of tuples (section, key, value). Value is None for lines without "=".
+    :rtype: Iterator[Tuple[Str, Str, Union[Str, None]]]
+    """
+    s_section = ''
+    for s_line in po_file:
+        s_line = s_line.strip()
+        if not s_line:
+            continue
 
-        field_1 data_a
-        field_1 data_b
-        field_2 data_c
-        ...
+        if s_line[0] in ';#':
+            if not s_section and pls_heading is not None and s_line.startswith(';;'):
+                pls_heading.append(s_line)
 
-        ls_lines: a list containing the individual lines as strings.
+        elif s_line[0] == '[':
+            s_section = s_line[1:].partition(']')[0].strip()
 
-        s_section: name of the section (in the above example s_section = field_1, for example).
+        elif s_section:
+            s_key, s_separator, s_value = s_line.partition('=')
+            if s_separator:
+                yield s_section, s_key.strip(), s_value.strip()
+            else:
+                yield s_section, s_key, None
 
-        s_mode: 'single', each field exists once and the function returns its data as a string.
-                'multi', each field exists several times and the function returns its data as a list of strings.
 
-        @rtype : string or list of strings
+def _ini_heading(pls_heading):
     """
+    Function to get the version, date and MAME version from the heading of MAME support files. e.g.
 
-    ls_data = []
-    s_data = ''
+        ;; CatVer 0.245 / 28-Jun-22 / MAME 0.245 ;;
 
-    # Adding a space to the section because it has to exist a space between the section and the data.
-    s_section += ' '
+    :param pls_heading: Heading lines.
+    :type pls_heading: List[Str]
 
-    for s_line in ls_lines:
-        s_line = s_line.strip()
+    :return: A tuple (version, date, MAME version). e.g. ('CatVer 0.245', '28-Jun-22', 'MAME 0.245')
+    :rtype: Tuple[Str, Str, Str]
+    """
+    ts_heading = ('', '', '')
+    for s_line in pls_heading:
+        ls_chunks = [s_chunk.strip() for s_chunk in s_line.strip(';').split('/')]
+        if len(ls_chunks) >= 3:
+            ts_heading = tuple(ls_chunks[:3])
 
-        if s_line.find(s_section) == 0:
-            i_start_pos = len(s_section)
-            s_data = s_line[i_start_pos:]
-            s_data = s_data.strip()
-            s_data = s_data.strip('"')
-            ls_data.append(s_data)
-
-    if s_mode == 'single':
-        x_output = s_data
-    elif s_mode == 'multi':
-        x_output = ls_data
-    else:
-        raise Exception('Error: %s mode for _dat_vertical_parse() NOT known.' % s_mode)
+    return ts_heading
+
+
+def _open_compressed(ps_file, px_head):
+    """
+    Function to open the decompressed stream of a compressed .dat file. The compression is identified by the magic
+    number at the beginning of the file, not by its extension. Zip archives must contain a .dat or .xml file, the first
+    one is used (or the first file in the archive when none of them has those extensions).
 
-    return x_output
+    :param ps_file: Path of the file.
+    :type ps_file: Str
 
+    :param px_head: First bytes of the file.
+    :type px_head: Bytes
 
-def _dat_horizontal_parse(s_line, s_start, s_end):
+    :return: A binary file object with the decompressed data, or None when the file is not compressed.
+    :rtype: Union[io.BufferedIOBase, None]
     """
-    Function to parse a SINGLE line containing information about a particular item.
+    o_stream = None
+
+    if px_head.startswith(_dx_COMPRESSION_MAGIC['gzip']):
+        o_stream = gzip.open(ps_file, 'rb')
 
-    So, the information follows a pattern similar to:
+    elif px_head.startswith(_dx_COMPRESSION_MAGIC['xz']):
+        o_stream = lzma.open(ps_file, 'rb')
 
-        a_start DATA_A a_end b_start DATA_B b_end...
+    elif px_head.startswith(_dx_COMPRESSION_MAGIC['zip']):
+        # The member keeps the archive file open until the member itself is closed
+        with zipfile.ZipFile(ps_file) as o_zip:
+            lo_members = [o_info for o_info in o_zip.infolist() if not o_info.is_dir()]
+            lo_dats = [o_info for o_info in lo_members
+                       if o_info.filename.rpartition('.')[2].lower() in _ts_ZIP_DAT_EXTS]
+            if not lo_members:
+                raise IOError('Unknown DAT format')
+            o_stream = o_zip.open((lo_dats or lo_members)[0])
 
-    :param s_line: string containing the line to be parsed.
+    return o_stream
 
-    :param s_start: leading string for data. In the above example: "a_start", "b_start"...
 
-    :param s_end: ending string for data. In the above example: "a_end", "b_end"...
+def _cmp_fields(ps_block):
+    """
+    Function to read the fields of a ClrMamePro block without nested blocks. When a field appears several times, the
+    last value is kept.
+
+    :param ps_block: Content of the block. e.g. b'name "Phantom Gear.md" size 2097152 crc 0a0b0c0d'
+    :type ps_block: Bytes
 
-    Comment: Typically, all the items inside the line are unique, so there is no need to 'multi' parameter like in
-    _dat_vertical_parse() function.
+    :return: A dictionary with the fields. e.g. {'name': 'Phantom Gear.md', 'size': '2097152', 'crc': '0a0b0c0d'}
+    :rtype: Dict[Str:Str]
+    """
+    return {s_key: s_quoted or s_bare
+            for s_key, s_quoted, s_bare in _o_CMP_PAIR_REGEX.findall(ps_block.decode('utf8', 'ignore'))}
 
-        @rtype: string
 
+def _cmp_rom(ps_block):
     """
+    Function to build a Rom from the content of a ClrMamePro "rom" block.
 
-    s_output = ''
+    :param ps_block: Content of the block. e.g. b'name "Phantom Gear.md" size 2097152 crc 0a0b0c0d'
+    :type ps_block: Bytes
 
-    if s_line.find(s_start) != -1:
-        i_start_pos = s_line.find(s_start) + len(s_start)
-        i_end_pos = s_line.find(s_end, i_start_pos)
+    :return: The Rom.
+    :rtype: Rom
+    """
+    o_rom = Rom()
+    ds_fields = _cmp_fields(ps_block)
 
-        if i_end_pos != -1:
-            s_output = s_line[i_start_pos:i_end_pos]
+    o_rom.s_name = ds_fields.get('name', '')
+    o_rom.i_size = int(ds_fields.get('size', 0))
+    o_rom.s_crc32 = ds_fields.get('crc', '').lower()
+    o_rom.s_md5 = ds_fields.get('md5', '').lower()
+    o_rom.s_sha1 = ds_fields.get('sha1', '').lower()
+    o_rom.s_merge = ds_fields.get('merge', '')
 
-    # It shouldn't appear extra spaces around the real data but just in case...
-    s_output = s_output.strip()
-    s_output = s_output.strip('"')
-    s_output = s_output.strip()
+    # So far, MAME is the only dat providing flags. Some dats use "status" instead of "flags" for the same purpose.
+    ls_flags = ds_fields.get('flags', ds_fields.get('status', '')).split()
+    o_rom.b_baddump = 'baddump' in ls_flags
+    o_rom.b_nodump = 'nodump' in ls_flags
+    o_rom.b_bios = 'bios' in ls_flags
 
-    return s_output
+    return o_rom
 
 
-def _hex_add(ps_hex_a, ps_hex_b):
+def _xml_generic_romset(po_xelem, pdo_roms=None):
     """
-    Function to add two hex digits
-    :param ps_hex_a:
-    :param ps_hex_b:
-    :return:
+    Function to build a RomSet from a <game> element of a generic (e.g. No-Intro) .xml dat.
+
+    :param po_xelem: The <game> element.
+    :type po_xelem: xml.etree.ElementTree.Element
+
+    :param pdo_roms: Table of the ROMs already read, so identical ROMs are shared (see _get_shared_rom()). None to use
+                     a new table.
+    :type pdo_roms: Union[Dict[Tuple:Rom], None]
+
+    :return: The RomSet with all its ROMs.
+    :rtype: RomSet
     """
+    s_game_name = po_xelem.attrib['name']
+    s_game_description = po_xelem.findtext('description', '')
+    b_device = po_xelem.get('isdevice', '').lower() in ss_TRUE_VALUES
 
-    s_hex_a = str(ps_hex_a)
-    s_hex_b = str(ps_hex_b)
+    o_dat_game = RomSet(s_game_name, s_game_description, pb_device=b_device)
+    o_dat_game.s_year = sys.intern(po_xelem.findtext('year', ''))
+    o_dat_game.s_auth = sys.intern(po_xelem.findtext('manufacturer', ''))
+    _xml_read_links(o_dat_game, po_xelem)
 
-    # Padding the strings, so they are LONGEST + 1 (the +1 is to keep the carryover)
-    i_length = max(len(s_hex_a), len(s_hex_b)) + 1
+    do_roms = {} if pdo_roms is None else pdo_roms
+    si_used = set()
+    for o_xelem_rom in po_xelem.iterfind('rom'):
+        # Adding the rom object to the list
+        o_dat_game.add_rom(_get_shared_rom(do_roms, _xml_generic_rom(o_xelem_rom), si_used))
 
-    s_hex_a = s_hex_a.rjust(i_length, '0')
-    s_hex_b = s_hex_b.rjust(i_length, '0')
+    return o_dat_game
 
-    # We start the addition process
-    #------------------------------
-    s_hex_result = ''
 
-    i_carry_over = 0
+def _xml_generic_rom(po_xelem):
+    """
+    Function to read the data of a ROM from a <rom> element of a generic (e.g. No-Intro) .xml dat.
 
-    for s_digit_a, s_digit_b in zip(s_hex_a[::-1], s_hex_b[::-1]):
-        i_digit_c = int(s_digit_a, 16) + int(s_digit_b, 16) + i_carry_over
-        s_digits_c = hex(i_digit_c).partition('x')[2]
+    :param po_xelem: The <rom> element.
+    :type po_xelem: xml.etree.ElementTree.Element
 
-        if len(s_digits_c) == 2:
-            i_carry_over = int(s_digits_c[0])
-            s_hex_result += s_digits_c[1]
-        else:
-            i_carry_over = 0
-            s_hex_result += s_digits_c[0]
+    :return: A tuple with the data of the ROM (same layout as in snapshots, see _rom_to_tuple()).
+    :rtype: Tuple
+    """
+    dx_attrib = po_xelem.attrib
+    i_flags = 0
+
+    # TODO: Not sure about this code. Maybe I should only trust specifically indicated nodumps
+    try:
+        i_size = int(dx_attrib['size'])
+    except KeyError:
+        i_size = 0
+        i_flags |= _i_FLAG_NODUMP
+
+    # TODO: Not sure about this code. Maybe I should only trust specifically indicated nodumps
+    try:
+        s_crc32 = dx_attrib['crc'].lower()
+    except KeyError:
+        s_crc32 = ''
+        i_flags |= _i_FLAG_NODUMP
+
+    try:
+        s_md5 = dx_attrib['md5'].lower()
+    except KeyError:
+        s_md5 = None
+
+    try:
+        s_sha1 = dx_attrib['sha1'].lower()
+    except KeyError:
+        s_sha1 = None
+
+    # MAME generated XML (later converted generic format (AFAIK) includes a status field which can contain
+    # "baddump" and "nodump" status information
+    s_status = dx_attrib.get('status', '').lower()
+    if s_status == 'baddump':
+        i_flags |= _i_FLAG_BADDUMP
+    if s_status == 'nodump':
+        i_flags |= _i_FLAG_NODUMP
+
+    # Generic dats written from MAME ones keep the bios flag of the ROMs (see Dat._write_xml())
+    if 'bios' in dx_attrib:
+        i_flags |= _i_FLAG_BIOS
+
+    return dx_attrib.get('name', ''), i_size, s_crc32, s_md5, s_sha1, dx_attrib.get('merge', ''), i_flags
+
+
+def _xml_mame_romset(po_xelem, pdo_roms=None):
+    """
+    Function to build a RomSet from a <machine> element of a MAME .xml dat.
+
+    :param po_xelem: The <machine> element.
+    :type po_xelem: xml.etree.ElementTree.Element
+
+    :param pdo_roms: Table of the ROMs already read, so identical ROMs (e.g. the bios ones repeated in every machine of
+                     a system) are shared (see _get_shared_rom()). None to use a new table.
+    :type pdo_roms: Union[Dict[Tuple:Rom], None]
+
+    :return: The RomSet with all its ROMs.
+    :rtype: RomSet
+    """
+    s_name = po_xelem.get('name')
+    # The description can be left out of the children read (see Dat.read_from_dat())
+    s_desc = po_xelem.findtext('description', '')
+
+    b_device = False
+    try:
+        s_device = po_xelem.get('isdevice')
+        if s_device.lower() in ss_TRUE_VALUES:
+            b_device = True
+    except AttributeError:
+        pass
+
+    o_romset = RomSet(ps_name=s_name, ps_description=s_desc, pb_device=b_device)
+    o_romset.s_year = sys.intern(po_xelem.findtext('year', ''))
+    o_romset.s_auth = sys.intern(po_xelem.findtext('manufacturer', ''))
+    _xml_read_links(o_romset, po_xelem)
 
-    s_hex_result = s_hex_result[::-1].lstrip('0')
+    do_roms = {} if pdo_roms is None else pdo_roms
+    si_used = set()
+    for o_xrom in po_xelem.iterfind('rom'):
+        o_romset.add_rom(_get_shared_rom(do_roms, _xml_mame_rom(o_xrom), si_used))
 
-    return s_hex_result
+    return o_romset
 
 
-def _compound_hash(pls_hexs):
+def _xml_mame_rom(po_xrom):
     """
-    Function to return the compound hex of a list of hexs
-    :param pls_hexs:
-    :return:
+    Function to read the data of a ROM from a <rom> element of a MAME .xml dat. Region, offset... are not kept, so ROMs
+    differing just in them are shared.
+
+    :param po_xrom: The <rom> element.
+    :type po_xrom: xml.etree.ElementTree.Element
+
+    :return: A tuple with the data of the ROM (same layout as in snapshots, see _rom_to_tuple()).
+    :rtype: Tuple
+    """
+    dx_attrib = po_xrom.attrib
+
+    try:
+        s_crc32 = dx_attrib['crc'].lower()
+    except KeyError:
+        s_crc32 = None
+
+    try:
+        s_md5 = dx_attrib['md5'].lower()
+    except KeyError:
+        s_md5 = None
+
+    try:
+        s_sha1 = dx_attrib['sha1'].lower()
+    except KeyError:
+        s_sha1 = None
+
+    i_flags = 0
+    if 'bios' in dx_attrib:
+        i_flags |= _i_FLAG_BIOS
+
+    s_status = dx_attrib.get('status', '').lower()
+    if s_status == 'baddump':
+        i_flags |= _i_FLAG_BADDUMP
+    if s_status == 'nodump':
+        i_flags |= _i_FLAG_NODUMP
+
+    return (dx_attrib.get('name'), int(dx_attrib.get('size')), s_crc32, s_md5, s_sha1, dx_attrib.get('merge', ''),
+            i_flags)
+
+
+def _xml_read_links(po_romset, po_xelem):
+    """
+    Function to read the relations of a ROMset with other ROMsets (parent, ROMs source, samples and devices) from its
+    <game> or <machine> element.
+
+    :param po_romset: The ROMset.
+    :type po_romset: RomSet
+
+    :param po_xelem: The <game> or <machine> element.
+    :type po_xelem: xml.etree.ElementTree.Element
+
+    :return: Nothing, the ROMset will be modified in place.
     """
-    if None not in pls_hexs:
-        s_result = '0'
-        for s_hex in pls_hexs:
-            s_result = _hex_add(s_result, s_hex)
+    po_romset.s_cloneof = sys.intern(po_xelem.get('cloneof', ''))
+    po_romset.s_romof = sys.intern(po_xelem.get('romof', ''))
+    po_romset.s_sampleof = sys.intern(po_xelem.get('sampleof', ''))
+    po_romset.ts_device_refs = tuple(sys.intern(o_xref.get('name', ''))
+                                     for o_xref in po_xelem.iterfind('device_ref'))
+
+
+def _build_offsets(px_data, ps_format):
+    """
+    Function to build the offset index of a .dat file used by the lazy mode of Dat. Only the header is actually parsed,
+    ROMsets are just located.
+
+    :param px_data: Content of the .dat file.
+    :type px_data: Union[Bytes, mmap.mmap]
+
+    :param ps_format: Format of the file: 'cmp', 'generic' or 'mame'.
+    :type ps_format: Str
+
+    :return: A tuple with the header data (same layout as in the snapshots) and a dictionary ROMset name => (start, end)
+             byte range, sorted as in the file.
+    :rtype: Tuple[Tuple, Dict[Str:Tuple[Int, Int]]]
+    """
+    if ps_format == 'cmp':
+        dti_ranges = _cmp_offsets(px_data)
+    elif ps_format == 'mame':
+        dti_ranges = _xml_offsets(px_data, b'machine')
+    else:
+        dti_ranges = _xml_offsets(px_data, b'game')
+
+    i_first = len(px_data)
+    for i_start, _ in dti_ranges.values():
+        i_first = i_start
+        break
+    x_head = px_data[:i_first]
+
+    # The header is read with the regular readers, using an empty Dat
+    o_dat = Dat()
+    if ps_format == 'cmp':
+        o_dat.s_type = 'ClrMamePro'
+        o_dat._parse_cmp(x_head)
     else:
-        s_result = None
+        o_dat.s_type = 'xml'
+        x_prolog = b'<?xml version="1.0" encoding="%s"?>' % _xml_encoding(px_data).encode('ascii')
+        if ps_format == 'mame':
+            o_dat.s_name = 'MAME'
+            o_dat.s_version = _xml_mame_build(x_head, x_prolog)
+        else:
+            o_match = re.search(rb'<header[\s>].*?</header>', x_head, re.S)
+            if o_match:
+                o_dat._read_xml_generic_header(xml.etree.cElementTree.fromstring(x_prolog + o_match.group(0)))
+
+    tx_header = (o_dat.s_name, o_dat.s_description, o_dat.s_version, o_dat.s_comment, o_dat.s_type, o_dat.s_author,
+                 o_dat.s_homepage)
+
+    return tx_header, dti_ranges
+
+
+def _cmp_offsets(px_data):
+    """
+    Function to locate the ROMsets of a ClrMamePro dat. The same tokenizer used by the reader is used, but no objects
+    are created.
+
+    :param px_data: Content of the .dat file.
+    :type px_data: Union[Bytes, mmap.mmap]
+
+    :return: A dictionary ROMset name => (start, end) byte range, sorted as in the file.
+    :rtype: Dict[Str:Tuple[Int, Int]]
+    """
+    dti_ranges = {}
+    i_depth = 0
+    i_start = None      # Start of the ROMset being read, if any
+    s_name = ''
+
+    for o_match in _o_CMP_TOKEN_REGEX.finditer(px_data):
+        s_key, s_quoted, s_block, s_open, s_bare, s_close = o_match.groups()
+
+        if s_close:
+            i_depth = max(i_depth - 1, 0)
+            if i_depth == 0 and i_start is not None:
+                _add_range(dti_ranges, s_name, i_start, o_match.end())
+                i_start = None
+
+        elif s_open:
+            if i_depth == 0 and s_key in _ts_CMP_ROMSET_BLOCKS:
+                i_start = o_match.start()
+                s_name = ''
+            i_depth += 1
+
+        elif i_depth == 1 and i_start is not None:
+            if s_key == b'name' and s_block is None:
+                s_name = (s_quoted or s_bare or b'').decode('utf8', 'ignore')
+
+        elif i_depth == 0 and s_block is not None and s_key in _ts_CMP_ROMSET_BLOCKS:
+            _add_range(dti_ranges, _cmp_fields(s_block).get('name', ''), o_match.start(), o_match.end())
+
+    return dti_ranges
+
+
+def _xml_offsets(px_data, ps_tag):
+    """
+    Function to locate the ROMsets of a .xml dat.
+
+    :param px_data: Content of the .dat file.
+    :type px_data: Union[Bytes, mmap.mmap]
+
+    :param ps_tag: Tag of the ROMset elements. e.g. b'game'
+    :type ps_tag: Bytes
+
+    :return: A dictionary ROMset name => (start, end) byte range, sorted as in the file.
+    :rtype: Dict[Str:Tuple[Int, Int]]
+    """
+    s_encoding = _xml_encoding(px_data)
+    x_close = b'</%s>' % ps_tag
+
+    dti_ranges = {}
+    for o_match in re.finditer(rb'<%s\s[^>]*>' % ps_tag, px_data):
+        x_tag = o_match.group(0)
+
+        # Elements without children (e.g. some MAME devices) are closed in the opening tag itself
+        if x_tag.endswith(b'/>'):
+            i_end = o_match.end()
+        else:
+            i_end = px_data.find(x_close, o_match.end())
+            if i_end == -1:
+                raise ValueError('ERROR: <%s> element not closed at byte %i' % (ps_tag.decode(), o_match.start()))
+            i_end += len(x_close)
+
+        s_name = ''
+        o_name = _o_XML_NAME_REGEX.search(x_tag)
+        if o_name:
+            s_name = o_name.group(2).decode(s_encoding)
+            if '&' in s_name:
+                s_name = html.unescape(s_name)
+
+        _add_range(dti_ranges, s_name, o_match.start(), i_end)
+
+    return dti_ranges
+
+
+def _xml_mame_build(px_head, px_prolog):
+    """
+    Function to get the MAME build from the beginning of a MAME xml dat.
+
+    :param px_head: Beginning of the file, up to the first <machine> element.
+    :type px_head: Bytes
+
+    :param px_prolog: xml declaration of the file.
+    :type px_prolog: Bytes
+
+    :return: The build. e.g. '0.238 (mame0238)'
+    :rtype: Union[Str, None]
+    """
+    s_build = None
+    o_match = re.search(rb'<mame\b([^>]*?)/?>', px_head)
+    if o_match:
+        s_build = xml.etree.cElementTree.fromstring(b'%s<mame%s/>' % (px_prolog, o_match.group(1))).get('build')
+    return s_build
+
+
+def _xml_chunks(px_data, po_regex, pi_start, pi_end, pi_chunks):
+    """
+    Function to split the elements of a .xml file in chunks of similar size. Boundaries are placed at the start of the
+    elements found by a regular expression, so each chunk contains complete elements.
+
+    :param px_data: Content of the file.
+    :type px_data: Union[Bytes, mmap.mmap]
+
+    :param po_regex: Regular expression matching the start of the elements. e.g. _o_XML_MACHINE_REGEX
+    :type po_regex: re.Pattern
+
+    :param pi_start: Start of the first element.
+    :type pi_start: Int
+
+    :param pi_end: End of the last element.
+    :type pi_end: Int
+
+    :param pi_chunks: Desired number of chunks.
+    :type pi_chunks: Int
+
+    :return: A list with the (start, end) byte range of each chunk.
+    :rtype: List[Tuple[Int, Int]]
+    """
+    li_bounds = [pi_start]
+    i_step = max((pi_end - pi_start) // max(pi_chunks, 1), 1)
+    for i_chunk in range(1, pi_chunks):
+        o_match = po_regex.search(px_data, max(pi_start + i_chunk * i_step, li_bounds[-1] + 1), pi_end)
+        if o_match is None:
+            break
+        li_bounds.append(o_match.start())
+    li_bounds.append(pi_end)
+
+    return [(i_start, i_end) for i_start, i_end in zip(li_bounds[:-1], li_bounds[1:]) if i_end > i_start]
+
 
-    return s_result
+def _xml_skip_regex(pts_tags):
+    """
+    Function to build a regular expression finding the children of the ROMset elements of xml dats that are not wanted,
+    so they can be removed before the xml is parsed. Removing them with a regular expression is much quicker than
+    building Element objects for them just to throw them away.
+
+    The unwanted elements can contain other elements (e.g. <dipswitch> contains <dipvalue>) but not elements with their
+    own tag, which is true for MAME xml dats. The root and the ROMset elements are always kept.
+
+    :param pts_tags: Tags of the children to keep. i.e. ('description', 'rom')
+    :type pts_tags: Tuple[Str]
+
+    :return: The compiled regular expression.
+    :rtype: re.Pattern
+    """
+    x_keep = '|'.join(re.escape(s_tag) for s_tag in ('mame', 'machine', 'game') + tuple(pts_tags)).encode('utf8')
+    return re.compile(rb'<(?!(?:%s)[\s/>])([A-Za-z_][\w.:-]*)(?:\s[^>]*?)?(?:/>|>.*?</\1\s*>)' % x_keep, re.S)
+
+
+def _iter_xml_blocks(po_file, pi_size=_i_XML_BLOCK_SIZE):
+    """
+    Function to read a MAME xml dat in blocks. Each block ends just before the start of a <machine> element, so the
+    elements inside machines are never split between blocks.
+
+    :param po_file: The binary file object.
+    :type po_file: io.BufferedIOBase
+
+    :param pi_size: Number of bytes read each time. Blocks are bigger when a single machine doesn't fit in them.
+    :type pi_size: Int
+
+    :return: An iterator over the blocks.
+    :rtype: Iterator[Bytes]
+    """
+    x_pending = b''
+    while True:
+        x_data = po_file.read(pi_size)
+        if not x_data:
+            break
+
+        x_pending += x_data
+        i_cut = x_pending.rfind(b'<machine')
+        if i_cut > 0:
+            yield x_pending[:i_cut]
+            x_pending = x_pending[i_cut:]
+
+    if x_pending:
+        yield x_pending
+
+
+def _cmp_quote(ps_text):
+    """
+    Function to quote a text to be written as a value of a ClrMamePro dat. ClrMamePro doesn't have any escape syntax,
+    so texts containing double quotes are rejected instead of being written in a way they would be read back truncated.
+
+    :param ps_text: The text. e.g. 'Street Fighter II (World)'
+    :type ps_text: Str
+
+    :return: The quoted text. e.g. '"Street Fighter II (World)"'
+    :rtype: Str
+    """
+    s_text = '%s' % ps_text
+    if '"' in s_text:
+        raise ValueError('ERROR: Text with double quotes can\'t be written in ClrMamePro format: %s' % s_text)
+
+    return '"%s"' % s_text
+
+
+def _xml_escape(ps_text):
+    """
+    Function to escape a text to be written as xml text or attribute value (between double quotes).
+
+    :param ps_text: The text. e.g. 'Tom & Jerry'
+    :type ps_text: Str
+
+    :return: The escaped text. e.g. 'Tom &amp; Jerry'
+    :rtype: Str
+    """
+    return xml.sax.saxutils.escape(ps_text, {'"': '&quot;'})
+
+
+def _xml_encoding(px_data):
+    """
+    Function to get the encoding of a .xml file from its declaration.
+
+    :param px_data: Content of the file.
+    :type px_data: Union[Bytes, mmap.mmap]
+
+    :return: The name of the encoding. e.g. 'utf-8'
+    :rtype: Str
+    """
+    s_encoding = 'utf-8'
+    o_match = _o_XML_ENCODING_REGEX.match(px_data[:256])
+    if o_match:
+        s_encoding = o_match.group(1).decode('ascii', 'ignore')
+    return s_encoding
+
+
+def _add_range(pdti_ranges, ps_name, pi_start, pi_end):
+    """
+    Function to add the byte range of a ROMset to an offset index, checking it's not duplicated (as Dat.add_romset()
+    does).
+
+    :param pdti_ranges: The offset index.
+    :type pdti_ranges: Dict[Str:Tuple[Int, Int]]
+
+    :param ps_name: Name of the ROMset.
+    :type ps_name: Str
+
+    :param pi_start: First byte of the ROMset.
+    :type pi_start: Int
+
+    :param pi_end: Byte after the last one of the ROMset.
+    :type pi_end: Int
+
+    :return: Nothing, the index is modified in place.
+    """
+    if ps_name in pdti_ranges:
+        raise ValueError('ERROR: ROMset already exists in the Dat.')
+    pdti_ranges[ps_name] = (pi_start, pi_end)
+
+
+def _cache_path(ps_cache_dir, ps_file, ps_kind):
+    """
+    Function to get the path of the cached snapshot for a file. The name of the snapshot contains a hash of the absolute
+    path of the source file, so files with the same name in different dirs don't collide.
+
+    :param ps_cache_dir: Root cache directory.
+    :type ps_cache_dir: Str
+
+    :param ps_file: Path of the source file. e.g. '/home/john/dats/mdr-crt.dat'
+    :type ps_file: Str
+
+    :param ps_kind: Kind of data stored in the snapshot. e.g. 'dat'
+    :type ps_kind: Str
+
+    :return: The path of the snapshot. e.g. '/home/john/cache/dats/mdr-crt.dat-1a2b3c4d5e6f7a8b.dat.pickle'
+    :rtype: Str
+    """
+    s_abs_file = os.path.abspath(ps_file)
+    s_path_hash = hashlib.sha1(s_abs_file.encode('utf8')).hexdigest()[:16]
+    s_snapshot = '%s-%s.%s.pickle' % (os.path.basename(s_abs_file), s_path_hash, ps_kind)
+    return os.path.join(ps_cache_dir, 'dats', s_snapshot)
+
+
+def _cache_read(ps_cache_dir, ps_file, ps_kind):
+    """
+    Function to read the cached snapshot of a file. The fingerprint is stored at the beginning of the snapshot, so a
+    stale snapshot is detected without reading the rest of it.
+
+    :param ps_cache_dir: Root cache directory.
+    :type ps_cache_dir: Str
+
+    :param ps_file: Path of the source file.
+    :type ps_file: Str
+
+    :param ps_kind: Kind of data stored in the snapshot. e.g. 'dat'
+    :type ps_kind: Str
+
+    :return: The cached data, or None when there is no valid snapshot.
+    """
+    s_snapshot = _cache_path(ps_cache_dir, ps_file, ps_kind)
+
+    x_data = None
+    try:
+        with open(s_snapshot, 'rb') as o_file:
+            if pickle.load(o_file) == get_file_fingerprint(ps_file):
+                x_data = pickle.load(o_file)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError, AttributeError, IndexError):
+        x_data = None
+
+    return x_data
+
+
+def _cache_write(ps_cache_dir, ps_file, ps_kind, px_data):
+    """
+    Function to write the cached snapshot of a file. The snapshot is written to a temporary file which is then renamed,
+    so a crash in the middle of the process never leaves a half-written snapshot. Since the cache is just an
+    optimisation, problems writing it (e.g. a read-only dir) are silently ignored.
+
+    :param ps_cache_dir: Root cache directory.
+    :type ps_cache_dir: Str
+
+    :param ps_file: Path of the source file.
+    :type ps_file: Str
+
+    :param ps_kind: Kind of data stored in the snapshot. e.g. 'dat'
+    :type ps_kind: Str
+
+    :param px_data: Data to be stored. It must be picklable.
+
+    :return: True if the snapshot was written.
+    :rtype: Bool
+    """
+    s_snapshot = _cache_path(ps_cache_dir, ps_file, ps_kind)
+    s_tmp_snapshot = '%s.%i.tmp' % (s_snapshot, os.getpid())
+
+    b_written = False
+    try:
+        os.makedirs(os.path.dirname(s_snapshot), exist_ok=True)
+        with open(s_tmp_snapshot, 'wb') as o_file:
+            pickle.dump(get_file_fingerprint(ps_file), o_file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(px_data, o_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(s_tmp_snapshot, s_snapshot)
+        b_written = True
+    except OSError:
+        try:
+            os.remove(s_tmp_snapshot)
+        except OSError:
+            pass
+
+    return b_written
+
+
+def _read_mame_chunk(ps_file, pi_start, pi_end, px_prolog, pts_tags=_ts_MAME_TAGS):
+    """
+    Function run by the workers of Dat._read_from_xml_mame_parallel() to read a chunk of a MAME xml dat.
+
+    :param ps_file: Path of the xml file.
+    :type ps_file: Str
+
+    :param pi_start: Start of the chunk.
+    :type pi_start: Int
+
+    :param pi_end: End of the chunk.
+    :type pi_end: Int
+
+    :param px_prolog: xml declaration of the file.
+    :type px_prolog: Bytes
+
+    :param pts_tags: Children of the <machine> elements to be read.
+    :type pts_tags: Tuple[Str]
+
+    :return: A tuple with the snapshot of the ROMsets in the chunk (same layout as in Dat._to_snapshot()) and the
+             number of elements skipped.
+    :rtype: Tuple[List[Tuple], Int]
+    """
+    with open(ps_file, 'rb') as o_file:
+        o_file.seek(pi_start)
+        x_chunk = o_file.read(pi_end - pi_start)
+
+    o_dat = Dat()
+    o_dat._read_from_xml_mame(io.BytesIO(b'%s<mame>%s</mame>' % (px_prolog, x_chunk)), pts_tags=pts_tags)
+    return o_dat._to_snapshot()[1], o_dat.i_skipped
+
+
+def _read_dat_snapshot(ps_file, ps_cache_dir=''):
+    """
+    Function run by the workers of read_dats() to read a .dat file.
+
+    :param ps_file: Path of the .dat file.
+    :type ps_file: Str
+
+    :param ps_cache_dir: Directory for the compiled snapshots. Empty to disable the cache.
+    :type ps_cache_dir: Str
+
+    :return: A tuple with the snapshot of the Dat, the number of elements skipped while reading it (see Dat.i_skipped)
+             and the seconds spent reading it.
+    :rtype: Tuple[Tuple, Int, Float]
+    """
+    f_start = time.perf_counter()
+    o_dat = Dat(ps_file, ps_cache_dir=ps_cache_dir)
+    return o_dat._to_snapshot(), o_dat.i_skipped, time.perf_counter() - f_start
+
+
+def _rom_to_tuple(po_rom):
+    """
+    Function to convert a Rom to a tuple with all its data (same layout as in snapshots).
+
+    :param po_rom: The ROM.
+    :type po_rom: Rom
+
+    :return: A tuple (name, size, crc32, md5, sha1, merge, flags).
+    :rtype: Tuple
+    """
+    i_flags = 0
+    if po_rom.b_baddump:
+        i_flags |= _i_FLAG_BADDUMP
+    if po_rom.b_nodump:
+        i_flags |= _i_FLAG_NODUMP
+    if po_rom.b_bios:
+        i_flags |= _i_FLAG_BIOS
+
+    return po_rom.s_name, po_rom.i_size, po_rom.s_crc32, po_rom.s_md5, po_rom.s_sha1, po_rom.s_merge, i_flags
+
+
+def _tuple_to_rom(pt_rom):
+    """
+    Function to build a Rom from a tuple with all its data (same layout as in snapshots). Inverse of _rom_to_tuple().
+
+    :param pt_rom: A tuple (name, size, crc32, md5, sha1, merge, flags).
+    :type pt_rom: Tuple
+
+    :return: The ROM.
+    :rtype: Rom
+    """
+    o_rom = Rom()
+    o_rom.s_name, o_rom.i_size, o_rom.s_crc32, o_rom.s_md5, o_rom.s_sha1, o_rom.s_merge, i_flags = pt_rom
+    o_rom.b_baddump = bool(i_flags & _i_FLAG_BADDUMP)
+    o_rom.b_nodump = bool(i_flags & _i_FLAG_NODUMP)
+    o_rom.b_bios = bool(i_flags & _i_FLAG_BIOS)
+    return o_rom
+
+
+def _get_join_key(po_romset, ps_key):
+    """
+    Function to get the key a ROMset is matched by in set operations between Dats (see Dat._join()). ROMsets without
+    clean ROMs or with unknown (or empty) clean hash never match any ROMset when they are matched by hash, since the
+    hash doesn't identify them.
+
+    :param po_romset: The ROMset.
+    :type po_romset: RomSet
+
+    :param ps_key: Field used to match the ROMsets: 's_name', 's_ccrc32' or 's_csha1'.
+    :type ps_key: Str
+
+    :return: The key or None when the ROMset can't be matched.
+    :rtype: Union[Str, None]
+    """
+    x_key = getattr(po_romset, ps_key)
+    if ps_key != 's_name' and not (x_key and po_romset.i_croms):
+        x_key = None
+
+    return x_key
+
+
+def _get_shared_rom(pdo_roms, px_rom, psi_used, pc_build=_tuple_to_rom):
+    """
+    Function to get the Rom for some ROM data from a table of the ROMs already read, so identical ROMs are shared by all
+    the ROMsets containing them (see Rom). The Rom is built and added to the table when it's not there yet.
+
+    Somehow, ROMsets *CAN* have "duplicated" ROMs, and the dirty hashes of a ROMset include them as many times as they
+    appear. So, a ROM already present in the ROMset being read is never shared again, a new Rom is built instead.
+
+    :param pdo_roms: Table of the ROMs already read, keyed by their data.
+    :type pdo_roms: Dict[Union[Tuple, Bytes]:Rom]
+
+    :param px_rom: The data of the ROM. Usually, a tuple with the same layout as in snapshots (see _rom_to_tuple()),
+                   but the ClrMamePro reader uses the raw "rom" block, so the ones already read are not parsed again.
+    :type px_rom: Union[Tuple, Bytes]
+
+    :param psi_used: ids of the ROMs already in the ROMset being read. It's updated in place.
+    :type psi_used: Set[Int]
+
+    :param pc_build: Function building the Rom from its data.
+    :type pc_build: Callable
+
+    :return: The ROM.
+    :rtype: Rom
+    """
+    o_rom = pdo_roms.get(px_rom)
+    if o_rom is None or id(o_rom) in psi_used:
+        o_rom = pc_build(px_rom)
+        pdo_roms.setdefault(px_rom, o_rom)
+
+    psi_used.add(id(o_rom))
+    return o_rom
+
+
+def _romset_to_tuple(po_romset):
+    """
+    Function to convert a RomSet to a tuple with all its data, including its ROMs (same layout as in snapshots).
+
+    :param po_romset: The ROMset.
+    :type po_romset: RomSet
+
+    :return: A tuple (name, description, device, author, year, roms, cloneof, romof, sampleof, device refs).
+    :rtype: Tuple
+    """
+    return (po_romset.s_name, po_romset.s_desc, po_romset.b_device, po_romset.s_auth, po_romset.s_year,
+            [_rom_to_tuple(o_rom) for o_rom in po_romset], po_romset.s_cloneof, po_romset.s_romof,
+            po_romset.s_sampleof, po_romset.ts_device_refs)
 
 
 def _split_string_to_set(ps_string, ps_split, pb_lowercase=False):
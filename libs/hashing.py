@@ -0,0 +1,512 @@
+"""
+Library to hash ROM files. CRC32, MD5 and SHA1 are computed in a single pass over each file, reading it in big buffers,
+and several files are hashed at the same time by worker threads (zlib and hashlib release the GIL while hashing big
+buffers, so the threads really run in parallel). When only CRC32 is needed, big files (e.g. CD/DVD images) are split
+in segments hashed by several threads too, and the CRC32 of the segments are combined into the CRC32 of the whole file.
+
+Hashes can be kept in a persistent cache (a SQLite database) where files are identified by their device, inode, size
+and modification time (in nanoseconds). Files not modified since they were hashed are never read again, so rescanning
+an unchanged ROM library just needs a stat() call per file.
+"""
+
+import concurrent.futures
+import hashlib
+import os
+import sqlite3
+import zlib
+
+
+# Constants
+#=======================================================================================================================
+# Types of hashes supported. They are returned as lowercase hex digests, like in the dats (8 digits for CRC32).
+_ts_HASH_TYPES = ('crc32', 'md5', 'sha1')
+
+# Size of the buffer files are read in. With big buffers, the time spent by Python between reads is negligible compared
+# with the time spent hashing (without the GIL).
+_i_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Minimum size of the files whose CRC32 is computed by several threads, each one hashing a segment of the file. For
+# smaller files the time spent starting threads and reading from different positions isn't worth it.
+_i_PARALLEL_MIN_SIZE = 64 * 1024 * 1024
+
+# CRC32 polynomial (reflected) and table of x^(2^n) modulo the polynomial, used to combine CRC32 values. See
+# crc32_combine().
+_i_CRC32_POLY = 0xedb88320
+_ti_CRC32_X2N = ()
+
+# Version of the database schema. Databases with a different version are rebuilt from scratch.
+_i_SCHEMA_VERSION = 1
+
+_s_SCHEMA = '''
+CREATE TABLE hashes (
+    device      INTEGER NOT NULL,
+    inode       INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    crc32       TEXT,
+    md5         TEXT,
+    sha1        TEXT,
+    PRIMARY KEY (device, inode)
+);
+'''
+
+
+# Classes
+#=======================================================================================================================
+class FileHasher:
+    """
+    Class to hash files on worker threads, keeping the hashes in a persistent cache. Each time a file is read, all the
+    configured types of hashes are computed, so the file doesn't need to be read again when other hashes are requested
+    later. Configure just CRC32 (e.g. for CD/DVD images) to hash big files with all the threads (see hash_file()).
+
+    :ivar i_hashed: Int
+    :ivar i_hashed_bytes: Int
+    :ivar i_cached: Int
+    """
+    def __init__(self, ps_cache_file='', pi_workers=4, pts_types=_ts_HASH_TYPES):
+        """
+        :param ps_cache_file: Path of the SQLite database of the cache. It will be created if it doesn't exist. Empty to
+                              disable the cache.
+        :type ps_cache_file: Str
+
+        :param pi_workers: Number of threads hashing files at the same time.
+        :type pi_workers: Int
+
+        :param pts_types: Types of hashes computed every time a file is read: 'crc32', 'md5' and/or 'sha1'.
+        :type pts_types: Tuple[Str]
+        """
+        _check_types(pts_types)
+
+        self.s_cache_file = ps_cache_file
+        self.i_workers = max(1, pi_workers)
+        self.ts_types = tuple(pts_types)
+        self.i_hashed = 0        # Number of files read (so hashed) by the object.
+        self.i_hashed_bytes = 0  # Number of bytes read by the object.
+        self.i_cached = 0        # Number of files whose hashes were found in the cache.
+
+        self._o_db = None
+        if ps_cache_file:
+            s_dir = os.path.dirname(os.path.abspath(ps_cache_file))
+            os.makedirs(s_dir, exist_ok=True)
+
+            self._o_db = sqlite3.connect(ps_cache_file)
+            self._o_db.execute('PRAGMA journal_mode = WAL')
+            self._create_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __str__(self):
+        s_out = '<FileHasher>\n'
+        s_out += f'  .s_cache_file:   {self.s_cache_file}\n'
+        s_out += f'  .i_workers:      {self.i_workers}\n'
+        s_out += f'  .ts_types:       {self.ts_types}\n'
+        s_out += f'  .i_hashed:       {self.i_hashed}\n'
+        s_out += f'  .i_hashed_bytes: {self.i_hashed_bytes}\n'
+        s_out += f'  .i_cached:       {self.i_cached}\n'
+        return s_out
+
+    def close(self):
+        """
+        Method to close the database of the cache.
+
+        :return: Nothing
+        """
+        if self._o_db is not None:
+            self._o_db.close()
+            self._o_db = None
+
+    def hash_file(self, ps_file, pls_types=None):
+        """
+        Method to get the hashes of a file. It has the same interface as hash_file() so it can be used by
+        dat_files.identify_file_by_hash().
+
+        :param ps_file: Path of the file.
+        :type ps_file: Str
+
+        :param pls_types: Types of hashes to get. None for the configured ones.
+        :type pls_types: Union[Sequence[Str], None]
+
+        :return: A dictionary hash type => lowercase hex digest.
+        :rtype: Dict[Str:Str]
+        """
+        return self.hash_files([ps_file], pls_types=pls_types)[ps_file]
+
+    def hash_files(self, pls_files, pls_types=None):
+        """
+        Method to get the hashes of many files. Files found in the cache with all the requested hashes are not read;
+        the rest of them are hashed by the worker threads and stored in the cache.
+
+        :param pls_files: Paths of the files.
+        :type pls_files: Iterable[Str]
+
+        :param pls_types: Types of hashes to get. None for the configured ones.
+        :type pls_types: Union[Sequence[Str], None]
+
+        :return: A dictionary path => dictionary hash type => lowercase hex digest.
+        :rtype: Dict[Str:Dict[Str:Str]]
+        """
+        ts_types = self.ts_types if pls_types is None else tuple(pls_types)
+        _check_types(ts_types)
+
+        dds_results = {}
+        di_pending = {}
+        for s_file in dict.fromkeys(pls_files):
+            t_key = _get_stat_key(os.stat(s_file))
+            ds_cached = self._cache_get(t_key)
+            if all(ds_cached.get(s_type) for s_type in ts_types):
+                dds_results[s_file] = {s_type: ds_cached[s_type] for s_type in ts_types}
+                self.i_cached += 1
+            else:
+                di_pending[s_file] = t_key[2]
+
+        if not di_pending:
+            return dds_results
+
+        # The requested hashes not configured are computed too, and the ones configured even if not requested
+        ts_hash_types = tuple(dict.fromkeys(self.ts_types + ts_types))
+
+        # Big files hashed just with CRC32 are hashed one by one, each one with all the threads. The rest of files are
+        # hashed at the same time, one per thread.
+        ls_big = []
+        if ts_hash_types == ('crc32',) and self.i_workers > 1:
+            ls_big = [s_file for s_file, i_size in di_pending.items() if i_size >= _i_PARALLEL_MIN_SIZE]
+        ls_small = [s_file for s_file in di_pending if s_file not in ls_big]
+
+        dtx_hashed = {s_file: _hash_file_with_key(s_file, ts_hash_types, pi_workers=self.i_workers)
+                      for s_file in ls_big}
+        if ls_small:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.i_workers, len(ls_small))) as o_executor:
+                lo_futures = [o_executor.submit(_hash_file_with_key, s_file, ts_hash_types) for s_file in ls_small]
+            dtx_hashed.update(zip(ls_small, (o_future.result() for o_future in lo_futures)))
+
+        ltx_rows = []
+        for s_file in di_pending:
+            t_key, ds_hashes = dtx_hashed[s_file]
+            self.i_hashed += 1
+            self.i_hashed_bytes += t_key[2]
+            dds_results[s_file] = {s_type: ds_hashes[s_type] for s_type in ts_types}
+
+            # Hashes of other types cached before for the same version of the file are kept
+            ds_row = self._cache_get(t_key)
+            ds_row.update(ds_hashes)
+            ltx_rows.append(t_key + tuple(ds_row.get(s_type) for s_type in _ts_HASH_TYPES))
+
+        if self._o_db is not None:
+            with self._o_db:
+                self._o_db.executemany('INSERT OR REPLACE INTO hashes (device, inode, size, mtime_ns, crc32, md5, '
+                                       'sha1) VALUES (?, ?, ?, ?, ?, ?, ?)', ltx_rows)
+
+        return dds_results
+
+    def _cache_get(self, pt_key):
+        """
+        Method to get the hashes of a file stored in the cache.
+
+        :param pt_key: Key of the file: device, inode, size and modification time. See _get_stat_key().
+        :type pt_key: Tuple[Int, Int, Int, Int]
+
+        :return: A dictionary hash type => lowercase hex digest, just with the hashes found.
+        :rtype: Dict[Str:Str]
+        """
+        ds_hashes = {}
+        if self._o_db is not None:
+            tx_row = self._o_db.execute('SELECT crc32, md5, sha1 FROM hashes '
+                                        'WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?',
+                                        pt_key).fetchone()
+            if tx_row is not None:
+                ds_hashes = {s_type: s_hash for s_type, s_hash in zip(_ts_HASH_TYPES, tx_row) if s_hash}
+
+        return ds_hashes
+
+    def _create_schema(self):
+        """
+        Method to create the tables of the database when they don't exist or were created with a different schema.
+
+        :return: Nothing
+        """
+        i_version = self._o_db.execute('PRAGMA user_version').fetchone()[0]
+        if i_version != _i_SCHEMA_VERSION:
+            with self._o_db:
+                self._o_db.execute('DROP TABLE IF EXISTS hashes')
+            self._o_db.executescript(_s_SCHEMA)
+            self._o_db.execute(f'PRAGMA user_version = {_i_SCHEMA_VERSION}')
+            self._o_db.commit()
+
+
+# Functions
+#=======================================================================================================================
+def crc32_combine(pi_crc1, pi_crc2, pi_length2):
+    """
+    Function to get the CRC32 of two pieces of data joined from the CRC32 of each piece, without the data. It's the
+    crc32_combine() algorithm of zlib: appending n bytes to some data multiplies its CRC32 by x^(8 * n) modulo the CRC32
+    polynomial, so the CRC32 of the first piece is "shifted" that way and combined with the CRC32 of the second piece.
+    Powers of x are obtained multiplying the precomputed powers x^(2^k), so it just takes a few dozens of
+    multiplications, whatever the length is.
+
+    :param pi_crc1: CRC32 of the first piece.
+    :type pi_crc1: Int
+
+    :param pi_crc2: CRC32 of the second piece.
+    :type pi_crc2: Int
+
+    :param pi_length2: Length of the second piece, in bytes.
+    :type pi_length2: Int
+
+    :return: The CRC32 of the whole data.
+    :rtype: Int
+    """
+    return _crc32_multiply(_crc32_x2n(pi_length2, 3), pi_crc1) ^ pi_crc2
+
+
+def get_hash_cache_path(ps_cache_dir):
+    """
+    Function to get the path of the database of the hash cache inside a cache dir.
+
+    :param ps_cache_dir: Root cache directory.
+    :type ps_cache_dir: Str
+
+    :return: The path of the database. e.g. '/home/john/cache/hashes/hashes.sqlite3'
+    :rtype: Str
+    """
+    return os.path.join(ps_cache_dir, 'hashes', 'hashes.sqlite3')
+
+
+def hash_file(ps_file, pls_types=_ts_HASH_TYPES, pi_workers=1):
+    """
+    Function to hash a file reading it just once, in big buffers, so big files are never fully loaded in memory.
+
+    When only CRC32 is computed and the file is big, the file is split in segments hashed at the same time by several
+    threads, and the CRC32 of the segments are combined (see crc32_combine()). MD5 and SHA1 can't be computed that way,
+    since they need to read the data in order.
+
+    :param ps_file: Path of the file.
+    :type ps_file: Str
+
+    :param pls_types: Hash types to compute: 'crc32', 'md5' and/or 'sha1'.
+    :type pls_types: Sequence[Str]
+
+    :param pi_workers: Number of threads used to compute the CRC32 of big files.
+    :type pi_workers: Int
+
+    :return: A dictionary hash type => lowercase hex digest, with the same length used in the dats.
+    :rtype: Dict[Str:Str]
+    """
+    _check_types(pls_types)
+    return _hash_file_with_key(ps_file, pls_types, pi_workers=pi_workers)[1]
+
+
+# Helper Functions
+#=======================================================================================================================
+def _check_types(pts_types):
+    """
+    Function to check the types of hashes are supported.
+
+    :param pts_types: Types of hashes.
+    :type pts_types: Sequence[Str]
+
+    :return: Nothing
+    """
+    for s_type in pts_types:
+        if s_type not in _ts_HASH_TYPES:
+            raise ValueError('ERROR: Invalid hash type "%s", it must be one of %s' % (s_type, str(_ts_HASH_TYPES)))
+
+
+def _crc32_multiply(pi_a, pi_b):
+    """
+    Function to multiply two polynomials modulo the CRC32 polynomial, in the reflected bit order used by CRC32 (the
+    most significant bit is the coefficient of x^0).
+
+    :param pi_a: First polynomial.
+    :type pi_a: Int
+
+    :param pi_b: Second polynomial.
+    :type pi_b: Int
+
+    :return: The product.
+    :rtype: Int
+    """
+    i_mask = 1 << 31
+    i_product = 0
+    while i_mask and pi_a:
+        if pi_a & i_mask:
+            i_product ^= pi_b
+            pi_a ^= i_mask
+        i_mask >>= 1
+        pi_b = (pi_b >> 1) ^ _i_CRC32_POLY if pi_b & 1 else pi_b >> 1
+
+    return i_product
+
+
+def _crc32_x2n(pi_n, pi_k):
+    """
+    Function to get x^(n * 2^k) modulo the CRC32 polynomial.
+
+    :param pi_n: Factor n of the exponent.
+    :type pi_n: Int
+
+    :param pi_k: Power of two k of the exponent.
+    :type pi_k: Int
+
+    :return: The polynomial.
+    :rtype: Int
+    """
+    i_power = 1 << 31
+    while pi_n:
+        if pi_n & 1:
+            i_power = _crc32_multiply(_ti_CRC32_X2N[pi_k & 31], i_power)
+        pi_n >>= 1
+        pi_k += 1
+
+    return i_power
+
+
+def _crc32_segment(ps_file, pi_start, pi_length):
+    """
+    Function to compute the CRC32 of a segment of a file.
+
+    :param ps_file: Path of the file.
+    :type ps_file: Str
+
+    :param pi_start: Position of the first byte of the segment.
+    :type pi_start: Int
+
+    :param pi_length: Length of the segment.
+    :type pi_length: Int
+
+    :return: The CRC32 of the segment.
+    :rtype: Int
+    """
+    i_crc32 = 0
+    x_buffer = bytearray(min(_i_BUFFER_SIZE, pi_length))
+    o_view = memoryview(x_buffer)
+
+    with open(ps_file, 'rb', buffering=0) as o_file:
+        o_file.seek(pi_start)
+        i_left = pi_length
+        while i_left:
+            i_read = o_file.readinto(o_view[:i_left])
+            if not i_read:
+                break
+
+            i_crc32 = zlib.crc32(o_view[:i_read], i_crc32)
+            i_left -= i_read
+
+    return i_crc32
+
+
+def _crc32_parallel(ps_file, pi_size, pi_workers):
+    """
+    Function to compute the CRC32 of a file splitting it in segments hashed by several threads.
+
+    :param ps_file: Path of the file.
+    :type ps_file: Str
+
+    :param pi_size: Size of the file.
+    :type pi_size: Int
+
+    :param pi_workers: Number of threads, one per segment.
+    :type pi_workers: Int
+
+    :return: The CRC32 of the file.
+    :rtype: Int
+    """
+    # Segments are a multiple of the buffer size, so all the reads but the last one of each segment use the full buffer
+    i_segment = -(-pi_size // pi_workers)
+    i_segment = -(-i_segment // _i_BUFFER_SIZE) * _i_BUFFER_SIZE
+    lti_segments = [(i_start, min(i_segment, pi_size - i_start)) for i_start in range(0, pi_size, i_segment)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(lti_segments)) as o_executor:
+        li_crc32s = list(o_executor.map(lambda ti_segment: _crc32_segment(ps_file, *ti_segment), lti_segments))
+
+    i_crc32 = 0
+    for (_, i_length), i_segment_crc32 in zip(lti_segments, li_crc32s):
+        i_crc32 = crc32_combine(i_crc32, i_segment_crc32, i_length)
+
+    return i_crc32
+
+
+def _get_stat_key(po_stat):
+    """
+    Function to get the key identifying a version of a file in the cache.
+
+    :param po_stat: Result of os.stat() for the file.
+    :type po_stat: os.stat_result
+
+    :return: The device, inode, size and modification time (in nanoseconds) of the file.
+    :rtype: Tuple[Int, Int, Int, Int]
+    """
+    return po_stat.st_dev, po_stat.st_ino, po_stat.st_size, po_stat.st_mtime_ns
+
+
+def _hash_file_with_key(ps_file, pts_types, pi_workers=1):
+    """
+    Function to hash a file, getting its cache key too. The key is obtained from the open file before reading it, so if
+    the file is modified while it's being read, its modification time won't match the key and the hashes won't be used.
+
+    :param ps_file: Path of the file.
+    :type ps_file: Str
+
+    :param pts_types: Hash types to compute: 'crc32', 'md5' and/or 'sha1'.
+    :type pts_types: Sequence[Str]
+
+    :param pi_workers: Number of threads used to compute the CRC32 of big files. See hash_file().
+    :type pi_workers: Int
+
+    :return: A tuple with the key of the file and a dictionary hash type => lowercase hex digest.
+    :rtype: Tuple[Tuple[Int, Int, Int, Int], Dict[Str:Str]]
+    """
+    i_crc32 = 0
+    b_crc32 = 'crc32' in pts_types
+    do_hashers = {s_type: hashlib.new(s_type) for s_type in pts_types if s_type != 'crc32'}
+    lo_hashers = list(do_hashers.values())
+
+    # The same buffer is reused for all the reads, so no memory is allocated while reading
+    x_buffer = bytearray(_i_BUFFER_SIZE)
+    o_view = memoryview(x_buffer)
+
+    with open(ps_file, 'rb', buffering=0) as o_file:
+        t_key = _get_stat_key(os.fstat(o_file.fileno()))
+        if b_crc32 and not lo_hashers and pi_workers > 1 and t_key[2] >= _i_PARALLEL_MIN_SIZE:
+            return t_key, {'crc32': '%08x' % _crc32_parallel(ps_file, t_key[2], pi_workers)}
+
+        while True:
+            i_read = o_file.readinto(x_buffer)
+            if not i_read:
+                break
+
+            o_chunk = o_view[:i_read]
+            if b_crc32:
+                i_crc32 = zlib.crc32(o_chunk, i_crc32)
+            for o_hasher in lo_hashers:
+                o_hasher.update(o_chunk)
+
+    ds_hashes = {s_type: o_hasher.hexdigest() for s_type, o_hasher in do_hashers.items()}
+    if b_crc32:
+        ds_hashes['crc32'] = '%08x' % i_crc32
+
+    return t_key, ds_hashes
+
+
+# Initialization
+#=======================================================================================================================
+def _build_crc32_x2n():
+    """
+    Function to build the table of x^(2^n) modulo the CRC32 polynomial, for n = 0...31. See crc32_combine().
+
+    :return: The table.
+    :rtype: Tuple[Int]
+    """
+    li_table = []
+    i_power = 1 << 30  # x^1
+    for _ in range(32):
+        li_table.append(i_power)
+        i_power = _crc32_multiply(i_power, i_power)
+
+    return tuple(li_table)
+
+
+_ti_CRC32_X2N = _build_crc32_x2n()
@@ -6,7 +6,9 @@ import os
 import re
 
 from . import cons
+from . import dat_catalog
 from . import dat_files
+from . import hashing
 from . import string_helpers
 
 
@@ -24,7 +26,7 @@ class Rom:
     """
     :ivar o_platform: platform.PlatformCfg
     """
-    def __init__(self, ps_platform, ps_path, ps_dat=''):
+    def __init__(self, ps_platform, ps_path, ps_dat='', ps_cache_dir=''):
         """
 
         :param ps_platform: Alias of the platform that runs the ROM.
@@ -35,6 +37,9 @@ class Rom:
 
         :param ps_dat: Path of a dat file to get more information from
         :type ps_dat: Str
+
+        :param ps_cache_dir: Cache dir where the dat catalog is kept. Empty to disable the cache.
+        :type ps_cache_dir: Str
         """
 
         self.s_path = ps_path
@@ -55,7 +60,7 @@ class Rom:
         self.populate_from_file(ps_path)
 
         if ps_dat:
-            self.populate_from_dat(ps_dat)
+            self.populate_from_dat(ps_dat, ps_cache_dir=ps_cache_dir)
 
     def __eq__(self, po_other):
         """
@@ -115,23 +120,37 @@ class Rom:
         s_out += f'└────────────────────────'
         return s_out
 
-    def populate_from_dat(self, ps_dat):
+    def populate_from_dat(self, ps_dat, ps_cache_dir=''):
         """
         Method to populate the Rom object with information from a .dat file.
 
         :param ps_dat: Path of the .dat file to be used to extract extra information for the ROM.
         :type ps_dat: Str
 
+        :param ps_cache_dir: Cache dir where the dat catalog is kept. When given, the ROMset is obtained with a single
+                             query to the catalog. Empty to disable the cache, then the .dat file is opened in
+                             lazy mode so only the needed ROMset is parsed (unless the file name is not found and the
+                             ROMset must be identified by the content of the file). The hashes of the files
+                             identified by content are cached there too, so they are only read once.
+        :type ps_cache_dir: Str
+
         :return: Nothing, the object will be populated in place.
         """
-        o_dat = dat_files.Dat(ps_file=ps_dat)
-        self.s_dat = o_dat.s_name
-        self.s_dat_ver = o_dat.s_version
-
         s_file = os.path.basename(self.s_path)
         s_file_name, _, s_file_ext = s_file.rpartition('.')
 
-        o_dat_rom = o_dat.get_romset_by_name(s_file_name)
+        if ps_cache_dir:
+            with dat_catalog.DatCatalog(dat_catalog.get_catalog_path(ps_cache_dir)) as o_catalog:
+                o_dat = o_catalog.load_dat_file(ps_dat)
+                o_dat_rom = self._find_romset(o_dat, s_file_name, ps_cache_dir=ps_cache_dir)
+        else:
+            # The file is released as soon as the ROMset is found, the ROMsets not parsed are not needed
+            with dat_files.Dat(ps_file=ps_dat, pb_lazy=True) as o_dat:
+                o_dat_rom = self._find_romset(o_dat, s_file_name)
+
+        self.s_dat = o_dat.s_name
+        self.s_dat_ver = o_dat.s_version
+
         if o_dat_rom is not None:
             self.s_name = o_dat_rom.s_desc
             self.i_dsize = o_dat_rom.i_dsize
@@ -152,6 +171,36 @@ class Rom:
         s_name, _, s_ext = s_file_name.rpartition('.')
         self.s_name = s_name
 
+    def _find_romset(self, po_dat, ps_name, ps_cache_dir=''):
+        """
+        Method to find the ROMset of the ROM in a Dat. The ROMset is found by the name of the file, which doesn't
+        require reading it. Only when the name is not found (e.g. renamed files), the ROMset is identified by the
+        content of the file; for zip archives, by the files inside them (just the directory of the archive is read).
+
+        :param po_dat: Dat to search in.
+        :type po_dat: Union[dat_files.Dat, dat_catalog.CatalogDat]
+
+        :param ps_name: Name of the file without extension.
+        :type ps_name: Str
+
+        :param ps_cache_dir: Cache dir where the hashes of the files are kept. Empty to disable the cache.
+        :type ps_cache_dir: Str
+
+        :return: The found ROMset or None if no ROMset is found.
+        :rtype: Union[dat_files.RomSet, None]
+        """
+        o_romset = po_dat.get_romset_by_name(ps_name)
+        if o_romset is None and os.path.isfile(self.s_path):
+            # Zip archives are identified without hashing them, so the hash cache is not needed. Just the extension is
+            # checked, identify_file() reads the directory of the archive.
+            if ps_cache_dir and not self.s_path.lower().endswith('.zip'):
+                with hashing.FileHasher(hashing.get_hash_cache_path(ps_cache_dir)) as o_hasher:
+                    o_romset = po_dat.identify_file(self.s_path, pc_hasher=o_hasher.hash_file)
+            else:
+                o_romset = po_dat.identify_file(self.s_path)
+
+        return o_romset
+
     def _get_s_region_auto(self):
         """
         Method to get the automatic region for the current ROM. The region will be obtained from the platform settings
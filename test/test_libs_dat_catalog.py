@@ -0,0 +1,195 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+import libs.cons as cons
+import libs.dat_catalog as dat_catalog
+import libs.dat_files as dat_files
+import libs.roms as roms
+
+
+# Constants
+#=======================================================================================================================
+_s_MDR_DAT = os.path.join(cons.s_TEST_DATA_DIR, 'dats', 'mdr-crt.dat')
+
+
+# Test cases
+#=======================================================================================================================
+class TestClassDatCatalog(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+        self._s_db = dat_catalog.get_catalog_path(self._s_tmp_dir)
+        self._o_dat = dat_files.Dat(_s_MDR_DAT)
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def test_get_romset_by_name(self):
+        """
+        Test to check a ROMset read from the catalog is the same as the one read from the Dat.
+        :return: Nothing.
+        """
+        s_name = 'Phantom Gear (World) (v0.2) (Demo) (Aftermarket) (Unl)'
+        with dat_catalog.DatCatalog(self._s_db) as o_catalog:
+            o_catalog_dat = o_catalog.add_dat(self._o_dat, 'mdr-crt')
+            o_romset_actual = o_catalog_dat.get_romset_by_name(s_name)
+            o_romset_none = o_catalog_dat.get_romset_by_name('foo')
+
+        s_msg = 'ROMset read from the catalog is not the same as the one read from the Dat'
+        self.assertEqual(str(self._o_dat.get_romset_by_name(s_name)), str(o_romset_actual), s_msg)
+        self.assertIsNone(o_romset_none)
+
+    def test_get_romsets_by_field(self):
+        """
+        Test to check searches by field in the catalog give the same results as searches in the Dat.
+        :return: Nothing.
+        """
+        with dat_catalog.DatCatalog(self._s_db) as o_catalog:
+            o_catalog_dat = o_catalog.add_dat(self._o_dat, 'mdr-crt')
+
+            llx_actual = []
+            llx_expect = []
+            for s_field, tx_values in (('s_ccrc32', ('474aaa44', '529ac15a')),
+                                       ('s_year', ('',)),
+                                       ('s_desc', ('[BIOS] Mega-CD (Europe)',))):
+                for b_first in (False, True):
+                    llx_actual.append([o_romset.s_name for o_romset in
+                                       o_catalog_dat.get_romsets_by_field(s_field, b_first, tx_values)])
+                    llx_expect.append([o_romset.s_name for o_romset in
+                                       self._o_dat.get_romsets_by_field(s_field, b_first, tx_values)])
+
+        s_msg = 'Search by field in the catalog is different from the same search in the Dat'
+        self.assertEqual(llx_expect, llx_actual, s_msg)
+
+    def test_load_dat_file_refreshed(self):
+        """
+        Test to check the catalog data is refreshed when the .dat file changes.
+        :return: Nothing.
+        """
+        s_dat = os.path.join(self._s_tmp_dir, 'mdr-crt.dat')
+        shutil.copy(_s_MDR_DAT, s_dat)
+
+        with dat_catalog.DatCatalog(self._s_db) as o_catalog:
+            i_romsets_before = o_catalog.load_dat_file(s_dat).i_romsets
+
+            with open(s_dat, 'r', encoding='utf8') as o_file:
+                s_data = o_file.read()
+            s_data = s_data.replace('<game name="[BIOS] Mega-CD (Europe)">', '<game name="Renamed BIOS">')
+            with open(s_dat, 'w', encoding='utf8') as o_file:
+                o_file.write(s_data)
+            os.utime(s_dat, ns=(0, 1000000000))
+
+            o_catalog_dat = o_catalog.load_dat_file(s_dat)
+            lx_actual = [i_romsets_before, o_catalog_dat.i_romsets, o_catalog.get_keys(),
+                         o_catalog_dat.get_romset_by_name('Renamed BIOS').s_desc]
+
+        lx_expect = [2742, 2742, [os.path.abspath(s_dat)], '[BIOS] Mega-CD (Europe)']
+
+        s_msg = 'Catalog data was not refreshed after the .dat file changed'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_apply_diff(self):
+        """
+        Test to check a Dat stored in the catalog is updated in place, touching only the changed ROMsets.
+        :return: Nothing.
+        """
+        o_new_dat = dat_files.Dat(_s_MDR_DAT)
+        s_removed, s_renamed, s_changed, s_untouched = [o_romset.s_name for o_romset in o_new_dat.iter_unordered()][:4]
+
+        o_new_dat.del_romset(s_removed)
+        o_renamed = dat_files.RomSet('Renamed', 'Renamed')
+        for o_rom in o_new_dat.get_romset_by_name(s_renamed):
+            o_renamed.add_rom(o_rom)
+        o_new_dat.del_romset(s_renamed)
+        o_new_dat.add_romset(o_renamed)
+        o_new_dat.get_romset_by_name(s_changed).s_year = '1999'
+
+        with dat_catalog.DatCatalog(self._s_db) as o_catalog:
+            o_catalog.add_dat(self._o_dat, 'mdr-crt')
+            s_sql = 'SELECT id FROM romsets WHERE name = ?'
+            i_untouched_id = o_catalog._o_db.execute(s_sql, (s_untouched,)).fetchone()[0]
+
+            o_catalog_dat = o_catalog.apply_diff('mdr-crt', self._o_dat.get_diff(o_new_dat))
+
+            lx_expect = [2741, None, None, self._o_dat.get_romset_by_name(s_renamed).s_ccrc32, '1999', i_untouched_id]
+            lx_actual = [o_catalog_dat.i_romsets, o_catalog_dat.get_romset_by_name(s_removed),
+                         o_catalog_dat.get_romset_by_name(s_renamed),
+                         o_catalog_dat.get_romset_by_name('Renamed').s_ccrc32,
+                         o_catalog_dat.get_romset_by_name(s_changed).s_year,
+                         o_catalog._o_db.execute(s_sql, (s_untouched,)).fetchone()[0]]
+
+        s_msg = 'Dat updated in the catalog is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_romset_links(self):
+        """
+        Test to check the relations between ROMsets (parent, bios, samples and devices) are kept in the catalog.
+        :return: Nothing.
+        """
+        o_romset = dat_files.RomSet('mslugb', 'Metal Slug (bootleg)')
+        o_romset.s_cloneof = 'mslug'
+        o_romset.s_romof = 'mslug'
+        o_romset.s_sampleof = 'mslug'
+        o_romset.ts_device_refs = ('ng_memcard', 'z80')
+        self._o_dat.add_romset(o_romset)
+
+        with dat_catalog.DatCatalog(self._s_db) as o_catalog:
+            o_catalog_dat = o_catalog.add_dat(self._o_dat, 'mdr-crt')
+            o_catalog_romset = o_catalog_dat.get_romset_by_name('mslugb')
+            o_catalog_bios = o_catalog_dat.get_romset_by_name('[BIOS] Mega-CD (Europe)')
+
+        lx_expect = ['mslug', 'mslug', 'mslug', ('ng_memcard', 'z80'), '', ()]
+        lx_actual = [o_catalog_romset.s_cloneof, o_catalog_romset.s_romof, o_catalog_romset.s_sampleof,
+                     o_catalog_romset.ts_device_refs, o_catalog_bios.s_cloneof, o_catalog_bios.ts_device_refs]
+
+        s_msg = 'Relations between ROMsets read from the catalog are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_identify_file(self):
+        """
+        Test to check ROM files are identified by their content in the catalog like in the Dat.
+        :return: Nothing.
+        """
+        x_data = b'SEGA MEGA DRIVE' * 100
+        o_rom = dat_files.Rom()
+        o_rom.s_name = 'Renamed Game (World).md'
+        o_rom.i_size = len(x_data)
+        o_rom.s_crc32 = '%08x' % zlib.crc32(x_data)
+        o_romset = dat_files.RomSet('Renamed Game (World)', 'Renamed Game (World)')
+        o_romset.add_rom(o_rom)
+        self._o_dat.add_romset(o_romset)
+
+        s_file = os.path.join(self._s_tmp_dir, 'my game.md')
+        with open(s_file, 'wb') as o_file:
+            o_file.write(x_data)
+
+        with dat_catalog.DatCatalog(self._s_db) as o_catalog:
+            o_catalog_dat = o_catalog.add_dat(self._o_dat, 'mdr-crt')
+            lx_actual = [o_catalog_dat.identify_file(s_file).s_name,
+                         [o_romset.s_name for o_romset in o_catalog_dat.get_romsets_by_size(524288)]]
+        lx_expect = [self._o_dat.identify_file(s_file).s_name,
+                     [o_romset.s_name for o_romset in self._o_dat.get_romsets_by_size(524288)]]
+
+        s_msg = 'ROM file identified in the catalog is different from the one identified in the Dat'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_rom_populate_from_catalog(self):
+        """
+        Test to check a roms.Rom populated through the catalog is the same as one populated from the Dat.
+        :return: Nothing.
+        """
+        s_rom_file = os.path.join(cons.s_TEST_DATA_DIR, 'roms', 'mdr-crt',
+                                  'Phantom Gear (World) (v0.2) (Demo) (Aftermarket) (Unl).zip')
+        o_rom_expect = roms.Rom('mdr-crt', s_rom_file, ps_dat=_s_MDR_DAT)
+        o_rom_actual = roms.Rom('mdr-crt', s_rom_file, ps_dat=_s_MDR_DAT, ps_cache_dir=self._s_tmp_dir)
+
+        s_msg = 'Rom populated through the dat catalog is different from the one populated from the Dat'
+        self.assertEqual(o_rom_expect, o_rom_actual, s_msg)
+
+
+# Main code
+#=======================================================================================================================
+if __name__ == '__main__':
+    unittest.main()
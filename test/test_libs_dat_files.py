@@ -0,0 +1,1787 @@
+import gzip
+import hashlib
+import io
+import lzma
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+import zipfile
+import zlib
+
+import libs.cons as cons
+import libs.dat_files as dat_files
+
+
+# Constants
+#=======================================================================================================================
+_s_MDR_DAT = os.path.join(cons.s_TEST_DATA_DIR, 'dats', 'mdr-crt.dat')
+
+_s_MAME_XML = '''<?xml version="1.0"?>
+<!DOCTYPE mame [
+<!ELEMENT mame (machine+)>
+]>
+<mame build="0.238 (mame0238)" debug="no" mameconfig="10">
+  <machine name="005" sourcefile="segag80r.cpp" sampleof="005">
+    <description>005</description>
+    <year>1981</year>
+    <manufacturer>Sega</manufacturer>
+    <rom name="1346b.cpu-u25" size="2048" crc="8E68533E" sha1="a257c556d31691068ed5c991f1fb2b51da4826db" region="maincpu" offset="0"/>
+    <rom name="5092.prom-u1" size="2048" crc="29e10a81" sha1="c4b4e6c75bcf276e53f39a456d8d633c83dcf485" region="maincpu" offset="800" status="baddump"/>
+    <rom name="bios.u1" bios="default" size="1024" crc="00000001" region="bios" offset="0"/>
+    <chip type="cpu" tag="maincpu" name="Zilog Z80" clock="3867000"/>
+  </machine>
+  <machine name="ym2151" sourcefile="sound/ym2151.cpp" isdevice="yes" runnable="no">
+    <description>Yamaha YM2151 OPM</description>
+  </machine>
+</mame>
+'''
+
+_s_MAME_GRAPH_XML = '''<?xml version="1.0"?>
+<!DOCTYPE mame [
+<!ELEMENT mame (machine+)>
+]>
+<mame build="0.238 (mame0238)" debug="no" mameconfig="10">
+  <machine name="neogeo" sourcefile="neogeo.cpp" isbios="yes">
+    <description>Neo-Geo</description>
+    <rom name="sp-s2.sp1" bios="euro" size="131072" crc="9036d879" region="mainbios" offset="0"/>
+    <rom name="sfix.sfix" size="131072" crc="c2ea0cfd" region="fixedbios" offset="0"/>
+    <device_ref name="ng_memcard"/>
+  </machine>
+  <machine name="mslug" sourcefile="neogeo.cpp" romof="neogeo">
+    <description>Metal Slug</description>
+    <rom name="sp-s2.sp1" merge="sp-s2.sp1" bios="euro" size="131072" crc="9036d879" region="mainbios" offset="0"/>
+    <rom name="sfix.sfix" merge="sfix.sfix" size="131072" crc="c2ea0cfd" region="fixedbios" offset="0"/>
+    <rom name="201-p1.p1" size="2097152" crc="08d8daa5" region="cslot1:maincpu" offset="100000"/>
+    <rom name="201-c1.c1" size="4194304" crc="72813676" region="cslot1:sprites" offset="0"/>
+    <device_ref name="ng_memcard"/>
+    <device_ref name="z80"/>
+  </machine>
+  <machine name="mslugb" sourcefile="neogeo.cpp" cloneof="mslug" romof="mslug">
+    <description>Metal Slug (bootleg)</description>
+    <rom name="sp-s2.sp1" merge="sp-s2.sp1" bios="euro" size="131072" crc="9036d879" region="mainbios" offset="0"/>
+    <rom name="sfix.sfix" merge="sfix.sfix" size="131072" crc="c2ea0cfd" region="fixedbios" offset="0"/>
+    <rom name="201-p1b.p1" merge="201-p1.p1" size="2097152" crc="08d8daa5" region="cslot1:maincpu" offset="100000"/>
+    <rom name="201-c1b.c1" size="4194304" crc="12345678" region="cslot1:sprites" offset="0"/>
+    <rom name="missing.bin" size="1024" status="nodump" region="cslot1:sprites" offset="0"/>
+    <device_ref name="ng_memcard"/>
+    <device_ref name="z80"/>
+  </machine>
+  <machine name="ng_memcard" sourcefile="memcard.cpp" isdevice="yes" runnable="no">
+    <description>Neo-Geo Memory Card</description>
+    <rom name="memcard.bin" size="2048" crc="aabbccdd" region="memcard" offset="0"/>
+    <device_ref name="z80"/>
+  </machine>
+  <machine name="z80" sourcefile="z80.cpp" isdevice="yes" runnable="no">
+    <description>Zilog Z80</description>
+  </machine>
+</mame>
+'''
+
+_s_CMP_DAT = '''clrmamepro (
+	name "Test"
+	description "Test dat (with parentheses)"
+	version 20230101
+)
+
+game (
+	name "Game A (Europe)"
+	description "Game A (Europe)"
+	year 1991
+	manufacturer "Some company"
+	rom ( name "Game A (Europe) (Track 1).bin" size 1024 crc 0A0B0C0D md5 "00112233445566778899aabbccddeeff" )
+	rom ( name game_a.cue size 128 crc 01020304 flags "baddump nodump" )
+)
+
+game (
+	name "Game B"
+	description "Game B"
+)
+'''
+
+
+_s_CATVER_INI = ''';; CatVer 0.245 / 28-Jun-22 / MAME 0.245 ;;
+;; Some comment ;;
+
+[FOLDER_SETTINGS]
+RootFolderIcon=mame
+SubFolderIcon=folder
+
+[ROOT_FOLDER]
+
+[Category]
+005=Maze / Shooter Small
+1942=Shooter / Flying Vertical
+pacman=Maze / Collect
+ym2151=Sound Chip
+
+[VerAdded]
+005=0.37b8
+1942=.036
+pacman=.036
+ym2151=0.100
+'''
+
+_s_NPLAYERS_INI = ''';; NPlayers 0.245 / 01-Jul-22 / MAME 0.245 ;;
+
+[NPlayers]
+005=2P alt
+1942=2P alt
+pacman=2P alt
+ym2151=???
+'''
+
+_s_GENRE_INI = '''[FOLDER_SETTINGS]
+RootFolderIcon=mame
+
+[ROOT_FOLDER]
+
+[Maze]
+005
+pacman
+
+[Shooter]
+1942
+'''
+
+# Test cases
+#=======================================================================================================================
+class TestClassDatReadXml(unittest.TestCase):
+    def test_read_generic_xml(self):
+        """
+        Test to read a No-Intro (generic) xml dat.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat(_s_MDR_DAT)
+
+        lx_expect = ['Sega - Mega Drive - Genesis', '20221110-032023', 'No-Intro', 2742, 4]
+        lx_actual = [o_dat.s_name, o_dat.s_version, o_dat.s_homepage, o_dat.i_romsets, o_dat.i_baddumps]
+
+        s_msg = 'Data read from generic xml dat is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_read_generic_xml_romset(self):
+        """
+        Test to check the ROMs of a ROMset read from a generic xml dat.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat(_s_MDR_DAT)
+        o_romset = o_dat.get_romset_by_name('[BIOS] Mega-CD (Europe)')
+
+        lx_expect = ['[BIOS] Mega-CD (Europe)', 1, 131072, '529ac15a', 'f891e0ea651e2232af0c5c4cb46a0cae2ee8f356']
+        lx_actual = [o_romset.s_desc, o_romset.i_droms, o_romset.i_dsize, o_romset.s_ccrc32, o_romset.s_csha1]
+
+        s_msg = 'ROMset read from generic xml dat is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_read_mame_xml(self):
+        """
+        Test to read a MAME xml dat.
+        :return: Nothing.
+        """
+        with tempfile.TemporaryDirectory() as s_tmp_dir:
+            s_file = os.path.join(s_tmp_dir, 'mame.xml')
+            with open(s_file, 'w', encoding='utf8') as o_file:
+                o_file.write(_s_MAME_XML)
+
+            o_dat = dat_files.Dat(s_file)
+
+        o_romset = o_dat.get_romset_by_name('005')
+
+        lx_expect = ['MAME', '0.238 (mame0238)', 2, 1, 1, 3, '8e68533e', True]
+        lx_actual = [o_dat.s_name, o_dat.s_version, o_dat.i_romsets, o_dat.i_devices, o_dat.i_baddumps,
+                     o_romset.i_droms, o_romset._lo_roms[0].s_crc32, o_romset.b_baddump]
+
+        s_msg = 'Data read from MAME xml dat is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatReadCmp(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def test_read_cmp(self):
+        """
+        Test to read a small ClrMamePro dat with quoted and unquoted values, flags and ROMsets without ROMs.
+        :return: Nothing.
+        """
+        s_file = os.path.join(self._s_tmp_dir, 'test.dat')
+        with open(s_file, 'w', encoding='utf8') as o_file:
+            o_file.write(_s_CMP_DAT)
+
+        o_dat = dat_files.Dat(s_file)
+        o_romset = o_dat.get_romset_by_name('Game A (Europe)')
+        o_rom_a, o_rom_b = o_romset
+
+        lx_expect = ['Test dat (with parentheses)', '20230101', 2, '1991', 'Some company',
+                     'Game A (Europe) (Track 1).bin', 1024, '0a0b0c0d', '00112233445566778899aabbccddeeff',
+                     'game_a.cue', True, True, '0a0b0c0d', 0, '0']
+        lx_actual = [o_dat.s_description, o_dat.s_version, o_dat.i_romsets, o_romset.s_year, o_romset.s_auth,
+                     o_rom_a.s_name, o_rom_a.i_size, o_rom_a.s_crc32, o_rom_a.s_md5,
+                     o_rom_b.s_name, o_rom_b.b_baddump, o_rom_b.b_nodump, o_romset.s_ccrc32,
+                     o_dat.get_romset_by_name('Game B').i_droms, o_dat.get_romset_by_name('Game B').s_year]
+
+        s_msg = 'Data read from ClrMamePro dat is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_read_cmp_same_as_xml(self):
+        """
+        Test to check that the No-Intro xml dat, exported to ClrMamePro format and read back, contains the same data.
+        :return: Nothing.
+        """
+        o_dat_xml = dat_files.Dat(_s_MDR_DAT)
+        s_file = os.path.join(self._s_tmp_dir, 'mdr-crt.dat')
+        o_dat_xml.save_to_dat(s_file, 'cmp')
+        o_dat_cmp = dat_files.Dat(s_file)
+
+        # Header and year are not exported to ClrMamePro format
+        ltx_expect = sorted((tx_romset[0], tx_romset[1], tx_romset[5]) for tx_romset in o_dat_xml._to_snapshot()[1])
+        ltx_actual = sorted((tx_romset[0], tx_romset[1], tx_romset[5]) for tx_romset in o_dat_cmp._to_snapshot()[1])
+
+        s_msg = 'Data read from ClrMamePro dat is different from the data read from the original xml dat'
+        self.assertEqual(ltx_expect, ltx_actual, s_msg)
+
+
+class TestClassRomSetHashes(unittest.TestCase):
+    @staticmethod
+    def _build_rom(ps_name, ps_crc32, ps_sha1='', pb_bios=False):
+        o_rom = dat_files.Rom()
+        o_rom.s_name = ps_name
+        o_rom.s_crc32 = ps_crc32
+        o_rom.s_sha1 = ps_sha1
+        o_rom.b_bios = pb_bios
+        return o_rom
+
+    def test_compound_hashes(self):
+        """
+        Test to check compound hashes, including overflow truncation, ignored extensions and bios ROMs.
+        :return: Nothing.
+        """
+        o_romset = dat_files.RomSet('a', 'A')
+        o_romset.add_rom(self._build_rom('a.bin', 'ffffffff', 'f' * 40))
+        o_romset.add_rom(self._build_rom('b.bin', '00000002', '0' * 39 + '2'))
+        o_romset.add_rom(self._build_rom('a.cue', '10000000', '1' * 40))
+        o_romset.add_rom(self._build_rom('bios.bin', '20000000', '2' * 40, pb_bios=True))
+
+        lx_expect = ['00000001', '30000001', '0' * 39 + '1', '3' * 39 + '4']
+        lx_actual = [o_romset.s_ccrc32, o_romset.s_dcrc32, o_romset.s_csha1, o_romset.s_dsha1]
+
+        s_msg = 'Compound hashes are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_compound_hashes_corner_cases(self):
+        """
+        Test to check the compound hashes of ROMsets without ROMs, with ROMs adding up to zero and with unknown hashes.
+        :return: Nothing.
+        """
+        o_romset_empty = dat_files.RomSet('a', 'A')
+
+        o_romset_zero = dat_files.RomSet('b', 'B')
+        o_romset_zero.add_rom(self._build_rom('b.bin', '00000000'))
+
+        o_romset_none = dat_files.RomSet('c', 'C')
+        o_romset_none.add_rom(self._build_rom('c.bin', None))
+
+        lx_expect = ['00000000', '', None]
+        lx_actual = [o_romset_empty.s_ccrc32, o_romset_zero.s_ccrc32, o_romset_none.s_ccrc32]
+
+        s_msg = 'Compound hashes corner cases are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_compound_hashes_updated_after_add_rom(self):
+        """
+        Test to check cached compound hashes and sizes are updated when a ROM is added.
+        :return: Nothing.
+        """
+        o_romset = dat_files.RomSet('a', 'A')
+        o_romset.add_rom(self._build_rom('a.bin', '00000001'))
+        lx_actual = [o_romset.s_ccrc32, o_romset.i_croms]
+
+        o_romset.add_rom(self._build_rom('b.bin', '00000002'))
+        lx_actual += [o_romset.s_ccrc32, o_romset.i_croms]
+
+        lx_expect = ['00000001', 1, '00000003', 2]
+
+        s_msg = 'Compound hashes not updated after adding a ROM'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatIteration(unittest.TestCase):
+    def test_sorted_iteration(self):
+        """
+        Test to check the Dat is iterated in description order, also after adding new ROMsets.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat()
+        for s_name in ('b', 'C', 'a'):
+            o_dat.add_romset(dat_files.RomSet(s_name, s_name.upper()))
+        ls_actual = [o_romset.s_name for o_romset in o_dat]
+
+        o_dat.add_romset(dat_files.RomSet('0', 'B0'))
+        o_dat.del_romset('C')
+        ls_actual += [o_romset.s_name for o_romset in o_dat]
+
+        ls_expect = ['a', 'b', 'C', 'a', 'b', '0']
+
+        s_msg = 'Iteration order of the Dat is not what was expected'
+        self.assertEqual(ls_expect, ls_actual, s_msg)
+
+    def test_unordered_iteration(self):
+        """
+        Test to check unordered iteration follows the order the ROMsets were added and counters don't sort the Dat.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat()
+        for s_name in ('b', 'C', 'a'):
+            o_dat.add_romset(dat_files.RomSet(s_name, s_name.upper()))
+
+        lx_expect = [['b', 'C', 'a'], 0, 0, 0, None]
+        lx_actual = [[o_romset.s_name for o_romset in o_dat.iter_unordered()],
+                     o_dat.i_baddumps, o_dat.i_nodumps, o_dat.i_devices, o_dat._lo_sorted]
+
+        s_msg = 'Unordered iteration of the Dat is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatIndexes(unittest.TestCase):
+    def setUp(self):
+        self._o_dat = dat_files.Dat(_s_MDR_DAT)
+
+    def test_get_romsets_by_field(self):
+        """
+        Test to search ROMsets by clean CRC32, keeping the order by description of the results.
+        :return: Nothing.
+        """
+        lo_romsets = self._o_dat.get_romsets_by_field('s_ccrc32', False, ('474aaa44', '529ac15a', 'ffffffff'))
+
+        ls_expect = ['[BIOS] LaserActive (Japan) (v1.05)', '[BIOS] Mega-CD (Europe)']
+        ls_actual = [o_romset.s_name for o_romset in lo_romsets]
+
+        s_msg = 'ROMsets found by field are not what was expected'
+        self.assertEqual(ls_expect, ls_actual, s_msg)
+
+    def test_get_romsets_by_field_after_changes(self):
+        """
+        Test to check the indexes are updated when ROMsets are added or removed.
+        :return: Nothing.
+        """
+        self._o_dat.get_romsets_by_field('s_ccrc32', False, ('529ac15a',))
+        self._o_dat.del_romset('[BIOS] Mega-CD (Europe)')
+
+        o_romset = dat_files.RomSet('Foo', 'Foo')
+        o_rom = dat_files.Rom()
+        o_rom.s_name = 'foo.md'
+        o_rom.s_crc32 = '474aaa44'
+        o_romset.add_rom(o_rom)
+        self._o_dat.add_romset(o_romset)
+
+        ls_expect = ['[BIOS] LaserActive (Japan) (v1.05)', 'Foo']
+        ls_actual = [o_romset.s_name for o_romset in self._o_dat.get_romsets_by_field('s_ccrc32', False,
+                                                                                     ('474aaa44', '529ac15a'))]
+
+        s_msg = 'ROMsets found by field after adding/removing ROMsets are not what was expected'
+        self.assertEqual(ls_expect, ls_actual, s_msg)
+
+    def test_get_duplicated_crc32(self):
+        """
+        Test to get the ROMsets sharing the same clean CRC32.
+        :return: Nothing.
+        """
+        dls_actual = {}
+        for s_ccrc32, lo_romsets in self._o_dat.get_duplicated_crc32().items():
+            dls_actual[s_ccrc32] = sorted(o_romset.s_name for o_romset in lo_romsets)
+
+        # Brute-force check of the duplicates
+        dls_expect = {}
+        for o_romset in self._o_dat:
+            dls_expect.setdefault(o_romset.s_ccrc32, []).append(o_romset.s_name)
+        dls_expect = {s_key: sorted(ls_names) for s_key, ls_names in dls_expect.items() if len(ls_names) > 1}
+
+        s_msg = 'Duplicated CRC32 ROMsets are not what was expected'
+        self.assertEqual(dls_expect, dls_actual, s_msg)
+
+    def test_to_dict(self):
+        """
+        Test to get a dictionary of ROMsets keyed by clean CRC32.
+        :return: Nothing.
+        """
+        do_romsets = self._o_dat.to_dict('s_ccrc32')
+
+        s_msg = 'Dictionary of ROMsets by clean CRC32 is not what was expected'
+        self.assertEqual('[BIOS] Mega-CD (Europe)', do_romsets['529ac15a'].s_name, s_msg)
+
+    def test_to_dict_repeated_values(self):
+        """
+        Test to check the last ROMset added is kept for repeated values, for indexed and not indexed properties.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat()
+        for s_name, s_desc in (('b', 'Game A'), ('a', 'Game Z'), ('c', 'Game M')):
+            o_romset = dat_files.RomSet(s_name, s_desc)
+            o_romset.s_year = '1990'
+            o_dat.add_romset(o_romset)
+
+        lx_expect = ['c', 'c', 'c']
+        lx_actual = [o_dat.to_dict('s_year')['1990'].s_name, o_dat.to_dict('s_ccrc32')['00000000'].s_name,
+                     o_dat.to_dict('b_device')[False].s_name]
+
+        s_msg = 'ROMsets kept for repeated values are not the last ones added'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatCache(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+        self._s_cache_dir = os.path.join(self._s_tmp_dir, 'cache')
+        self._s_dat = os.path.join(self._s_tmp_dir, 'mdr-crt.dat')
+        shutil.copy(_s_MDR_DAT, self._s_dat)
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def test_snapshot_written_and_loaded(self):
+        """
+        Test to check a snapshot is created in the cache dir and later loads produce the same data as a plain parse.
+        :return: Nothing.
+        """
+        o_dat_cold = dat_files.Dat(self._s_dat, ps_cache_dir=self._s_cache_dir)
+        s_snapshot = dat_files._cache_path(self._s_cache_dir, self._s_dat, 'dat')
+        self.assertTrue(os.path.isfile(s_snapshot))
+
+        o_dat_warm = dat_files.Dat(self._s_dat, ps_cache_dir=self._s_cache_dir)
+
+        self.assertEqual(o_dat_cold._to_snapshot(), o_dat_warm._to_snapshot())
+        self.assertEqual(dat_files.Dat(self._s_dat)._to_snapshot(), o_dat_warm._to_snapshot())
+
+    def test_stale_snapshot_rebuilt(self):
+        """
+        Test to check a snapshot is rebuilt when the source .dat file changes.
+        :return: Nothing.
+        """
+        dat_files.Dat(self._s_dat, ps_cache_dir=self._s_cache_dir)
+
+        # We modify the .dat so a ROMset is renamed
+        with open(self._s_dat, 'r', encoding='utf8') as o_file:
+            s_data = o_file.read()
+        s_data = s_data.replace('<game name="[BIOS] Mega-CD (Europe)">', '<game name="Renamed BIOS">')
+        with open(self._s_dat, 'w', encoding='utf8') as o_file:
+            o_file.write(s_data)
+        os.utime(self._s_dat, ns=(0, 1000000000))
+
+        o_dat = dat_files.Dat(self._s_dat, ps_cache_dir=self._s_cache_dir)
+        lx_expect = [None, '[BIOS] Mega-CD (Europe)']
+        lx_actual = [o_dat.get_romset_by_name('[BIOS] Mega-CD (Europe)'),
+                     o_dat.get_romset_by_name('Renamed BIOS').s_desc]
+
+        s_msg = 'Stale dat snapshot was not rebuilt'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatLazy(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+        self._s_cache_dir = os.path.join(self._s_tmp_dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def _write_dat(self, ps_name, ps_data):
+        s_file = os.path.join(self._s_tmp_dir, ps_name)
+        with open(s_file, 'w', encoding='utf8') as o_file:
+            o_file.write(ps_data)
+        return s_file
+
+    def test_lazy_generic_xml(self):
+        """
+        Test to check a generic xml dat opened in lazy mode only parses the requested ROMsets, and it contains the same
+        data as a plain parse once all the ROMsets are accessed.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat(_s_MDR_DAT, pb_lazy=True)
+        o_romset = o_dat.get_romset_by_name('[BIOS] Mega-CD (Europe)')
+
+        lx_expect = ['Sega - Mega Drive - Genesis', '20221110-032023', 'No-Intro', 2742, 1, '529ac15a', None]
+        lx_actual = [o_dat.s_name, o_dat.s_version, o_dat.s_homepage, o_dat.i_romsets,
+                     len(o_dat._do_romsets._do_loaded), o_romset.s_ccrc32, o_dat.get_romset_by_name('Missing')]
+
+        s_msg = 'Data read from generic xml dat in lazy mode is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertEqual(dat_files.Dat(_s_MDR_DAT)._to_snapshot(), o_dat._to_snapshot())
+
+    def test_lazy_close(self):
+        """
+        Test to check closing a Dat opened in lazy mode releases the .dat file, the ROMsets already parsed are kept and
+        the pending ones can't be read.
+        :return: Nothing.
+        """
+        with dat_files.Dat(_s_MDR_DAT, pb_lazy=True) as o_dat:
+            o_romset = o_dat.get_romset_by_name('[BIOS] Mega-CD (Europe)')
+            x_data = o_dat._do_romsets.x_data
+
+        lx_expect = [True, '529ac15a', 2742, True]
+        lx_actual = [x_data.closed, o_dat.get_romset_by_name('[BIOS] Mega-CD (Europe)').s_ccrc32, o_dat.i_romsets,
+                     o_dat.get_romset_by_name('[BIOS] Mega-CD (Europe)') is o_romset]
+
+        s_msg = 'Data read from a closed Dat in lazy mode is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertRaises(ValueError, o_dat.get_romset_by_name, 'Sonic The Hedgehog (USA, Europe)')
+        self.assertRaises(ValueError, list, o_dat)
+
+        # Closing again or closing a non-lazy Dat does nothing
+        o_dat.close()
+        dat_files.Dat(_s_MDR_DAT).close()
+
+    def test_lazy_mame_xml_and_cmp(self):
+        """
+        Test to check MAME xml and ClrMamePro dats opened in lazy mode.
+        :return: Nothing.
+        """
+        s_xml = self._write_dat('mame.xml', _s_MAME_XML.replace('<machine name="ym2151"', '<machine name="Y&amp;M"'))
+        o_dat_xml = dat_files.Dat(s_xml, pb_lazy=True)
+
+        s_cmp = self._write_dat('test.dat', _s_CMP_DAT)
+        o_dat_cmp = dat_files.Dat(s_cmp, pb_lazy=True)
+
+        o_romset_xml = o_dat_xml.get_romset_by_name('005')
+        o_romset_cmp = o_dat_cmp.get_romset_by_name('Game A (Europe)')
+
+        lx_expect = ['MAME', '0.238 (mame0238)', 2, 3, True, 'Yamaha YM2151 OPM',
+                     'Test dat (with parentheses)', 2, '0a0b0c0d', '1991', '0']
+        lx_actual = [o_dat_xml.s_name, o_dat_xml.s_version, o_dat_xml.i_romsets, o_romset_xml.i_droms,
+                     o_romset_xml.b_baddump, o_dat_xml.get_romset_by_name('Y&M').s_desc,
+                     o_dat_cmp.s_description, o_dat_cmp.i_romsets, o_romset_cmp.s_ccrc32, o_romset_cmp.s_year,
+                     o_dat_cmp.get_romset_by_name('Game B').s_year]
+
+        s_msg = 'Data read from MAME xml and ClrMamePro dats in lazy mode is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertEqual(dat_files.Dat(s_cmp)._to_snapshot(), o_dat_cmp._to_snapshot())
+
+    def test_lazy_modifications(self):
+        """
+        Test to check ROMsets can be added and removed from a Dat in lazy mode before they are parsed.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat(self._write_dat('test.dat', _s_CMP_DAT), pb_lazy=True)
+        o_dat.del_romset('Game B')
+        o_dat.add_romset(dat_files.RomSet('Game C', 'Game C'))
+
+        lx_expect = [2, None, ['Game A (Europe)', 'Game C']]
+        lx_actual = [o_dat.i_romsets, o_dat.get_romset_by_name('Game B'), [o_romset.s_name for o_romset in o_dat]]
+
+        s_msg = 'Dat modified in lazy mode is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertRaises(ValueError, o_dat.add_romset, dat_files.RomSet('Game A (Europe)', ''))
+
+    def test_offset_index_refreshed(self):
+        """
+        Test to check the offset index is stored in the cache dir and rebuilt when the source .dat file changes.
+        :return: Nothing.
+        """
+        s_file = self._write_dat('test.dat', _s_CMP_DAT)
+        dat_files.Dat(s_file, ps_cache_dir=self._s_cache_dir, pb_lazy=True)
+        self.assertTrue(os.path.isfile(dat_files._cache_path(self._s_cache_dir, s_file, 'offsets')))
+
+        self._write_dat('test.dat', _s_CMP_DAT.replace('"Game B"', '"Game Renamed"'))
+        os.utime(s_file, ns=(0, 1000000000))
+        o_dat = dat_files.Dat(s_file, ps_cache_dir=self._s_cache_dir, pb_lazy=True)
+
+        lx_expect = [None, 'Game Renamed']
+        lx_actual = [o_dat.get_romset_by_name('Game B'), o_dat.get_romset_by_name('Game Renamed').s_desc]
+
+        s_msg = 'Stale offset index was not rebuilt'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+@unittest.skipIf(dat_files.numpy is None, 'NumPy is not installed')
+class TestClassDatColumns(unittest.TestCase):
+    @staticmethod
+    def _build_rom(ps_name, ps_crc32, ps_md5='', pb_bios=False, pb_baddump=False):
+        o_rom = dat_files.Rom()
+        o_rom.s_name = ps_name
+        o_rom.i_size = 1024
+        o_rom.s_crc32 = ps_crc32
+        o_rom.s_md5 = ps_md5
+        o_rom.b_bios = pb_bios
+        o_rom.b_baddump = pb_baddump
+        return o_rom
+
+    def _assert_same_as_objects(self, po_dat):
+        o_columns = po_dat.to_columns()
+
+        for s_type in ('crc32', 'md5', 'sha1'):
+            for b_clean in (True, False):
+                ls_expect = [o_romset._get_s_hash(ps_type=s_type, pb_clean=b_clean) for o_romset in po_dat]
+                s_msg = 'Columnar %s hashes (clean=%s) are different from RomSet ones' % (s_type, b_clean)
+                self.assertEqual(ls_expect, o_columns.get_s_hashes(ps_type=s_type, pb_clean=b_clean), s_msg)
+
+        lx_expect = [[o_romset.s_name for o_romset in po_dat], [o_romset.i_csize for o_romset in po_dat],
+                     [o_romset.i_dsize for o_romset in po_dat], po_dat.i_baddumps, po_dat.i_nodumps, po_dat.i_devices,
+                     {s_crc32: [o_romset.s_name for o_romset in lo_romsets]
+                      for s_crc32, lo_romsets in po_dat.get_duplicated_crc32().items()}]
+        lx_actual = [o_columns.ls_names, o_columns.get_sizes(pb_clean=True).tolist(),
+                     o_columns.get_sizes(pb_clean=False).tolist(), o_columns.i_baddumps, o_columns.i_nodumps,
+                     o_columns.i_devices, o_columns.get_duplicated_crc32()]
+
+        s_msg = 'Columnar sizes, counters or duplicates are different from the Dat ones'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_columns_generic_xml(self):
+        """
+        Test to check the columnar representation of a No-Intro dat gives the same results as the Dat.
+        :return: Nothing.
+        """
+        self._assert_same_as_objects(dat_files.Dat(_s_MDR_DAT))
+
+    def test_columns_corner_cases(self):
+        """
+        Test to check the columnar representation with ROMsets without ROMs, ROMs adding up to zero, ROMs whose sum
+        overflows to zero, unknown hashes, ignored extensions, bios ROMs, duplicated ROMs and devices.
+        :return: Nothing.
+        """
+        o_rom_shared = self._build_rom('shared.bin', '00000005')
+
+        o_romset_a = dat_files.RomSet('a', 'A')
+        o_romset_a.add_rom(self._build_rom('a.bin', 'ffffffff', 'f' * 32, pb_baddump=True))
+        o_romset_a.add_rom(self._build_rom('a.cue', '10000000', '1' * 32))
+        o_romset_a.add_rom(self._build_rom('bios.bin', '20000000', '2' * 32, pb_bios=True))
+        o_romset_a.add_rom(self._build_rom('a.bin', '00000003', '0' * 31 + '3'))
+
+        o_romset_b = dat_files.RomSet('b', 'B', pb_device=True)
+        o_romset_b.add_rom(self._build_rom('b.bin', '00000000', None))
+
+        o_romset_c = dat_files.RomSet('c', 'C')
+        o_romset_c.add_rom(self._build_rom('c.bin', None))
+        o_romset_c.add_rom(o_rom_shared)
+        o_romset_c.add_rom(o_rom_shared)
+
+        o_romset_d = dat_files.RomSet('d', 'D')
+        o_romset_d.add_rom(self._build_rom('d.bin', 'ffffffff', '1' * 32))
+
+        # The sums of the hashes overflow to zero, which is not an empty hash
+        o_romset_f = dat_files.RomSet('f', 'F')
+        o_romset_f.add_rom(self._build_rom('f1.bin', 'ffffffff', 'f' * 32))
+        o_romset_f.add_rom(self._build_rom('f2.bin', '00000001', '0' * 31 + '1'))
+
+        o_romset_g = dat_files.RomSet('g', 'G')
+        o_romset_g.add_rom(self._build_rom('g1.bin', '80000000', '8' + '0' * 31))
+        o_romset_g.add_rom(self._build_rom('g2.bin', '80000000', '8' + '0' * 31))
+
+        o_dat = dat_files.Dat()
+        for o_romset in (dat_files.RomSet('e', 'E'), o_romset_a, o_romset_b, o_romset_c, o_romset_d, o_romset_f,
+                         o_romset_g):
+            o_dat.add_romset(o_romset)
+
+        self._assert_same_as_objects(o_dat)
+
+    def test_columns_filter_by_size(self):
+        """
+        Test to check the size-range filter of the columnar representation.
+        :return: Nothing.
+        """
+        o_columns = dat_files.Dat(_s_MDR_DAT).to_columns()
+
+        lx_expect = [o_romset.s_name for o_romset in dat_files.Dat(_s_MDR_DAT) if 131072 <= o_romset.i_csize <= 262144]
+        lx_actual = o_columns.filter_by_size(pi_min=131072, pi_max=262144)
+
+        s_msg = 'Columnar size filter is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassReadDats(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+        self._ls_files = [_s_MDR_DAT]
+        for s_name, s_data in (('test.dat', _s_CMP_DAT), ('mame.xml', _s_MAME_XML)):
+            s_file = os.path.join(self._s_tmp_dir, s_name)
+            with open(s_file, 'w', encoding='utf8') as o_file:
+                o_file.write(s_data)
+            self._ls_files.append(s_file)
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def test_read_dats_parallel(self):
+        """
+        Test to check dats read in parallel contain the same data as dats read one by one, in the same order.
+        :return: Nothing.
+        """
+        ltx_results = dat_files.read_dats(self._ls_files, pi_workers=2)
+
+        lo_dats = [dat_files.Dat(s_file) for s_file in self._ls_files]
+
+        lx_expect = [(s_file, o_dat._to_snapshot(), o_dat.i_skipped, True)
+                     for s_file, o_dat in zip(self._ls_files, lo_dats)]
+        lx_actual = [(s_file, o_dat._to_snapshot(), o_dat.i_skipped, f_seconds >= 0)
+                     for s_file, o_dat, f_seconds in ltx_results]
+
+        s_msg = 'Dats read in parallel are not the same as the ones read one by one'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_read_dats_serial_cached(self):
+        """
+        Test to check dats are read in the current process with a single worker, using the cache dir.
+        :return: Nothing.
+        """
+        s_cache_dir = os.path.join(self._s_tmp_dir, 'cache')
+        ltx_results = dat_files.read_dats(self._ls_files, pi_workers=1, ps_cache_dir=s_cache_dir)
+
+        lx_expect = [2742, 2, 2, True]
+        lx_actual = [o_dat.i_romsets for _, o_dat, _ in ltx_results]
+        lx_actual.append(os.path.isfile(dat_files._cache_path(s_cache_dir, self._ls_files[1], 'dat')))
+
+        s_msg = 'Dats read with a single worker are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_read_dats_missing_file(self):
+        """
+        Test to check a missing dat file is reported in the same way with one or several workers.
+        :return: Nothing.
+        """
+        ls_files = self._ls_files + [os.path.join(self._s_tmp_dir, 'missing.dat')]
+        for i_workers in (1, 2):
+            self.assertRaises(ValueError, dat_files.read_dats, ls_files, pi_workers=i_workers)
+
+
+class TestClassDatReadXmlParallel(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+        self._s_file = os.path.join(self._s_tmp_dir, 'mame.xml')
+
+        # The machines of the sample MAME xml are repeated with different names, so the file is split in many chunks
+        s_head, _, s_machines = _s_MAME_XML.partition('  <machine')
+        s_machines = '  <machine' + s_machines.replace('</mame>', '')
+        ls_machines = []
+        for i_copy in range(100):
+            s_copy = s_machines.replace('name="005"', 'name="005_%03i"' % i_copy)
+            ls_machines.append(s_copy.replace('name="ym2151"', 'name="ym2151_%03i"' % i_copy))
+        with open(self._s_file, 'w', encoding='utf8') as o_file:
+            o_file.write(s_head + ''.join(ls_machines) + '</mame>\n')
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def test_read_mame_xml_parallel(self):
+        """
+        Test to check a MAME xml dat read in parallel contains the same data, in the same order, as the serial read.
+        :return: Nothing.
+        """
+        o_dat_serial = dat_files.Dat(self._s_file)
+        o_dat_parallel = dat_files.Dat(self._s_file, pi_workers=3)
+
+        lx_expect = [200, o_dat_serial._to_snapshot(), 100]
+        lx_actual = [o_dat_parallel.i_romsets, o_dat_parallel._to_snapshot(), o_dat_parallel.i_skipped]
+
+        s_msg = 'MAME xml dat read in parallel is different from the serial read'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_xml_chunks(self):
+        """
+        Test to check the chunks of a MAME xml are contiguous and start at <machine> elements.
+        :return: Nothing.
+        """
+        with open(self._s_file, 'rb') as o_file:
+            x_data = o_file.read()
+
+        i_first = x_data.find(b'<machine')
+        i_last = x_data.rfind(b'</mame>')
+        lti_chunks = dat_files._xml_chunks(x_data, dat_files._o_XML_MACHINE_REGEX, i_first, i_last, 12)
+
+        lx_expect = [12, i_first, i_last, True, True]
+        lx_actual = [len(lti_chunks), lti_chunks[0][0], lti_chunks[-1][1],
+                     all(lti_chunks[i_chunk][1] == lti_chunks[i_chunk + 1][0] for i_chunk in range(11)),
+                     all(x_data.startswith(b'<machine', i_start) for i_start, _ in lti_chunks)]
+
+        s_msg = 'Chunks of the MAME xml dat are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatReadMameTags(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+        self._s_file = os.path.join(self._s_tmp_dir, 'mame.xml')
+        with open(self._s_file, 'w', encoding='utf8') as o_file:
+            o_file.write(_s_MAME_XML)
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def test_skip_regex(self):
+        """
+        Test to check the unwanted children of the machines are removed, including the ones with nested elements.
+        :return: Nothing.
+        """
+        x_machine = (b'<machine name="a"><description>A</description><rom name="a.1" size="1"/>'
+                     b'<chip type="cpu" tag="maincpu"/><display tag="screen" refresh="60/1"/>'
+                     b'<input players="2"><control type="joy"/></input>'
+                     b'<dipswitch name="Coinage"><dipvalue name="1C_1C"/><dipvalue name="2C_1C"/></dipswitch>'
+                     b'<device_ref name="z80"/><romfoo/></machine>')
+
+        lx_expect = [(b'<machine name="a"><description>A</description><rom name="a.1" size="1"/>'
+                      b'<device_ref name="z80"/></machine>', 5),
+                     (b'<machine name="a"><description>A</description></machine>', 7)]
+        lx_actual = [dat_files._xml_skip_regex(dat_files._ts_MAME_TAGS).subn(b'', x_machine),
+                     dat_files._xml_skip_regex(('description',)).subn(b'', x_machine)]
+
+        s_msg = 'Unwanted children of the machines are not removed as expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_iter_xml_blocks(self):
+        """
+        Test to check MAME xml dats are split in blocks just before the <machine> elements.
+        :return: Nothing.
+        """
+        with open(self._s_file, 'rb') as o_file:
+            x_data = o_file.read()
+            o_file.seek(0)
+            lx_blocks = list(dat_files._iter_xml_blocks(o_file, pi_size=64))
+
+        lx_expect = [x_data, 3, True]
+        lx_actual = [b''.join(lx_blocks), len(lx_blocks),
+                     all(x_block.startswith(b'<machine') for x_block in lx_blocks[1:])]
+
+        s_msg = 'Blocks of the MAME xml dat are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_read_default_tags(self):
+        """
+        Test to check the elements not used by the Dat are skipped and counted, also when the Dat is loaded from the
+        cache, and the data is complete.
+        :return: Nothing.
+        """
+        s_cache_dir = os.path.join(self._s_tmp_dir, 'cache')
+        o_dat = dat_files.Dat(self._s_file, ps_cache_dir=s_cache_dir)
+        o_cached_dat = dat_files.Dat(self._s_file, ps_cache_dir=s_cache_dir)
+        o_romset = o_dat.get_romset_by_name('005')
+
+        lx_expect = [1, 1, 0, 3, '1981', 'Sega', '005']
+        lx_actual = [o_dat.i_skipped, o_cached_dat.i_skipped, dat_files.Dat(self._s_file, pb_lazy=True).i_skipped,
+                     o_romset.i_droms, o_romset.s_year, o_romset.s_auth, o_romset.s_sampleof]
+
+        s_msg = 'MAME xml dat read skipping unused elements is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_read_without_description(self):
+        """
+        Test to check the ROMsets of MAME xml dats read without descriptions (normal, cached and lazy reads) can be
+        iterated, sorted and written.
+        :return: Nothing.
+        """
+        s_cache_dir = os.path.join(self._s_tmp_dir, 'cache')
+        ts_tags = ('rom',)
+
+        lx_expect = [(['005', 'ym2151'], ['', ''], 3, 1)] * 3
+        lx_actual = []
+        for o_dat in (dat_files.Dat(self._s_file, pts_tags=ts_tags, ps_cache_dir=s_cache_dir),
+                      dat_files.Dat(self._s_file, pts_tags=ts_tags, ps_cache_dir=s_cache_dir),
+                      dat_files.Dat(self._s_file, pts_tags=ts_tags, pb_lazy=True)):
+            o_dat.write_dat(io.StringIO(), 'xml')
+            lx_actual.append((sorted(o_romset.s_name for o_romset in o_dat), [o_romset.s_desc for o_romset in o_dat],
+                              o_dat.get_romset_by_name('005').i_droms, o_dat.i_baddumps))
+
+        s_msg = 'MAME xml dat read without descriptions is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_read_selected_tags(self):
+        """
+        Test to check just the selected children of the machines are read, in normal, lazy and cached reads, and the
+        snapshots of partial reads don't replace the complete ones in the cache.
+        :return: Nothing.
+        """
+        s_cache_dir = os.path.join(self._s_tmp_dir, 'cache')
+        ts_tags = ('description',)
+
+        lx_expect = [(2, 0, 'Yamaha YM2151 OPM', '')] * 3 + [3]
+        lx_actual = []
+        for o_dat in (dat_files.Dat(self._s_file, pts_tags=ts_tags, ps_cache_dir=s_cache_dir),
+                      dat_files.Dat(self._s_file, pts_tags=ts_tags, ps_cache_dir=s_cache_dir),
+                      dat_files.Dat(self._s_file, pts_tags=ts_tags, pb_lazy=True)):
+            lx_actual.append((len(o_dat), o_dat.get_romset_by_name('005').i_droms,
+                              o_dat.get_romset_by_name('ym2151').s_desc, o_dat.get_romset_by_name('005').s_year))
+        lx_actual.append(dat_files.Dat(self._s_file, ps_cache_dir=s_cache_dir).get_romset_by_name('005').i_droms)
+
+        s_msg = 'MAME xml dat read with a selection of elements is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatDiff(unittest.TestCase):
+    def setUp(self):
+        self._o_old_dat = dat_files.Dat(_s_MDR_DAT)
+        self._o_new_dat = dat_files.Dat(_s_MDR_DAT)
+        self._o_new_dat.s_version = 'new version'
+
+        # The first ROMsets of the new version are removed, renamed, changed and added
+        self._ls_names = [o_romset.s_name for o_romset in self._o_old_dat.iter_unordered()][:3]
+        s_removed, s_renamed, s_changed = self._ls_names
+
+        self._o_new_dat.del_romset(s_removed)
+
+        o_renamed = dat_files.RomSet('Renamed', 'Renamed')
+        for o_rom in self._o_new_dat.get_romset_by_name(s_renamed):
+            o_renamed.add_rom(o_rom)
+        self._o_new_dat.del_romset(s_renamed)
+        self._o_new_dat.add_romset(o_renamed)
+
+        o_rom = dat_files.Rom()
+        o_rom.s_name = 'extra.bin'
+        o_rom.s_crc32 = '01020304'
+        self._o_new_dat.get_romset_by_name(s_changed).add_rom(o_rom)
+
+        self._o_new_dat.add_romset(dat_files.RomSet('Added', 'Added'))
+
+    def test_get_diff(self):
+        """
+        Test to check the differences between two versions of a Dat.
+        :return: Nothing.
+        """
+        o_diff = self._o_old_dat.get_diff(self._o_new_dat)
+        o_old_changed, o_new_changed = o_diff.lto_changed[0]
+
+        lx_expect = [4, ['Added'], [self._ls_names[0]], [(self._ls_names[1], 'Renamed')],
+                     [(self._ls_names[2], self._ls_names[2])], (['extra.bin'], []), 'new version']
+        lx_actual = [len(o_diff),
+                     [o_romset.s_name for o_romset in o_diff.lo_added],
+                     [o_romset.s_name for o_romset in o_diff.lo_removed],
+                     [(o_old.s_name, o_new.s_name) for o_old, o_new in o_diff.lto_renamed],
+                     [(o_old.s_name, o_new.s_name) for o_old, o_new in o_diff.lto_changed],
+                     tuple([o_rom.s_name for o_rom in lo_roms]
+                           for lo_roms in o_diff.get_rom_changes(o_old_changed, o_new_changed)),
+                     o_diff.tx_header[2]]
+
+        s_msg = 'Differences between two versions of a Dat are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertEqual(0, len(self._o_new_dat.get_diff(self._o_new_dat)))
+
+    def test_apply_diff(self):
+        """
+        Test to check a Dat is equal to the new version after applying the differences.
+        :return: Nothing.
+        """
+        self._o_old_dat.apply_diff(self._o_old_dat.get_diff(self._o_new_dat))
+
+        lx_expect = [self._o_new_dat.s_version, sorted(self._o_new_dat._to_snapshot()[1])]
+        lx_actual = [self._o_old_dat.s_version, sorted(self._o_old_dat._to_snapshot()[1])]
+
+        s_msg = 'Dat with the differences applied is not equal to the new version'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatSetOperations(unittest.TestCase):
+    def setUp(self):
+        # A: romsets a, b, c, d (d without ROMs) - B: romsets a, c (renamed to c2), e, d (without ROMs)
+        self._o_dat_a = dat_files.Dat()
+        self._o_dat_a.s_name = 'Dat A'
+        self._o_dat_b = dat_files.Dat()
+        for o_dat, ts_romsets in ((self._o_dat_a, (('a', '00000001'), ('b', '00000002'), ('c', '00000003'), ('d', ''))),
+                                  (self._o_dat_b, (('a', '00000001'), ('c2', '00000003'), ('e', '00000005'),
+                                                   ('d', '')))):
+            for s_name, s_crc32 in ts_romsets:
+                o_romset = dat_files.RomSet(s_name, s_name.upper())
+                if s_crc32:
+                    o_rom = dat_files.Rom()
+                    o_rom.s_name = '%s.bin' % s_name
+                    o_rom.s_crc32 = s_crc32
+                    o_rom.i_size = 1
+                    o_romset.add_rom(o_rom)
+                o_dat.add_romset(o_romset)
+
+    @staticmethod
+    def _names(po_view):
+        return sorted(o_romset.s_name for o_romset in po_view.iter_unordered())
+
+    def test_set_operations_by_name(self):
+        """
+        Test to check the set operations between Dats matching ROMsets by name.
+        :return: Nothing.
+        """
+        lx_expect = [['a', 'b', 'c', 'c2', 'd', 'e'], ['a', 'd'], ['b', 'c'], ['b', 'c', 'c2', 'e']]
+        lx_actual = [self._names(self._o_dat_a.union(self._o_dat_b)),
+                     self._names(self._o_dat_a.intersection(self._o_dat_b)),
+                     self._names(self._o_dat_a.difference(self._o_dat_b)),
+                     self._names(self._o_dat_a.symmetric_difference(self._o_dat_b))]
+
+        s_msg = 'Set operations between Dats by name are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_set_operations_by_crc32(self):
+        """
+        Test to check the set operations between Dats matching ROMsets by clean CRC32. ROMsets without ROMs never match.
+        :return: Nothing.
+        """
+        lx_expect = [['a', 'b', 'c', 'd', 'd', 'e'], ['a', 'c'], ['b', 'd'], ['b', 'd', 'd', 'e']]
+        lx_actual = [self._names(self._o_dat_a.union(self._o_dat_b, ps_key='s_ccrc32')),
+                     self._names(self._o_dat_a.intersection(self._o_dat_b, ps_key='s_ccrc32')),
+                     self._names(self._o_dat_a.difference(self._o_dat_b, ps_key='s_ccrc32')),
+                     self._names(self._o_dat_a.symmetric_difference(self._o_dat_b, ps_key='s_ccrc32'))]
+
+        s_msg = 'Set operations between Dats by clean CRC32 are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertRaises(ValueError, self._o_dat_a.union, self._o_dat_b, 's_desc')
+
+    def test_view(self):
+        """
+        Test to check the views of set operations share the ROMsets of the Dats and can be converted to Dats.
+        :return: Nothing.
+        """
+        o_view = self._o_dat_a.union(self._o_dat_b, ps_key='s_ccrc32')
+        o_dat = o_view.to_dat()
+
+        lx_expect = [6, ['A', 'B', 'C', 'D', 'D', 'E'], True, 'Dat A', ['a', 'b', 'c', 'd', 'e'], True]
+        lx_actual = [len(o_view),
+                     [o_romset.s_desc for o_romset in o_view],
+                     next(o_view.iter_unordered()) is self._o_dat_a.get_romset_by_name('a'),
+                     o_dat.s_name,
+                     sorted(o_romset.s_name for o_romset in o_dat.iter_unordered()),
+                     o_dat.get_romset_by_name('d') is self._o_dat_a.get_romset_by_name('d')]
+
+        s_msg = 'View of a set operation between Dats is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatQuery(unittest.TestCase):
+    def setUp(self):
+        self._o_dat = dat_files.Dat()
+        for s_name, s_desc, s_year, s_auth in (('sf2', 'Street Fighter II', '1991', 'Capcom'),
+                                               ('sf2ce', 'Street Fighter II CE', '1992', 'Capcom'),
+                                               ('ffight', 'Final Fight', '1989', 'Capcom'),
+                                               ('mslug', 'Metal Slug', '1996', 'Nazca'),
+                                               ('tetris', 'Tetris', '1988', 'Atari Games'),
+                                               ('proto', 'Unknown prototype', '', '')):
+            o_romset = dat_files.RomSet(s_name, s_desc)
+            o_romset.s_year = s_year
+            o_romset.s_auth = s_auth
+            self._o_dat.add_romset(o_romset)
+
+    def _names(self, po_query):
+        return sorted(o_romset.s_name for o_romset in self._o_dat.query(po_query).iter_unordered())
+
+    def test_query_without_compile(self):
+        """
+        Test to check queries not implementing compile() can't be created.
+        :return: Nothing.
+        """
+        class _NoCompileQuery(dat_files._Query):
+            pass
+
+        self.assertRaises(TypeError, _NoCompileQuery)
+        self.assertEqual(['sf2'], self._names(dat_files.Filter('s_name', 'equals', 'sf2')))
+
+    def test_query_methods(self):
+        """
+        Test to check the different methods of the filters.
+        :return: Nothing.
+        """
+        lx_expect = [['sf2', 'sf2ce'], ['ffight', 'sf2', 'sf2ce'], ['ffight', 'sf2', 'sf2ce'], ['mslug'],
+                     ['sf2', 'sf2ce', 'tetris'], ['sf2', 'sf2ce']]
+        lx_actual = [self._names(dat_files.Filter('s_year', 'equals', '1991', '1992')),
+                     self._names(dat_files.Filter('s_auth', 'in', 'Capcom')),
+                     self._names(dat_files.Filter('s_year', 'range', '1989', '1992')),
+                     self._names(dat_files.Filter('s_year', 'range', '1993', None)),
+                     self._names(dat_files.Filter('s_desc', 'regex', 'Fighter II', '^Tet')),
+                     self._names(dat_files.Filter('s_name', 'prefix', 'sf'))]
+
+        s_msg = 'ROMsets found by the filters are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertRaises(ValueError, dat_files.Filter, 's_year', 'contains', '1991')
+        self.assertRaises(ValueError, dat_files.Filter, 's_year', 'range', '1991')
+
+    def test_query_groups(self):
+        """
+        Test to check filters combined with and/or/not give the same results with and without indexes.
+        :return: Nothing.
+        """
+        o_capcom = dat_files.Filter('s_auth', 'equals', 'Capcom')
+        o_nineties = dat_files.Filter('s_year', 'range', '1990', '1999')
+        o_fighter = dat_files.Filter('s_desc', 'regex', 'Fight')
+
+        lx_expect = [['sf2', 'sf2ce'], ['ffight', 'mslug', 'sf2', 'sf2ce'], ['ffight', 'proto', 'tetris'],
+                     ['ffight'], ['ffight', 'mslug', 'sf2', 'sf2ce', 'tetris']]
+        for _ in range(2):
+            lx_actual = [self._names(o_capcom & o_nineties & o_fighter),
+                         self._names(o_capcom | o_nineties),
+                         self._names(~o_nineties),
+                         self._names(dat_files.FilterGroup('and', o_fighter, ~o_nineties)),
+                         self._names(o_capcom | o_nineties | dat_files.Filter('s_name', 'equals', 'tetris'))]
+
+            s_msg = 'ROMsets found by the groups of filters are not what was expected'
+            self.assertEqual(lx_expect, lx_actual, s_msg)
+
+            # Second round with all the indexes already built
+            for s_field in ('s_year', 's_desc', 's_auth', 's_name'):
+                self._o_dat._get_index(s_field)
+
+    def test_explain(self):
+        """
+        Test to check the explanation of how queries are resolved.
+        :return: Nothing.
+        """
+        o_query = dat_files.Filter('s_year', 'range', '1991', '1992') & dat_files.Filter('s_desc', 'regex', 'Fight')
+
+        # Only equals/in filters build indexes, the rest of them use the indexes already built
+        lx_expect = [['AND: SCAN', '  SCAN', '  SCAN'], ['AND: INDEX', '  INDEX', '  SCAN'],
+                     ['AND: INDEX', '  INDEX', '  INDEX']]
+        lx_actual = []
+        for s_field in ('', 's_year', 's_desc'):
+            if s_field:
+                self._o_dat._get_index(s_field)
+            lx_actual.append([s_line.partition(' s_')[0].partition(' of')[0]
+                              for s_line in self._o_dat.explain(o_query).splitlines()])
+
+        s_msg = 'Explanation of the query is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_filter(self):
+        """
+        Test to check the Dat is split in the matching and not matching ROMsets.
+        :return: Nothing.
+        """
+        o_matched, o_unmatched = self._o_dat.filter(dat_files.Filter('s_year', 'equals', '1991', '1992'))
+
+        lx_expect = [['sf2', 'sf2ce'], ['ffight', 'mslug', 'proto', 'tetris']]
+        lx_actual = [sorted(o_romset.s_name for o_romset in o_matched),
+                     sorted(o_romset.s_name for o_romset in o_unmatched)]
+
+        s_msg = 'ROMsets matched and unmatched by the filter are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatWrite(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def _write_read(self, po_dat, ps_format):
+        s_file = os.path.join(self._s_tmp_dir, 'output.dat')
+        po_dat.save_to_dat(s_file, ps_format)
+        return dat_files.Dat(s_file)
+
+    @staticmethod
+    def _sorted_snapshot(po_dat):
+        # Writers sort the ROMsets by description, so the order is different from the original file
+        tx_header, ltx_romsets = po_dat._to_snapshot()
+        return tx_header, sorted(ltx_romsets)
+
+    def test_round_trip_xml(self):
+        """
+        Test to check a generic xml dat written in xml format and read back contains the same data.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat(_s_MDR_DAT)
+        o_dat.get_romset_by_name('[BIOS] Mega-CD (Europe)').s_year = '1992'
+        o_dat.get_romset_by_name('[BIOS] Mega-CD (Europe)').s_auth = 'Sega & "Co"'
+
+        s_msg = 'Data read from a written xml dat is different from the original one'
+        self.assertEqual(self._sorted_snapshot(o_dat), self._sorted_snapshot(self._write_read(o_dat, 'xml')), s_msg)
+
+    def test_round_trip_cmp(self):
+        """
+        Test to check a ClrMamePro dat written in ClrMamePro format and read back contains the same data.
+        :return: Nothing.
+        """
+        s_file = os.path.join(self._s_tmp_dir, 'test.dat')
+        with open(s_file, 'w', encoding='utf8') as o_file:
+            o_file.write(_s_CMP_DAT)
+        o_dat = dat_files.Dat(s_file)
+
+        s_msg = 'Data read from a written ClrMamePro dat is different from the original one'
+        self.assertEqual(self._sorted_snapshot(o_dat), self._sorted_snapshot(self._write_read(o_dat, 'cmp')), s_msg)
+
+    def test_round_trip_cmp_texts(self):
+        """
+        Test to check texts with parentheses, quotes and other symbols are kept when written in ClrMamePro format, and
+        texts with double quotes (ClrMamePro can't escape them) are rejected without touching the existing file.
+        :return: Nothing.
+        """
+        s_file = os.path.join(self._s_tmp_dir, 'output.dat')
+        with open(s_file, 'w', encoding='utf8') as o_file:
+            o_file.write(_s_CMP_DAT)
+        o_dat = dat_files.Dat(s_file)
+        o_romset = o_dat.get_romset_by_name('Game B')
+        o_romset.s_auth = 'Sega (Japan) & Co\'s'
+        o_dat.s_comment = 'Comment (with parentheses) & \'quotes\''
+
+        o_written_dat = self._write_read(o_dat, 'cmp')
+
+        lx_expect = [self._sorted_snapshot(o_dat), True]
+        lx_actual = [self._sorted_snapshot(o_written_dat)]
+
+        o_romset.s_desc = 'Say "Hi"'
+        self.assertRaises(ValueError, o_dat.save_to_dat, s_file, 'cmp')
+        lx_actual.append(self._sorted_snapshot(dat_files.Dat(s_file)) == lx_expect[0] and
+                         os.listdir(self._s_tmp_dir) == ['output.dat'])
+
+        s_msg = 'Texts written in ClrMamePro format are not read back as expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_round_trip_mame_to_xml(self):
+        """
+        Test to check the ROMsets of a MAME xml dat written in generic xml and ClrMamePro formats and read back, bios
+        ROMs included (they are not part of the clean hashes).
+        :return: Nothing.
+        """
+        s_file = os.path.join(self._s_tmp_dir, 'mame.xml')
+        with open(s_file, 'w', encoding='utf8') as o_file:
+            o_file.write(_s_MAME_XML)
+        o_dat = dat_files.Dat(s_file)
+
+        o_romset = o_dat.get_romset_by_name('005')
+        o_xml_dat = self._write_read(o_dat, 'xml')
+
+        lx_expect = [self._sorted_snapshot(o_dat)[1]]
+        lx_actual = [self._sorted_snapshot(o_xml_dat)[1]]
+        for o_written_dat in (o_xml_dat, self._write_read(o_dat, 'cmp')):
+            o_written_romset = o_written_dat.get_romset_by_name('005')
+            lx_expect.append([[o_rom.b_bios for o_rom in o_romset], 2, o_romset.s_ccrc32])
+            lx_actual.append([[o_rom.b_bios for o_rom in o_written_romset], o_written_romset.i_croms,
+                              o_written_romset.s_ccrc32])
+
+        s_msg = 'ROMsets read from a MAME dat written in xml and cmp formats are different from the original ones'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_write_dat_to_file_object(self):
+        """
+        Test to check dats can be written to any file object, and unknown formats are rejected.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat(_s_MDR_DAT)
+        o_buffer = io.StringIO()
+        o_dat.write_dat(o_buffer, 'cmp')
+
+        lx_expect = [True, o_dat.i_romsets]
+        lx_actual = [o_buffer.getvalue().startswith('clrmamepro (\n\tname "Sega - Mega Drive - Genesis"'),
+                     o_buffer.getvalue().count('\ngame (\n')]
+
+        s_msg = 'Dat written to a file object is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertRaises(ValueError, o_dat.write_dat, o_buffer, 'csv')
+
+
+class TestClassDatIdentify(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+
+        self._o_dat = dat_files.Dat()
+        # "game b" has the same CRC32 as "game c" (a collision), but a different SHA1
+        for s_name, x_data, x_crc32_data in (('game a', b'AAAA' * 64, b'AAAA' * 64),
+                                             ('game b', b'BBBB' * 64, b'CCCC' * 64),
+                                             ('game c', b'CCCC' * 64, b'CCCC' * 64),
+                                             ('game d', b'DDDD' * 32, b'DDDD' * 32)):
+            o_rom = dat_files.Rom()
+            o_rom.s_name = f'{s_name}.bin'
+            o_rom.i_size = len(x_data)
+            o_rom.s_crc32 = '%08x' % zlib.crc32(x_crc32_data)
+            o_rom.s_sha1 = hashlib.sha1(x_data).hexdigest()
+            o_romset = dat_files.RomSet(s_name, s_name.title())
+            o_romset.add_rom(o_rom)
+            self._o_dat.add_romset(o_romset)
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def _write_file(self, ps_name, px_data):
+        s_file = os.path.join(self._s_tmp_dir, ps_name)
+        with open(s_file, 'wb') as o_file:
+            o_file.write(px_data)
+        return s_file
+
+    def test_get_romsets_by_size(self):
+        """
+        Test to check ROMsets are found by their clean size.
+        :return: Nothing.
+        """
+        lx_expect = [['game a', 'game b', 'game c'], ['game d'], []]
+        lx_actual = [[o_romset.s_name for o_romset in self._o_dat.get_romsets_by_size(i_size)]
+                     for i_size in (256, 128, 100)]
+
+        s_msg = 'ROMsets found by size are not the expected ones'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_identify_renamed_file(self):
+        """
+        Test to check a renamed file is identified by its content, and files not in the dat are not.
+        :return: Nothing.
+        """
+        lx_expect = ['game a', 'game d', None, None]
+        lx_actual = [getattr(self._o_dat.identify_file(self._write_file(s_name, x_data)), 's_name', None)
+                     for s_name, x_data in (('renamed.bin', b'AAAA' * 64),
+                                            ('other.bin', b'DDDD' * 32),
+                                            ('same size.bin', b'XXXX' * 64),
+                                            ('other size.bin', b'AAAA' * 10))]
+
+        s_msg = 'ROMsets identified by the content of the files are not the expected ones'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_identify_shared_crc32(self):
+        """
+        Test to check files are resolved by SHA1 when several candidates share the same CRC32.
+        :return: Nothing.
+        """
+        lx_expect = ['game c', None]
+        lx_actual = [getattr(self._o_dat.identify_file(self._write_file(s_name, x_data)), 's_name', None)
+                     for s_name, x_data in (('c.bin', b'CCCC' * 64), ('b.bin', b'BBBB' * 64))]
+
+        s_msg = 'ROMsets sharing the CRC32 were not resolved by SHA1'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def _write_zip(self, ps_name, pltx_members, pi_compression=zipfile.ZIP_DEFLATED):
+        s_file = os.path.join(self._s_tmp_dir, ps_name)
+        with zipfile.ZipFile(s_file, 'w', compression=pi_compression) as o_zip:
+            for s_member, x_data in pltx_members:
+                o_zip.writestr(s_member, x_data)
+        return s_file
+
+    @staticmethod
+    def _get_read_bytes():
+        with open('/proc/self/io') as o_file:
+            for s_line in o_file:
+                if s_line.startswith('rchar:'):
+                    return int(s_line.split()[1])
+
+    def test_identify_zip(self):
+        """
+        Test to check zip archives are identified by the files inside them, ignoring their names and .cue files. Files
+        inside zip archives are compared by CRC32 only, so "game b" is found for the CRC32 it shares with "game c".
+        :return: Nothing.
+        """
+        s_zip = self._write_zip('a.zip', [('renamed.bin', b'AAAA' * 64), ('track.cue', b'FILE')])
+
+        lx_expect = [[('renamed.bin', 256, '%08x' % zlib.crc32(b'AAAA' * 64))], 'game a', 'game d', None, None,
+                     'game b']
+        lx_actual = [dat_files.read_zip_members(s_zip), self._o_dat.identify_file(s_zip).s_name]
+        lx_actual += [getattr(self._o_dat.identify_file(self._write_zip(s_name, ltx_members)), 's_name', None)
+                      for s_name, ltx_members in (('d.ZIP', [('dir/other.bin', b'DDDD' * 32)]),
+                                                  ('two.zip', [('1.bin', b'DDDD' * 32), ('2.bin', b'DDDD' * 32)]),
+                                                  ('empty.zip', []),
+                                                  ('collision.zip', [('c.bin', b'CCCC' * 64)]))]
+
+        s_msg = 'ROMsets identified by the files inside zip archives are not the expected ones'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    @unittest.skipUnless(os.path.isfile('/proc/self/io'), 'Bytes read by the process are not available')
+    def test_identify_zip_read_bytes(self):
+        """
+        Test to check just the directory of a zip archive is read to identify it, not the files inside it.
+        :return: Nothing.
+        """
+        x_data = os.urandom(4 * 1024 * 1024)
+        o_rom = dat_files.Rom()
+        o_rom.s_name = 'big.md'
+        o_rom.i_size = len(x_data)
+        o_rom.s_crc32 = '%08x' % zlib.crc32(x_data)
+        o_romset = dat_files.RomSet('big game', 'Big Game')
+        o_romset.add_rom(o_rom)
+        self._o_dat.add_romset(o_romset)
+        s_file = self._write_zip('my big game.zip', [('my big game.md', x_data)], pi_compression=zipfile.ZIP_STORED)
+
+        i_read_bytes = self._get_read_bytes()
+        o_found = self._o_dat.identify_file(s_file)
+        i_read_bytes = self._get_read_bytes() - i_read_bytes
+
+        s_msg = f'Zip archive was not identified reading less than 64 KiB (read {i_read_bytes} bytes)'
+        self.assertEqual('big game', getattr(o_found, 's_name', None), s_msg)
+        self.assertLess(i_read_bytes, 64 * 1024, s_msg)
+
+
+class TestClassCatVer(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+        self._ds_files = {}
+        for s_name, s_data in (('catver.ini', _s_CATVER_INI),
+                               ('nplayers.ini', _s_NPLAYERS_INI),
+                               ('genre.ini', _s_GENRE_INI)):
+            self._ds_files[s_name] = os.path.join(self._s_tmp_dir, s_name)
+            with open(self._ds_files[s_name], 'w', encoding='utf8') as o_file:
+                o_file.write(s_data)
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def test_read(self):
+        """
+        Test to check the heading and entries of a catver.ini file are read.
+        :return: Nothing.
+        """
+        o_catver = dat_files.CatVer(self._ds_files['catver.ini'])
+        o_entry = o_catver.get_entry('1942')
+
+        lx_expect = ['CatVer 0.245', '28-Jun-22', 'MAME 0.245', 4, '1942', 'shooter', 'flying vertical', '.036', '']
+        lx_actual = [o_catver.s_version, o_catver.s_date, o_catver.s_mame, o_catver.i_entries, o_entry.s_romset,
+                     o_entry.s_cat_1st, o_entry.s_cat_2nd, o_entry.s_version, o_catver.get_entry('ym2151').s_cat_2nd]
+
+        s_msg = 'Data read from catver.ini is not the expected one'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_read_folder_sections(self):
+        """
+        Test to check the keys of sections without ROMsets information (e.g. [FOLDER_SETTINGS]) are not read as entries.
+        :return: Nothing.
+        """
+        o_catver = dat_files.CatVer(self._ds_files['catver.ini'], ps_cache_dir=self._s_tmp_dir)
+        o_cached = dat_files.CatVer(self._ds_files['catver.ini'], ps_cache_dir=self._s_tmp_dir)
+
+        ls_romsets = ['005', '1942', 'pacman', 'ym2151']
+        lx_expect = [4, ls_romsets, 4, ls_romsets]
+        lx_actual = [o_catver.i_entries, sorted(o_entry.s_romset for o_entry in o_catver),
+                     o_cached.i_entries, sorted(o_entry.s_romset for o_entry in o_cached)]
+
+        s_msg = 'Keys of catver.ini sections without ROMsets were read as entries'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertRaises(KeyError, o_catver.get_entry, 'rootfoldericon')
+
+    def test_get_romsets_by_category(self):
+        """
+        Test to check ROMsets are found by main or secondary category.
+        :return: Nothing.
+        """
+        o_catver = dat_files.CatVer(self._ds_files['catver.ini'])
+
+        lx_expect = [['005', 'pacman'], ['005', '1942'], ['005', '1942', 'pacman'], []]
+        lx_actual = [o_catver.get_romsets_by_category('Maze'),
+                     o_catver.get_romsets_by_category(' shooter small', 'SHOOTER'),
+                     o_catver.get_romsets_by_category('collect', 'shooter', 'maze'),
+                     o_catver.get_romsets_by_category('sports')]
+
+        s_msg = 'ROMsets found by category are not the expected ones'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_cache(self):
+        """
+        Test to check a catver.ini file read from the cache is the same as the one parsed.
+        :return: Nothing.
+        """
+        o_catver = dat_files.CatVer(self._ds_files['catver.ini'], ps_cache_dir=self._s_tmp_dir)
+        o_cached = dat_files.CatVer(self._ds_files['catver.ini'], ps_cache_dir=self._s_tmp_dir)
+
+        lx_expect = [True, str(o_catver), [str(o_entry) for o_entry in o_catver],
+                     o_catver.get_romsets_by_category('maze')]
+        lx_actual = [os.path.isfile(dat_files._cache_path(self._s_tmp_dir, self._ds_files['catver.ini'], 'catver')),
+                     str(o_cached), [str(o_entry) for o_entry in o_cached], o_cached.get_romsets_by_category('maze')]
+
+        s_msg = 'catver.ini read from the cache is different from the parsed one'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_mame_ini(self):
+        """
+        Test to check nplayers.ini and genre.ini layouts are read and indexed.
+        :return: Nothing.
+        """
+        o_nplayers = dat_files.MameIni(self._ds_files['nplayers.ini'], ps_cache_dir=self._s_tmp_dir)
+        o_cached = dat_files.MameIni(self._ds_files['nplayers.ini'], ps_cache_dir=self._s_tmp_dir)
+        o_genre = dat_files.MameIni(self._ds_files['genre.ini'])
+
+        lx_expect = ['NPlayers 0.245', '2P alt', ['005', '1942', 'pacman'], list(o_nplayers), 3, 'Shooter',
+                     ['005', 'pacman']]
+        lx_actual = [o_nplayers.s_version, o_nplayers.get_value('1942'), o_nplayers.get_romsets('2p ALT'),
+                     list(o_cached), o_genre.i_entries, o_genre.get_value('1942'), o_genre.get_romsets('maze')]
+
+        s_msg = 'Data read from nplayers.ini and genre.ini is not the expected one'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatReadCompressed(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def _compress(self, ps_file, ps_compression, ps_name):
+        """
+        Method to create a compressed copy of a file in the temp dir.
+        """
+        with open(ps_file, 'rb') as o_file:
+            x_data = o_file.read()
+
+        s_file = os.path.join(self._s_tmp_dir, ps_name)
+        if ps_compression == 'zip':
+            with zipfile.ZipFile(s_file, 'w', compression=zipfile.ZIP_DEFLATED) as o_zip:
+                o_zip.writestr('readme.txt', 'Not a dat')
+                o_zip.writestr(os.path.basename(ps_file), x_data)
+        elif ps_compression == 'gzip':
+            with gzip.open(s_file, 'wb') as o_file:
+                o_file.write(x_data)
+        else:
+            with lzma.open(s_file, 'wb') as o_file:
+                o_file.write(x_data)
+
+        return s_file
+
+    def test_read_mdr_crt(self):
+        """
+        Test to check mdr-crt.dat compressed with zip, gzip and xz is read like the plain file.
+        :return: Nothing.
+        """
+        tx_snapshot = dat_files.Dat(_s_MDR_DAT)._to_snapshot()
+
+        lx_expect = [tx_snapshot] * 4
+        lx_actual = [dat_files.Dat(self._compress(_s_MDR_DAT, 'zip', 'mdr-crt.zip'))._to_snapshot(),
+                     dat_files.Dat(self._compress(_s_MDR_DAT, 'gzip', 'mdr-crt.dat.gz'))._to_snapshot(),
+                     dat_files.Dat(self._compress(_s_MDR_DAT, 'xz', 'mdr-crt.dat.xz'))._to_snapshot(),
+                     dat_files.Dat(self._compress(_s_MDR_DAT, 'gzip', 'no-extension'), pb_lazy=True)._to_snapshot()]
+
+        s_msg = 'Compressed mdr-crt.dat is not read like the plain file'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_read_cmp_and_mame(self):
+        """
+        Test to check compressed ClrMamePro and MAME xml dats are read like the plain files.
+        :return: Nothing.
+        """
+        lx_expect = []
+        lx_actual = []
+        for s_name, s_data in (('test.dat', _s_CMP_DAT), ('mame.xml', _s_MAME_XML)):
+            s_file = os.path.join(self._s_tmp_dir, s_name)
+            with open(s_file, 'w', encoding='utf8') as o_file:
+                o_file.write(s_data)
+
+            o_dat = dat_files.Dat(s_file)
+            o_compressed_dat = dat_files.Dat(self._compress(s_file, 'xz', s_name + '.xz'))
+            lx_expect.append((o_dat.s_type, o_dat._to_snapshot()))
+            lx_actual.append((o_compressed_dat.s_type, o_compressed_dat._to_snapshot()))
+
+        s_msg = 'Compressed ClrMamePro and MAME dats are not read like the plain files'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_cache(self):
+        """
+        Test to check the snapshot of a compressed dat is stored in the cache dir.
+        :return: Nothing.
+        """
+        s_file = self._compress(_s_MDR_DAT, 'zip', 'mdr-crt.zip')
+        o_dat = dat_files.Dat(s_file, ps_cache_dir=self._s_tmp_dir)
+
+        lx_expect = [o_dat._to_snapshot() + (0,)]
+        lx_actual = [dat_files._cache_read(self._s_tmp_dir, s_file, 'dat')]
+
+        s_msg = 'Snapshot of the compressed dat was not cached'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatDependencies(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+        self._s_xml = os.path.join(self._s_tmp_dir, 'mame.xml')
+        with open(self._s_xml, 'w', encoding='utf8') as o_file:
+            o_file.write(_s_MAME_GRAPH_XML)
+        self._o_dat = dat_files.Dat(self._s_xml)
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    @staticmethod
+    def _files(pdto_files):
+        return {s_archive: sorted(o_rom.s_name for o_rom in to_roms) for s_archive, to_roms in pdto_files.items()}
+
+    def test_read_links(self):
+        """
+        Test to check the relations between ROMsets are read from MAME dats and kept when written as xml and cmp.
+        :return: Nothing.
+        """
+        o_romset = self._o_dat.get_romset_by_name('mslugb')
+
+        lx_expect = ['mslug', 'mslug', ('ng_memcard', 'z80'), 'sp-s2.sp1']
+        lx_actual = [o_romset.s_cloneof, o_romset.s_romof, o_romset.ts_device_refs, o_romset._lo_roms[0].s_merge]
+
+        s_msg = 'Relations between ROMsets are not read from MAME dats'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+        s_xml = os.path.join(self._s_tmp_dir, 'output.xml')
+        s_cmp = os.path.join(self._s_tmp_dir, 'output.dat')
+        self._o_dat.save_to_dat(s_xml, 'xml')
+        self._o_dat.save_to_dat(s_cmp, 'cmp')
+
+        # Just the relations: name, ROMs "merge" field, cloneof, romof, sampleof and device references. ClrMamePro dats
+        # don't have device references.
+        def _links(po_dat, pi_fields=10):
+            return sorted((tx_romset[0], tuple(tx_rom[5] for tx_rom in tx_romset[5])) + tx_romset[6:pi_fields]
+                          for tx_romset in po_dat._to_snapshot()[1])
+
+        lx_expect = [_links(self._o_dat), _links(self._o_dat, 9)]
+        lx_actual = [_links(dat_files.Dat(s_xml)), _links(dat_files.Dat(s_cmp), 9)]
+
+        s_msg = 'Relations between ROMsets are not kept when the dat is written'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_get_dependencies(self):
+        """
+        Test to check the ROMsets each ROMset depends on.
+        :return: Nothing.
+        """
+        lx_expect = [('mslug', 'neogeo', 'ng_memcard', 'z80'),
+                     ('neogeo', 'ng_memcard', 'z80'),
+                     ('z80',),
+                     ()]
+        lx_actual = [self._o_dat.get_dependencies('mslugb'),
+                     self._o_dat.get_dependencies('mslug'),
+                     self._o_dat.get_dependencies('ng_memcard'),
+                     self._o_dat.get_dependencies('z80')]
+
+        s_msg = 'Dependencies of the ROMsets are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_get_required_files(self):
+        """
+        Test to check the files, and their archives, needed by a clone in split, merged and non-merged collections. The
+        clone renames one of the ROMs of the parent, so it has the name of the parent in split and merged collections,
+        but the name of the clone in non-merged ones.
+        :return: Nothing.
+        """
+        lx_expect = [{'mslugb': ['201-c1b.c1'],
+                      'mslug': ['201-p1.p1'],
+                      'neogeo': ['sfix.sfix', 'sp-s2.sp1'],
+                      'ng_memcard': ['memcard.bin']},
+                     {'mslug': ['201-c1b.c1', '201-p1.p1'],
+                      'neogeo': ['sfix.sfix', 'sp-s2.sp1'],
+                      'ng_memcard': ['memcard.bin']},
+                     {'mslugb': ['201-c1b.c1', '201-p1b.p1'],
+                      'neogeo': ['sfix.sfix', 'sp-s2.sp1'],
+                      'ng_memcard': ['memcard.bin']}]
+        lx_actual = [self._files(self._o_dat.get_required_files('mslugb', 'split')),
+                     self._files(self._o_dat.get_required_files('mslugb', 'merged')),
+                     self._files(self._o_dat.get_required_files('mslugb', 'non-merged'))]
+
+        s_msg = 'Files required by the clone are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertRaises(ValueError, self._o_dat.get_required_files, 'mslugb', 'full')
+
+    def test_unknown_romset(self):
+        """
+        Test to check the dependencies and required files of ROMsets not in the Dat are None, like the ROMsets.
+        :return: Nothing.
+        """
+        lx_expect = [None, None, None]
+        lx_actual = [self._o_dat.get_romset_by_name('foo'), self._o_dat.get_dependencies('foo'),
+                     self._o_dat.get_required_files('foo', 'non-merged')]
+
+        s_msg = 'Data of a ROMset not in the Dat is not None'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_required_files_cached(self):
+        """
+        Test to check the required files are cached, and the cache is discarded when ROMsets are removed.
+        :return: Nothing.
+        """
+        dto_files = self._o_dat.get_required_files('mslug')
+        b_cached = self._o_dat.get_required_files('mslug') is dto_files
+
+        self._o_dat.del_romset('ng_memcard')
+        dto_files_after = self._o_dat.get_required_files('mslug')
+
+        lx_expect = [True, ['mslug', 'neogeo']]
+        lx_actual = [b_cached, sorted(dto_files_after)]
+
+        s_msg = 'Required files are not cached or not updated after removing a ROMset'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+class TestClassDatSharedRoms(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+        self._s_xml = self._write_xml('mame.xml', pb_shared=True)
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def _write_xml(self, ps_name, pb_shared):
+        """
+        Method to write a MAME-like xml where every machine includes 8 bios ROMs (the same ones in all the machines
+        when shared, different ones otherwise) plus its own ROM. The first machine has its own ROM duplicated.
+        """
+        ls_xml = ['<?xml version="1.0"?>\n<!DOCTYPE mame [\n<!ELEMENT mame (machine+)>\n]>\n'
+                  '<mame build="0.238 (mame0238)">\n']
+        for i_machine in range(500):
+            i_bios_set = 0 if pb_shared else i_machine
+            ls_xml.append('  <machine name="game%i">\n' % i_machine)
+            ls_xml.append('    <description>Game %i</description>\n' % i_machine)
+            for i_rom in range(8):
+                i_bios = i_bios_set * 8 + i_rom
+                ls_xml.append('    <rom name="bios-%i.rom" bios="unibios" size="131072" crc="%08x" sha1="%040x" '
+                              'region="mainbios" offset="0"/>\n' % (i_bios, i_bios, i_bios))
+            ls_xml.append('    <rom name="p%i.p1" size="1024" crc="%08x"/>\n' % (i_machine, 0x10000 + i_machine))
+            if i_machine == 0:
+                ls_xml.append('    <rom name="p0.p1" size="1024" crc="00010000"/>\n')
+            ls_xml.append('  </machine>\n')
+        ls_xml.append('</mame>\n')
+
+        s_file = os.path.join(self._s_tmp_dir, ps_name)
+        with open(s_file, 'w', encoding='utf8') as o_file:
+            o_file.write(''.join(ls_xml))
+
+        return s_file
+
+    def test_roms_shared(self):
+        """
+        Test to check identical ROMs are shared between ROMsets but ROMs duplicated inside a ROMset are not, so the
+        dirty hashes still include them twice.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat(self._s_xml)
+        o_game_0 = o_dat.get_romset_by_name('game0')
+        o_game_1 = o_dat.get_romset_by_name('game1')
+        lo_roms_0 = list(o_game_0)
+        lo_roms_1 = list(o_game_1)
+
+        lx_expect = [True, False, 10, 1, False, False]
+        lx_actual = [all(o_rom_0 is o_rom_1 for o_rom_0, o_rom_1 in zip(lo_roms_0[:8], lo_roms_1[:8])),
+                     lo_roms_0[8] is lo_roms_0[9],
+                     o_game_0.i_droms,
+                     o_game_0.i_croms,
+                     hasattr(lo_roms_0[0], '__dict__'),
+                     hasattr(o_game_0, '__dict__')]
+
+        s_msg = 'Identical ROMs are not shared between ROMsets (or they are shared inside a ROMset)'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_roms_shared_all_readers(self):
+        """
+        Test to check the lazy mode and the snapshots (used by the cache and the parallel reader) share the ROMs too.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat(self._s_xml)
+        o_dat_lazy = dat_files.Dat(self._s_xml, pb_lazy=True)
+        o_dat_snapshot = dat_files.Dat()
+        o_dat_snapshot._from_snapshot(o_dat._to_snapshot())
+
+        lx_expect = [True, True, o_dat._to_snapshot(), o_dat._to_snapshot()]
+        lx_actual = []
+        for o_other_dat in (o_dat_lazy, o_dat_snapshot):
+            lx_actual.append(next(iter(o_other_dat.get_romset_by_name('game0'))) is
+                             next(iter(o_other_dat.get_romset_by_name('game499'))))
+        lx_actual.append(o_dat_lazy._to_snapshot())
+        lx_actual.append(o_dat_snapshot._to_snapshot())
+
+        s_msg = 'ROMs are not shared in lazy mode or when loading snapshots'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_memory(self):
+        """
+        Test to check the memory used by a dat with shared ROMs is less than half the one used by the same dat when
+        every ROMset has different ROMs.
+        :return: Nothing.
+        """
+        s_unshared_xml = self._write_xml('mame-unshared.xml', pb_shared=False)
+
+        li_memory = []
+        for s_file in (self._s_xml, s_unshared_xml):
+            tracemalloc.start()
+            try:
+                o_dat = dat_files.Dat(s_file)
+                li_memory.append(tracemalloc.get_traced_memory()[0])
+                del o_dat
+            finally:
+                tracemalloc.stop()
+
+        i_shared, i_unshared = li_memory
+        s_msg = f'Memory with shared ROMs ({i_shared} bytes) is not less than half of the unshared one ({i_unshared})'
+        self.assertLess(i_shared, i_unshared / 2, s_msg)
+
+
+# Main code
+#=======================================================================================================================
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+import libs.dat_files as dat_files
+import libs.hashing as hashing
+
+
+# Test cases
+#=======================================================================================================================
+class TestClassHashing(unittest.TestCase):
+    def setUp(self):
+        self._s_tmp_dir = tempfile.mkdtemp()
+        self._s_db = hashing.get_hash_cache_path(self._s_tmp_dir)
+        self._ls_files = [self._write_file('rom%i.bin' % i_file, bytes(range(i_file, 256)) * 100)
+                          for i_file in range(5)]
+
+    def tearDown(self):
+        shutil.rmtree(self._s_tmp_dir)
+
+    def _write_file(self, ps_name, px_data):
+        s_file = os.path.join(self._s_tmp_dir, ps_name)
+        with open(s_file, 'wb') as o_file:
+            o_file.write(px_data)
+        return s_file
+
+    @staticmethod
+    def _expected_hashes(ps_file):
+        with open(ps_file, 'rb') as o_file:
+            x_data = o_file.read()
+        return {'crc32': '%08x' % zlib.crc32(x_data),
+                'md5': hashlib.md5(x_data).hexdigest(),
+                'sha1': hashlib.sha1(x_data).hexdigest()}
+
+    def test_hash_file(self):
+        """
+        Test to check the hashes of a file read in several buffers.
+        :return: Nothing.
+        """
+        i_buffer_size = hashing._i_BUFFER_SIZE
+        hashing._i_BUFFER_SIZE = 1000
+        try:
+            lx_actual = [hashing.hash_file(self._ls_files[0]), hashing.hash_file(self._ls_files[0], ['crc32'])]
+        finally:
+            hashing._i_BUFFER_SIZE = i_buffer_size
+
+        ds_expect = self._expected_hashes(self._ls_files[0])
+        lx_expect = [ds_expect, {'crc32': ds_expect['crc32']}]
+
+        s_msg = 'Hashes of the file are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertRaises(ValueError, hashing.hash_file, self._ls_files[0], ['sha256'])
+
+    def test_crc32_combine(self):
+        """
+        Test to check the CRC32 of joined pieces of data is obtained from the CRC32 of the pieces.
+        :return: Nothing.
+        """
+        lx_pieces = [b'', b'a', b'emulauncher', bytes(range(256)) * 3, b'\x00' * 1000]
+
+        lx_expect = []
+        lx_actual = []
+        for x_piece1 in lx_pieces:
+            for x_piece2 in lx_pieces:
+                lx_expect.append(zlib.crc32(x_piece1 + x_piece2))
+                lx_actual.append(hashing.crc32_combine(zlib.crc32(x_piece1), zlib.crc32(x_piece2), len(x_piece2)))
+
+        s_msg = 'Combined CRC32 values are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_hash_file_parallel(self):
+        """
+        Test to check the CRC32 of big files hashed by segments in several threads.
+        :return: Nothing.
+        """
+        s_file = self._write_file('disc.iso', bytes(range(256)) * 97 + b'end')
+
+        ti_sizes = (hashing._i_BUFFER_SIZE, hashing._i_PARALLEL_MIN_SIZE)
+        hashing._i_BUFFER_SIZE, hashing._i_PARALLEL_MIN_SIZE = 1000, 1000
+        try:
+            lx_actual = [hashing.hash_file(s_file, ['crc32'], pi_workers=i_workers) for i_workers in (1, 3, 4, 100)]
+            with hashing.FileHasher(self._s_db, pi_workers=3, pts_types=('crc32',)) as o_hasher:
+                lx_actual.append(o_hasher.hash_files([s_file] + self._ls_files))
+        finally:
+            hashing._i_BUFFER_SIZE, hashing._i_PARALLEL_MIN_SIZE = ti_sizes
+
+        lx_expect = 4 * [{'crc32': self._expected_hashes(s_file)['crc32']}]
+        lx_expect.append({s_path: {'crc32': self._expected_hashes(s_path)['crc32']}
+                          for s_path in [s_file] + self._ls_files})
+
+        s_msg = 'CRC32 of big files hashed by segments is not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_hash_files_cached(self):
+        """
+        Test to check unchanged files are not hashed again, even by a new hasher using the same cache.
+        :return: Nothing.
+        """
+        with hashing.FileHasher(self._s_db, pi_workers=3) as o_hasher:
+            dds_first = o_hasher.hash_files(self._ls_files)
+            li_first = [o_hasher.i_hashed, o_hasher.i_cached]
+
+        # One of the files is modified (same size, different modification time)
+        with open(self._ls_files[0], 'r+b') as o_file:
+            o_file.write(b'modified')
+        o_stat = os.stat(self._ls_files[0])
+        os.utime(self._ls_files[0], ns=(o_stat.st_atime_ns, o_stat.st_mtime_ns + 1000000))
+
+        with hashing.FileHasher(self._s_db, pi_workers=3) as o_hasher:
+            dds_second = o_hasher.hash_files(self._ls_files)
+            li_second = [o_hasher.i_hashed, o_hasher.i_cached]
+            o_hasher.hash_files(self._ls_files)
+            li_third = [o_hasher.i_hashed, o_hasher.i_cached]
+
+        lx_expect = [[5, 0], [1, 4], [1, 9], {s_file: self._expected_hashes(s_file) for s_file in self._ls_files}]
+        lx_actual = [li_first, li_second, li_third, dds_second]
+
+        s_msg = 'Files hashed and found in the cache are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+        self.assertNotEqual(dds_first[self._ls_files[0]], dds_second[self._ls_files[0]])
+
+    def test_hash_files_other_types(self):
+        """
+        Test to check hashes not configured are computed and cached together with the cached ones.
+        :return: Nothing.
+        """
+        with hashing.FileHasher(self._s_db, pts_types=('crc32',)) as o_hasher:
+            o_hasher.hash_files(self._ls_files[:1])
+            ds_hashes = o_hasher.hash_file(self._ls_files[0], ['sha1'])
+            o_hasher.hash_file(self._ls_files[0], ['crc32', 'sha1'])
+            li_actual = [o_hasher.i_hashed, o_hasher.i_cached]
+
+        ds_expect = self._expected_hashes(self._ls_files[0])
+
+        lx_expect = [{'sha1': ds_expect['sha1']}, [2, 1]]
+        lx_actual = [ds_hashes, li_actual]
+
+        s_msg = 'Hashes of types not configured are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_identify_file(self):
+        """
+        Test to check files are identified in a Dat with the hashes of the cache.
+        :return: Nothing.
+        """
+        o_dat = dat_files.Dat()
+        for s_file in self._ls_files:
+            o_rom = dat_files.Rom()
+            o_rom.s_name = os.path.basename(s_file)
+            o_rom.i_size = os.path.getsize(s_file)
+            o_rom.s_crc32 = self._expected_hashes(s_file)['crc32']
+            o_romset = dat_files.RomSet(o_rom.s_name[:-4], o_rom.s_name[:-4])
+            o_romset.add_rom(o_rom)
+            o_dat.add_romset(o_romset)
+
+        with hashing.FileHasher(self._s_db) as o_hasher:
+            ls_first = [o_dat.identify_file(s_file, pc_hasher=o_hasher.hash_file).s_name for s_file in self._ls_files]
+            ls_second = [o_dat.identify_file(s_file, pc_hasher=o_hasher.hash_file).s_name for s_file in self._ls_files]
+            li_actual = [o_hasher.i_hashed, o_hasher.i_cached]
+
+        lx_expect = [['rom0', 'rom1', 'rom2', 'rom3', 'rom4'], ['rom0', 'rom1', 'rom2', 'rom3', 'rom4'], [5, 5]]
+        lx_actual = [ls_first, ls_second, li_actual]
+
+        s_msg = 'Files identified with the hash cache are not what was expected'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
+# Main code
+#=======================================================================================================================
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,12 @@
 import os
+import shutil
+import tempfile
 import unittest
+import zlib
 
 import libs.cons as cons
+import libs.dat_files as dat_files
+import libs.hashing as hashing
 import libs.roms as roms
 
 
@@ -123,6 +128,61 @@ class TestClassRom(unittest.TestCase):
         self.assertNotEqual(o_rom_a, o_rom_b)
 
 
+    def test_populate_from_dat_renamed_file(self):
+        """
+        Test to check a renamed ROM file is identified in the dat by its content.
+        :return: Nothing.
+        """
+        x_data = b'SEGA GENESIS' * 100
+        o_rom = dat_files.Rom()
+        o_rom.s_name = 'Renamed Game (World).md'
+        o_rom.i_size = len(x_data)
+        o_rom.s_crc32 = '%08x' % zlib.crc32(x_data)
+        o_romset = dat_files.RomSet('Renamed Game (World)', 'Renamed Game (World)')
+        o_romset.add_rom(o_rom)
+        o_dat = dat_files.Dat()
+        o_dat.add_romset(o_romset)
+
+        with tempfile.TemporaryDirectory() as s_tmp_dir:
+            s_dat_file = os.path.join(s_tmp_dir, 'test.dat')
+            o_dat.save_to_dat(s_dat_file, 'cmp')
+            s_rom_file = os.path.join(s_tmp_dir, 'my game.md')
+            with open(s_rom_file, 'wb') as o_file:
+                o_file.write(x_data)
+
+            o_rom = roms.Rom('mdr-crt', s_rom_file, ps_dat=s_dat_file)
+
+        lx_expect = ['Renamed Game (World)', len(x_data), '%08x' % zlib.crc32(x_data)]
+        lx_actual = [o_rom.s_name, o_rom.i_csize, o_rom.s_ccrc32]
+
+        s_msg = 'Renamed ROM file was not identified by its content'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+    def test_populate_from_dat_renamed_zip(self):
+        """
+        Test to check a renamed zip archive is identified in the dat (and through the catalog of the cache dir) by the
+        ROM inside it, without hashing the archive.
+        :return: Nothing.
+        """
+        s_dat_file = os.path.join(cons.s_TEST_DATA_DIR, 'dats', 'mdr-crt.dat')
+        s_name = 'Phantom Gear (World) (v0.2) (Demo) (Aftermarket) (Unl)'
+        s_zip_file = os.path.join(cons.s_TEST_DATA_DIR, 'roms', 'mdr-crt', f'{s_name}.zip')
+
+        with tempfile.TemporaryDirectory() as s_tmp_dir:
+            s_rom_file = os.path.join(s_tmp_dir, 'phantom gear.zip')
+            s_cache_dir = os.path.join(s_tmp_dir, 'cache')
+            shutil.copyfile(s_zip_file, s_rom_file)
+            lo_roms = [roms.Rom('mdr-crt', s_rom_file, ps_dat=s_dat_file),
+                       roms.Rom('mdr-crt', s_rom_file, ps_dat=s_dat_file, ps_cache_dir=s_cache_dir)]
+            b_hash_cache = os.path.exists(hashing.get_hash_cache_path(s_cache_dir))
+
+        lx_expect = [[s_name, 303692, 'd6cf8cdb']] * 2 + [False]
+        lx_actual = [[o_rom.s_name, o_rom.i_csize, o_rom.s_ccrc32] for o_rom in lo_roms] + [b_hash_cache]
+
+        s_msg = 'Renamed zip archive was not identified by the ROM inside it'
+        self.assertEqual(lx_expect, lx_actual, s_msg)
+
+
 # Main code
 #=======================================================================================================================
 if __name__ == '__main__':